@@ -2,17 +2,77 @@
 Flask Web Application for Music Description Generator
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
+from flask import Request
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.utils import secure_filename
 import os
+import hashlib
+import shutil
+import threading
+from functools import wraps
 from pathlib import Path
 import json
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
 from music_analyzer import MusicAnalyzer, DescriptionGenerator
+from chunked_upload import ChunkedUploadManager, UploadError
+from track_analysis import TrackAnalysis, renamed
+from library_store import LibraryStore, CATEGORY_FIELDS, RANGE_FIELDS, parse_range
+from result_cache import ResultCache, save_and_hash
+from progressive import ProgressiveResults
+from memory_monitor import process_stats
+from waveform import WaveformPeaks, WaveformStore
 import tempfile
 
+
+class AnalysisJSONProvider(DefaultJSONProvider):
+    """JSON provider that understands analysis records and NumPy values"""
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, TrackAnalysis):
+            return o.to_dict()
+        if isinstance(o, WaveformPeaks):
+            # The peaks themselves are served by /waveform/<id>
+            return o.summary()
+        if isinstance(o, np.generic):
+            return o.item()
+        if isinstance(o, np.ndarray):
+            return o.tolist()
+        return DefaultJSONProvider.default(o)
+
+
+class AnalysisRequest(Request):
+    """Request class allowing a larger body limit for multi-file uploads"""
+    
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'upload_batch':
+            return app.config['BATCH_MAX_CONTENT_LENGTH']
+        return super().max_content_length
+
+
+class ServerBusy(Exception):
+    """Raised when this process is already running its maximum number of analyses"""
+
+
 app = Flask(__name__)
+app.json = AnalysisJSONProvider(app)
+app.request_class = AnalysisRequest
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
+app.config['BATCH_MAX_CONTENT_LENGTH'] = 1024 * 1024 * 1024  # 1GB max batch request
+app.config['CHUNKED_MAX_FILE_SIZE'] = 4 * 1024 * 1024 * 1024  # 4GB max chunked upload
+app.config['CHUNK_SIZE'] = 8 * 1024 * 1024  # Suggested chunk size for clients
 app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['ANALYSIS_WORKERS'] = int(os.environ.get('ANALYSIS_WORKERS', os.cpu_count() or 2))
+app.config['MAX_INFLIGHT_ANALYSES'] = int(os.environ.get('MAX_INFLIGHT_ANALYSES', app.config['ANALYSIS_WORKERS']))
+app.config['RETRY_AFTER_SECONDS'] = int(os.environ.get('RETRY_AFTER_SECONDS', 5))
+app.config['LIBRARY_DB'] = os.environ.get('LIBRARY_DB', 'music_library.db')  # Filled by batch_analyzer.py --library
+app.config['MAX_SEARCH_RESULTS'] = 500
+app.config['RESULT_CACHE_SIZE'] = int(os.environ.get('RESULT_CACHE_SIZE', 256))  # Recent analyses kept
+app.config['MAX_DEADLINE_SECONDS'] = 300  # Longest a progressive upload waits before answering
+app.config['MAX_POLL_SECONDS'] = 30  # Longest a /result long poll waits
 
 # Create upload folder
 Path(app.config['UPLOAD_FOLDER']).mkdir(exist_ok=True)
@@ -20,15 +80,266 @@ Path(app.config['UPLOAD_FOLDER']).mkdir(exist_ok=True)
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'mp3', 'wav', 'flac', 'ogg', 'm4a', 'aac'}
 
-analyzer = MusicAnalyzer()
+classifier_backend = os.environ.get('CLASSIFIER_BACKEND', 'none')
+analyzer = MusicAnalyzer(
+    lean=os.environ.get('LEAN_ANALYSIS') == '1',
+    memory_budget_mb=float(os.environ['MEMORY_BUDGET_MB']) if os.environ.get('MEMORY_BUDGET_MB') else None,
+    classifier_backend=None if classifier_backend == 'none' else classifier_backend,
+    classifier_model=os.environ.get('CLASSIFIER_MODEL', MusicAnalyzer.CLASSIFIER_MODEL),
+    classifier_threads=int(os.environ['CLASSIFIER_THREADS']) if os.environ.get('CLASSIFIER_THREADS') else None,
+    waveform=True
+)
 generator = DescriptionGenerator()
 
+# Opened by the first search once a batch run has created it (see get_library)
+library = None
+library_lock = threading.Lock()
+
+# Shared worker pool for concurrent analyses
+executor = ThreadPoolExecutor(max_workers=app.config['ANALYSIS_WORKERS'])
+
+# Admission control: analysis requests beyond this limit are rejected with 503
+inflight_analyses = threading.BoundedSemaphore(app.config['MAX_INFLIGHT_ANALYSES'])
+
+# Identical uploads share one analysis (see result_cache.py)
+result_cache = ResultCache(app.config['RESULT_CACHE_SIZE'])
+
+# Uploads with a deadline are analyzed in the background (see progressive.py);
+# snapshots are shared on disk so any worker process can answer /result polls
+progressive_results = ProgressiveResults(
+    executor,
+    directory=os.path.join(app.config['UPLOAD_FOLDER'], 'results'),
+    dumps=app.json.dumps
+)
+
+# Waveform peaks of analyzed uploads, by analysis key, for /waveform/<key>
+waveforms = WaveformStore(os.path.join(app.config['UPLOAD_FOLDER'], 'waveforms'))
+
+chunked_uploads = ChunkedUploadManager(
+    os.path.join(app.config['UPLOAD_FOLDER'], 'chunked'),
+    analyzer,
+    executor,
+    app.config['CHUNKED_MAX_FILE_SIZE'],
+    admission=inflight_analyses,
+    dumps=app.json.dumps
+)
+
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def admission_controlled(view):
+    """Reject the request with 503 and Retry-After when this process is saturated"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not inflight_analyses.acquire(blocking=False):
+            raise ServerBusy()
+        
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        except BaseException:
+            inflight_analyses.release()
+            raise
+        
+        # Streamed responses keep their slot until the body is fully sent
+        response.call_on_close(inflight_analyses.release)
+        return response
+    return wrapper
+
+
+@app.errorhandler(ServerBusy)
+def handle_server_busy(e):
+    """Reject with 503 and Retry-After instead of queueing indefinitely"""
+    response = jsonify({'error': 'Server busy, please retry shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(app.config['RETRY_AFTER_SECONDS'])
+    return response
+
+
+def save_upload(file, directory):
+    """Save an uploaded file under a unique name; returns (path, SHA-256 of the content)"""
+    fd, filepath = tempfile.mkstemp(dir=directory, suffix=Path(secure_filename(file.filename)).suffix)
+    with os.fdopen(fd, 'wb') as f:
+        digest = save_and_hash(file.stream, f)
+    return filepath, digest
+
+
+def get_library():
+    """The library database, or None if no batch run has created it yet"""
+    global library
+    with library_lock:
+        if library is None and os.path.exists(app.config['LIBRARY_DB']):
+            library = LibraryStore(app.config['LIBRARY_DB'])
+        return library
+
+
+def requested_features():
+    """
+    Features selected by the request's comma-separated `features` parameter
+    
+    Returns:
+        Sorted feature names, or None for a full analysis (no parameter, or
+        every feature)
+    
+    Raises:
+        ValueError: Unknown feature names
+    """
+    value = request.values.get('features', '')
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    if not names:
+        return None
+    features = analyzer.select_features(names)
+    return None if set(features) >= set(analyzer.select_features()) else sorted(features)
+
+
+def analysis_key(digest, features=None):
+    """Result cache key of an analysis: the content digest, plus the features for a subset"""
+    return digest if features is None else '-'.join([digest] + list(features))
+
+
+def analysis_body(results, key):
+    """
+    Response body for an analysis: descriptions need every field, so a
+    subset of features is returned without them
+    """
+    body = {'analysis': results}
+    if isinstance(results, TrackAnalysis):
+        body['descriptions'] = generator.generate_all(results)
+    if 'waveform' in results:
+        body['waveform_url'] = f"/waveform/{key}"
+    return body
+
+
+def store_waveform(key, fields):
+    """Save the waveform peaks in an analysis (or stage results) for /waveform/<key>"""
+    peaks = fields.get('waveform')
+    if isinstance(peaks, WaveformPeaks):
+        waveforms.put(key, peaks)
+
+
+def analyze_upload(filepath, digest, filename, admission=True, features=None):
+    """
+    Analyze a saved upload and generate all descriptions
+    
+    Uploads with the same content share one analysis: a cached result is
+    returned immediately and concurrent requests wait for the one in flight.
+    Only an actual analysis takes an admission slot. With features, only
+    those are computed (and cached separately from full analyses).
+    
+    Returns:
+        Tuple of (response dict, cache outcome: 'hit', 'coalesced' or 'miss')
+    """
+    key = analysis_key(digest, features)
+    
+    def analyze():
+        if admission and not inflight_analyses.acquire(blocking=False):
+            raise ServerBusy()
+        try:
+            results = renamed(analyzer.analyze_audio(filepath, features), filename)
+        finally:
+            if admission:
+                inflight_analyses.release()
+        store_waveform(key, results)
+        return results
+    
+    results, outcome = result_cache.get_or_compute(key, analyze)
+    if results['file_name'] != filename:
+        results = renamed(results, filename)
+    return analysis_body(results, key), outcome
+
+
+def upload_progressive(filepath, digest, filename, features=None):
+    """
+    Start (or join) a background analysis of a saved upload, stage by stage
+    
+    Goes through the result cache like analyze_upload: a cached result
+    completes immediately, and an identical upload already being analyzed
+    (progressively or not) is shared. Otherwise the analysis takes an
+    admission slot and deletes the file when it ends.
+    
+    Returns:
+        Tuple of (the ProgressiveResult being filled in, cache outcome)
+    """
+    key = analysis_key(digest, features)
+    outcome, value = result_cache.lookup(key)
+    if outcome == 'hit':
+        os.remove(filepath)
+        return progressive_results.finished(renamed(value, filename), analysis_key=key), outcome
+    if outcome == 'coalesced':
+        os.remove(filepath)
+        result = progressive_results.running(key, filename)
+        if result is None:
+            result = progressive_results.pending(value, filename, analysis_key=key)
+        return result, outcome
+    
+    if not inflight_analyses.acquire(blocking=False):
+        os.remove(filepath)
+        result_cache.fail(key, ServerBusy())
+        raise ServerBusy()
+    
+    def cleanup():
+        inflight_analyses.release()
+        try:
+            os.remove(filepath)
+        except OSError:
+            pass
+    
+    def stages():
+        # The waveform comes with the first stage; store it before publishing
+        for stage, fields in analyzer.analyze_progressive(filepath, features):
+            store_waveform(key, fields)
+            yield stage, fields
+    
+    result = progressive_results.start(
+        key,
+        stages(),
+        filename,
+        on_complete=lambda analysis: result_cache.complete(key, analysis),
+        on_error=lambda error: result_cache.fail(key, error),
+        cleanup=cleanup,
+        analysis_key=key
+    )
+    return result, outcome
+
+
+def progressive_response(result):
+    """
+    Best available results of a progressive analysis
+    
+    200 with descriptions once complete, 202 with `refining: true` and a
+    Location to poll while stages are still running, 500 if it failed.
+    """
+    body = result.snapshot()
+    if body['error'] is not None:
+        response = jsonify(body)
+        response.status_code = 500
+        return response
+    if 'waveform' in body['analysis'] and result.analysis_key is not None:
+        body['waveform_url'] = f"/waveform/{result.analysis_key}"
+    if body['refining']:
+        response = jsonify(body)
+        response.status_code = 202
+        response.headers['Location'] = f"/result/{result.id}"
+        return response
+    if isinstance(body['analysis'], TrackAnalysis):
+        body['descriptions'] = generator.generate_all(body['analysis'])
+    return jsonify(body)
+
+
+def result_etag(digest, filename):
+    """ETag of an analysis response: the same audio content under the same name"""
+    return hashlib.sha256(f"{digest}/{filename}".encode('utf-8')).hexdigest()[:32]
+
+
+def not_modified(etag):
+    """Empty 304 response telling the client its copy is current"""
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    return response
+
+
 @app.route('/')
 def index():
     """Render main page"""
@@ -37,7 +348,19 @@ def index():
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    """Handle file upload and analysis"""
+    """
+    Handle file upload and analysis
+    
+    The response carries an ETag; sending it back in If-None-Match with the
+    same file returns 304 without a body while the result is cached.
+    
+    With a `deadline` (seconds), the request answers when the analysis
+    finishes or the deadline passes, whichever is first, with the results
+    known so far and `refining: true`; poll /result/<id> for the rest.
+    
+    `features` (comma-separated, e.g. tempo,key) computes only those
+    features; the response then has no descriptions.
+    """
     if 'audio' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
@@ -49,36 +372,229 @@ def upload_file():
     if not allowed_file(file.filename):
         return jsonify({'error': 'Invalid file type. Supported: MP3, WAV, FLAC, OGG, M4A'}), 400
     
+    try:
+        features = requested_features()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     try:
         # Save uploaded file
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Analyze audio
-        results = analyzer.analyze_audio(filepath)
+        filepath, digest = save_upload(file, app.config['UPLOAD_FOLDER'])
+        key = analysis_key(digest, features)
+        etag = result_etag(key, filename)
         
-        # Generate descriptions
-        descriptions = {
-            'youtube': generator.generate_youtube_description(results),
-            'podcast': generator.generate_podcast_description(results),
-            'library': generator.generate_library_tags(results),
-            'social': generator.generate_social_media(results)
-        }
+        deadline = request.values.get('deadline', type=float)
+        if deadline is not None:
+            result, outcome = upload_progressive(filepath, digest, filename, features)
+            result.wait(min(deadline, app.config['MAX_DEADLINE_SECONDS']))
+            response = progressive_response(result)
+            response.headers['X-Cache'] = outcome
+            return response
         
-        # Clean up uploaded file
         try:
-            os.remove(filepath)
-        except:
-            pass
+            if request.if_none_match.contains(etag) and result_cache.get(key) is not None:
+                return not_modified(etag)
+            
+            # Analyze audio and generate descriptions
+            response, outcome = analyze_upload(filepath, digest, filename, features=features)
+        finally:
+            # Clean up uploaded file
+            try:
+                os.remove(filepath)
+            except:
+                pass
+        
+        response = jsonify(response)
+        response.set_etag(etag)
+        response.headers['X-Cache'] = outcome
+        return response
+    
+    except ServerBusy:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/upload/batch', methods=['POST'])
+@admission_controlled
+def upload_batch():
+    """
+    Handle a multi-file upload, analyzing files concurrently
+    
+    Each finished track is streamed back immediately as one line of
+    newline-delimited JSON, followed by a final summary line. `features`
+    selects features as for /upload. Files are handed to the executor one
+    at a time on the batch's admission slot, plus one more for every other
+    slot free at the time, so a large batch neither queues ahead of other
+    requests' analyses nor gets around admission control.
+    """
+    files = [f for f in request.files.getlist('audio') if f.filename != '']
+    
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    
+    try:
+        features = requested_features()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Save every file before streaming; each upload gets its own
+    # directory so duplicate names within one request don't collide
+    batch_dir = tempfile.mkdtemp(dir=app.config['UPLOAD_FOLDER'])
+    jobs = []
+    try:
+        for index, file in enumerate(files):
+            if not allowed_file(file.filename):
+                jobs.append((index, file.filename, None, None))
+                continue
+            file_dir = os.path.join(batch_dir, str(index))
+            os.mkdir(file_dir)
+            filepath = os.path.join(file_dir, secure_filename(file.filename))
+            with open(filepath, 'wb') as f:
+                digest = save_and_hash(file.stream, f)
+            jobs.append((index, file.filename, filepath, digest))
+    except BaseException:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        raise
+    
+    def generate():
+        errors = 0
+        pending = []
+        for index, name, filepath, digest in jobs:
+            if filepath is None:
+                errors += 1
+                yield app.json.dumps({
+                    'index': index,
+                    'file_name': name,
+                    'error': 'Invalid file type. Supported: MP3, WAV, FLAC, OGG, M4A'
+                }) + '\n'
+            else:
+                pending.append((index, name, filepath, digest))
         
-        return jsonify({
-            'analysis': results,
-            'descriptions': descriptions
-        })
+        # The request holds one admission slot; files beyond the one using it
+        # run only while they can take a free slot each
+        pending.reverse()
+        futures = {}
+        base = None     # the file analyzed on the request's own slot
+        while pending or futures:
+            while pending and len(futures) < app.config['ANALYSIS_WORKERS']:
+                extra = base is not None
+                if extra and not inflight_analyses.acquire(blocking=False):
+                    break
+                index, name, filepath, digest = pending.pop()
+                try:
+                    future = executor.submit(analyze_upload, filepath, digest, secure_filename(name), False, features)
+                except BaseException:
+                    if extra:
+                        inflight_analyses.release()
+                    raise
+                if extra:
+                    future.add_done_callback(lambda _: inflight_analyses.release())
+                else:
+                    base = future
+                futures[future] = (index, name)
+            
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future is base:
+                    base = None
+                index, name = futures.pop(future)
+                line = {'index': index, 'file_name': name}
+                try:
+                    line.update(future.result()[0])
+                except Exception as e:
+                    errors += 1
+                    line['error'] = str(e)
+                yield app.json.dumps(line) + '\n'
+        
+        yield app.json.dumps({'done': True, 'total': len(jobs), 'errors': errors}) + '\n'
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'}
+    )
+    # Runs once the body is sent or the client goes away, even if the
+    # generator never started (closing an unstarted generator skips its finally)
+    response.call_on_close(lambda: shutil.rmtree(batch_dir, ignore_errors=True))
+    return response
+
+
+@app.errorhandler(UploadError)
+def handle_upload_error(e):
+    """Report chunked upload errors, including the offset to resume from"""
+    body = {'error': str(e)}
+    if e.received is not None:
+        body['received'] = e.received
+    return jsonify(body), e.status
+
+
+@app.route('/upload/chunked', methods=['POST'])
+def start_chunked_upload():
+    """
+    Start a resumable upload
+    
+    Expects JSON `{"filename": ..., "size": <bytes>}` and returns the
+    upload id. Chunks are then sent with PUT /upload/chunked/<id>.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+    
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type. Supported: MP3, WAV, FLAC, OGG, M4A'}), 400
+    
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid upload size'}), 400
+    
+    upload = chunked_uploads.start(secure_filename(filename), size)
+    status = upload.status()
+    status['chunk_size'] = app.config['CHUNK_SIZE']
+    return jsonify(status), 201
+
+
+@app.route('/upload/chunked/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    """Report how many bytes have been received, so a client can resume"""
+    return jsonify(chunked_uploads.get(upload_id).status())
+
+
+@app.route('/upload/chunked/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Append one chunk; `offset` must equal the bytes received so far"""
+    offset = request.args.get('offset', request.headers.get('Upload-Offset'))
+    if offset is None or not str(offset).isdigit():
+        return jsonify({'error': 'Missing or invalid offset'}), 400
     
+    upload = chunked_uploads.append(upload_id, int(offset), request.get_data(cache=False))
+    return jsonify(upload.status())
+
+
+@app.route('/upload/chunked/<upload_id>/finish', methods=['POST'])
+@admission_controlled
+def finish_chunked_upload(upload_id):
+    """Complete an upload and return its analysis"""
+    try:
+        results = chunked_uploads.finish(upload_id)
+    except UploadError:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'analysis': results,
+        'descriptions': generator.generate_all(results)
+    })
+
+
+@app.route('/upload/chunked/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    """Abort an upload and delete the received data"""
+    chunked_uploads.get(upload_id)
+    chunked_uploads.discard(upload_id)
+    return jsonify({'status': 'aborted'})
 
 
 @app.route('/download/<format_type>', methods=['POST'])
@@ -104,6 +620,150 @@ def download_description(format_type):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/search')
+def search_library():
+    """
+    Search the analyzed library
+    
+    Query parameters:
+        key, genre, sub_genre, mood, time_signature: exact values (repeatable, any matches)
+        tempo, energy, danceability, valence, duration_seconds, loudness: ranges
+            such as 120-128, 70- (at least) or -40 (at most)
+        instrument: required instrument (repeatable, all must match)
+        q: file name contains
+        sort, desc, limit, offset: ordering and paging
+        facets: comma-separated fields to count (e.g. genre,key,mood)
+    
+    404 until a batch run with --library has created the database.
+    """
+    library = get_library()
+    if library is None:
+        return jsonify({'error': 'No library yet: run batch_analyzer.py with --library'}), 404
+    
+    try:
+        filters = {field: request.args.getlist(field) for field in CATEGORY_FIELDS}
+        for field in RANGE_FIELDS:
+            if request.args.get(field):
+                filters[field] = parse_range(request.args[field])
+        filters['instrument'] = request.args.getlist('instrument')
+        filters['file_name'] = request.args.get('q') or None
+        
+        limit = min(request.args.get('limit', 50, type=int), app.config['MAX_SEARCH_RESULTS'])
+        tracks = library.query(
+            sort=request.args.get('sort', 'tempo'),
+            descending=request.args.get('desc') in ('1', 'true'),
+            limit=limit,
+            offset=request.args.get('offset', 0, type=int),
+            **filters
+        )
+        response = {'total': library.count(**filters), 'results': tracks}
+        
+        if request.args.get('facets'):
+            response['facets'] = {
+                field: [{'value': value, 'count': count} for value, count in counts]
+                for field, counts in library.facets(request.args['facets'].split(','), **filters).items()
+            }
+        return jsonify(response)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/analysis/<digest>')
+def cached_analysis(digest):
+    """
+    Return a recent analysis by the SHA-256 of the audio file's content
+    
+    Lets clients skip uploading a file this server has analyzed recently.
+    Optional `name` sets the file name used in the descriptions, and
+    `features` looks up an analysis of those features. Supports
+    If-None-Match; 404 when the result is not cached. The cache is per
+    worker process, so under serve.py with several workers a result held
+    by another worker also gives 404.
+    """
+    try:
+        key = analysis_key(digest.lower(), requested_features())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    results = result_cache.get(key)
+    if results is None:
+        return jsonify({'error': 'Analysis not cached'}), 404
+    
+    filename = secure_filename(request.args.get('name', '')) or results['file_name']
+    etag = result_etag(key, filename)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    
+    if results['file_name'] != filename:
+        results = renamed(results, filename)
+    response = jsonify(analysis_body(results, key))
+    response.set_etag(etag)
+    return response
+
+
+@app.route('/result/<result_id>')
+def progressive_result(result_id):
+    """
+    Poll a progressive analysis started by /upload with a deadline
+    
+    Optional `seen` (stages the client already has) and `wait` (seconds)
+    make this a long poll: it answers as soon as another stage finishes.
+    Any worker process can answer (results are shared through
+    UPLOAD_FOLDER/results). 404 when the id is unknown or expired.
+    """
+    result = progressive_results.get(result_id)
+    if result is None:
+        return jsonify({'error': 'Unknown or expired result'}), 404
+    
+    wait = min(request.args.get('wait', 0, type=float), app.config['MAX_POLL_SECONDS'])
+    if wait > 0:
+        result.wait(wait, seen=request.args.get('seen', 0, type=int))
+    return progressive_response(result)
+
+
+@app.route('/waveform/<key>')
+def waveform_peaks(key):
+    """
+    One zoom level of an analysis's waveform peaks
+    
+    The key is the content digest of an analyzed upload (followed by the
+    features for a subset, as linked by `waveform_url` in responses). Peaks
+    are stored on disk when the analysis (or, for progressive uploads, its
+    first stage) finishes, so any worker process can serve them. Choose the
+    level with `level` (0 is the finest) or `width` (the finest level with
+    at most that many peaks, default 1000). The body is the binary level
+    layout described in waveform.py, or JSON with `format=json`. 404 when no
+    waveform is stored for the key.
+    """
+    peaks = waveforms.get(key.lower())
+    if peaks is None:
+        return jsonify({'error': 'Waveform not available'}), 404
+    
+    level = request.args.get('level', type=int)
+    if level is None:
+        level = peaks.level_for(max(request.args.get('width', 1000, type=int), 1))
+    if not 0 <= level < len(peaks.levels):
+        return jsonify({'error': f"Level must be 0-{len(peaks.levels) - 1}"}), 400
+    
+    if request.args.get('format') == 'json':
+        response = jsonify(peaks.level_dict(level))
+    else:
+        response = app.response_class(peaks.level_bytes(level), mimetype='application/octet-stream')
+    response.headers['X-Waveform-Level'] = str(level)
+    response.headers['X-Waveform-Levels'] = str(len(peaks.levels))
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@app.route('/metrics')
+def metrics():
+    """Result cache counters and resource usage of this worker process"""
+    return jsonify({
+        'result_cache': result_cache.stats(),
+        'process': process_stats()
+    })
+
+
 @app.route('/health')
 def health():
     """Health check endpoint"""
@@ -117,6 +777,7 @@ if __name__ == '__main__':
     print("\nStarting server...")
     print("Open your browser and navigate to: http://localhost:5000")
     print("\nPress CTRL+C to stop the server")
+    print("For production use: python serve.py --workers 4")
     print("="*60 + "\n")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+Decoded Audio Cache
+Keep decoded signals on disk so re-analyzing a file skips decoding
+
+Each entry is the mono float32 signal of one file at one sample rate, stored
+as a .npy file and memory-mapped read-only when used. Entries are keyed by
+the file's path, size and modification time, so an edited file is decoded
+again, and by the decoder used, since decoders can differ in the last bits.
+Writes are atomic (written under a temporary name, then renamed), so several
+processes can share one cache directory, and the least recently used entries
+are deleted once the cache outgrows its size limit.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+
+class DecodedAudioCache:
+    """
+    Size-bounded on-disk cache of decoded signals, shared between processes
+
+    Usage:
+        cache = DecodedAudioCache('.audio_cache', max_bytes=2 * 1024**3)
+        y = cache.get(path, 22050, 60, 'librosa')
+        if y is None:
+            y = cache.put(path, 22050, 60, 'librosa', decode(path))
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            directory: Cache directory (created if missing)
+            max_bytes: Total size of the entries; the least recently used are
+                deleted beyond it
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def entry_path(self, audio_path: str, sr: int, duration: float, decoder: str) -> Path:
+        """Cache file of a decode of audio_path (its first `duration` seconds at sr)"""
+        stat = os.stat(audio_path)
+        identity = (f"{Path(audio_path).resolve()}\0{stat.st_size}\0{stat.st_mtime_ns}"
+                    f"\0{sr}\0{float(duration)}\0{decoder}")
+        return self.directory / f"{hashlib.sha256(identity.encode('utf-8')).hexdigest()[:32]}.npy"
+
+    def get(self, audio_path: str, sr: int, duration: float, decoder: str) -> Optional[np.ndarray]:
+        """
+        Cached decode of a file, memory-mapped read-only
+
+        Args:
+            audio_path: Source audio file
+            sr: Sample rate of the decoded signal
+            duration: Seconds decoded from the start of the file
+            decoder: Names the decoding method; only its own decodes are returned
+
+        Returns:
+            The signal, or None if it is not cached
+        """
+        entry = self.entry_path(audio_path, sr, duration, decoder)
+        try:
+            y = np.load(entry, mmap_mode='r')
+            # The modification time records use, for eviction
+            os.utime(entry)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return np.asarray(y)
+
+    def put(self, audio_path: str, sr: int, duration: float, decoder: str, y: np.ndarray) -> np.ndarray:
+        """
+        Store a decoded signal (arguments as for get())
+
+        Returns:
+            The cached copy, memory-mapped read-only (or y itself if it could
+            not be stored)
+        """
+        y = np.ascontiguousarray(y, dtype=np.float32)
+        if y.nbytes > self.max_bytes:
+            return y
+
+        entry = self.entry_path(audio_path, sr, duration, decoder)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, y)
+            os.replace(temp_path, entry)
+        except OSError as e:
+            print(f"Warning: could not cache decoded audio: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return y
+
+        self._evict(keep=entry)
+        return np.asarray(np.load(entry, mmap_mode='r'))
+
+    def _evict(self, keep: Path):
+        """Delete the least recently used entries until the cache fits max_bytes"""
+        entries = []
+        for item in os.scandir(self.directory):
+            if item.name.endswith('.npy'):
+                try:
+                    stat = item.stat()
+                except OSError:
+                    continue  # deleted by another process
+                entries.append((stat.st_mtime_ns, stat.st_size, item.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == str(keep):
+                continue
+            try:
+                # Processes that already mapped the entry keep reading it
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def size_bytes(self) -> int:
+        """Total size of the cached entries"""
+        total = 0
+        for item in os.scandir(self.directory):
+            if item.name.endswith('.npy'):
+                try:
+                    total += item.stat().st_size
+                except OSError:
+                    pass
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and occupancy, for reports"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size_mb': round(self.size_bytes() / (1024 * 1024), 1),
+                'max_mb': round(self.max_bytes / (1024 * 1024), 1),
+                'hit_rate': round(self.hits / requests, 3) if requests else None,
+            }
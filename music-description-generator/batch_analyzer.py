@@ -5,23 +5,121 @@ Process multiple audio files and generate comprehensive reports
 
 from pathlib import Path
 import json
+import shutil
+import time
 from music_analyzer import MusicAnalyzer, DescriptionGenerator
+from track_analysis import TrackAnalysis, FIELD_NAMES, save_table, to_columns
+from library_store import LibraryStore
+from fingerprint import FingerprintIndex, compute_fingerprint
+from audio_cache import DecodedAudioCache
+from supervised_pool import SupervisedPool, TaskFailure
+from waveform import WaveformPeaks
 import pandas as pd
 from datetime import datetime
 from tqdm import tqdm
 
 
+DEFAULT_FILE_MEMORY_MB = 4096   # Per-file worker memory limit without --memory-budget
+
+
+class TrackWorker:
+    """Fingerprints and analyzes tracks inside a supervised worker process"""
+    
+    def __init__(self, options: dict):
+        """
+        Args:
+            options: lean, memory_budget_mb, classifier_backend, audio_cache_dir,
+                audio_cache_mb, waveforms and features, as for BatchAnalyzer
+        """
+        self.audio_cache = (DecodedAudioCache(options['audio_cache_dir'],
+                                              int(options['audio_cache_mb'] * 1024 * 1024))
+                            if options['audio_cache_dir'] else None)
+        self.analyzer = MusicAnalyzer(lean=options['lean'], memory_budget_mb=options['memory_budget_mb'],
+                                      classifier_backend=options['classifier_backend'],
+                                      audio_cache=self.audio_cache, waveform=options['waveforms'])
+        self.features = options['features']
+    
+    def __call__(self, task: tuple):
+        """
+        Run ('fingerprint', path) or ('analyze', path)
+        
+        Returns:
+            (fingerprint, duration) for fingerprints; (results dictionary,
+            seconds taken, audio cache hit or None) for analyses (the
+            dictionary holds only the selected features for a subset)
+        """
+        kind, path = task
+        if kind == 'fingerprint':
+            return compute_fingerprint(path)
+        
+        hits = self.audio_cache.hits if self.audio_cache is not None else 0
+        start = time.perf_counter()
+        results = self.analyzer.analyze_audio(path, self.features)
+        elapsed = time.perf_counter() - start
+        cache_hit = self.audio_cache.hits > hits if self.audio_cache is not None else None
+        return dict(results.items()), elapsed, cache_hit
+
+
 class BatchAnalyzer:
     """Process multiple audio files in batch"""
     
-    def __init__(self):
-        self.analyzer = MusicAnalyzer()
+    def __init__(self, lean: bool = False, memory_budget_mb: float = None, library_path: str = None,
+                 dedupe: bool = True, audio_cache_dir: str = None, audio_cache_mb: float = 2048,
+                 workers: int = 1, file_timeout: float = 300, file_memory_mb: float = DEFAULT_FILE_MEMORY_MB,
+                 retry_quarantined: bool = False, waveforms: bool = False, features: list = None,
+                 classifier_backend: str = None):
+        """
+        Args:
+            lean: Use the analyzer's memory-lean mode
+            memory_budget_mb: Per-process memory budget (implies lean)
+            library_path: Library database to add each track to as it finishes
+            dedupe: Fingerprint each file and reuse the analysis of earlier copies
+            audio_cache_dir: Keep decoded signals here, so later runs over the
+                same files skip decoding (can be shared by concurrent runs)
+            audio_cache_mb: Size limit of the decoded audio cache
+            workers: Worker processes analyzing files in parallel
+            file_timeout: Seconds a file may take (to fingerprint, or to
+                analyze) before its worker is killed (None for no limit)
+            file_memory_mb: Memory a worker may use on one file before it is
+                killed (None for no limit)
+            retry_quarantined: Try files quarantined by earlier runs again
+            waveforms: Save each track's waveform peak pyramid next to its
+                analysis (<track>_waveform.bin, see waveform.py)
+            features: Compute only these features (see MusicAnalyzer.FEATURES);
+                descriptions, the library and the reports need every field,
+                so a subset only gets the per-track JSON and the CSV export
+            classifier_backend: Classifier inference backend of the workers
+                (see inference_backends.py), or None (the default) to skip
+                loading it
+        """
+        self.worker_options = {
+            'lean': lean,
+            'memory_budget_mb': memory_budget_mb,
+            'classifier_backend': classifier_backend,
+            'audio_cache_dir': audio_cache_dir,
+            'audio_cache_mb': audio_cache_mb,
+            'waveforms': waveforms or 'waveform' in (features or ()),
+            'features': features,
+        }
+        self.audio_cache = (DecodedAudioCache(audio_cache_dir, int(audio_cache_mb * 1024 * 1024))
+                            if audio_cache_dir else None)
         self.generator = DescriptionGenerator()
+        self.library = LibraryStore(library_path) if library_path else None
+        self.dedupe = dedupe
+        self.workers = workers
+        self.file_timeout = file_timeout
+        self.file_memory_mb = file_memory_mb
+        self.retry_quarantined = retry_quarantined
         
     def analyze_directory(self, input_dir: str, output_dir: str = "batch_results"):
         """
         Analyze all audio files in a directory
         
+        Files are fingerprinted and analyzed in supervised worker processes:
+        a file that hangs, crashes its worker or exceeds the memory limit is
+        abandoned, recorded in failures.txt and quarantined (skipped by later
+        runs into the same output directory until it changes).
+        
         Args:
             input_dir: Directory containing audio files
             output_dir: Directory to save results
@@ -43,33 +141,198 @@ class BatchAnalyzer:
             print(f"No audio files found in {input_dir}")
             return
         
+        quarantine = self._load_quarantine(output_path)
+        skipped = [] if self.retry_quarantined else [f for f in audio_files if self._is_quarantined(quarantine, f)]
+        if skipped:
+            print(f"\nSkipping {len(skipped)} quarantined files (see {output_path / 'failures.txt'}; "
+                  f"--retry-quarantined to try them again)")
+            audio_files = [f for f in audio_files if f not in skipped]
+        
         print(f"\nFound {len(audio_files)} audio files")
         print("="*60)
         
         # Process all files
         all_results = []
-        
-        for audio_file in tqdm(audio_files, desc="Analyzing tracks"):
-            try:
-                # Analyze
-                results = self.analyzer.analyze_audio(str(audio_file))
-                all_results.append(results)
+        fingerprints = FingerprintIndex() if self.dedupe else None
+        analyzed = {}       # file name -> results of tracks actually analyzed
+        duplicates = {}     # original file name -> [(duplicate file name, distance)]
+        waiting = {}        # original still being analyzed -> [(duplicate file, distance)]
+        failed = {}         # file name -> (file, stage, TaskFailure)
+        analysis_time = 0.0
+        cache_hits = cache_misses = 0
+        files = {str(f): f for f in audio_files}
+        
+        def finish(audio_file: Path, results: TrackAnalysis, waveform: WaveformPeaks = None):
+            all_results.append(results)
+            
+            # Make the track searchable right away
+            if self.library is not None and isinstance(results, TrackAnalysis):
+                self.library.add(results, path=str(audio_file.resolve()))
+            
+            # Generate descriptions
+            self._save_track_descriptions(results, output_path)
+            if waveform is not None:
+                self._save_waveform(waveform.pack(), results['file_name'], output_path)
+            elif 'duplicate_of' in results and self.worker_options['waveforms']:
+                self._copy_waveform(results['duplicate_of'], results['file_name'], output_path)
+            quarantine.pop(str(audio_file.resolve()), None)
+            progress.update(1)
+        
+        def fail(audio_file: Path, stage: str, failure: TaskFailure):
+            failed[audio_file.name] = (audio_file, stage, failure)
+            print(f"\nError analyzing {audio_file.name}: {failure.message}")
+            if failure.fatal:
+                self._quarantine(quarantine, audio_file, stage, failure)
+            # Copies of a failed file would fail the same way
+            for duplicate, _ in waiting.pop(audio_file.name, []):
+                fail(duplicate, stage, TaskFailure('error', f"duplicate of {audio_file.name}, which failed",
+                                                   0.0))
+            progress.update(1)
+        
+        pool = SupervisedPool(TrackWorker, (self.worker_options,), workers=self.workers,
+                              timeout=self.file_timeout, memory_mb=self.file_memory_mb)
+        with pool, tqdm(total=len(audio_files), desc="Analyzing tracks") as progress:
+            first_task = 'fingerprint' if self.dedupe else 'analyze'
+            for audio_file in audio_files:
+                pool.submit((first_task, str(audio_file)), (first_task, str(audio_file)))
+            
+            for (kind, path), result, failure in pool.results():
+                audio_file = files[path]
+                if failure is not None:
+                    fail(audio_file, kind, failure)
+                    continue
                 
-                # Generate descriptions
-                self._save_track_descriptions(results, output_path)
+                try:
+                    if kind == 'fingerprint':
+                        # Reuse the analysis of an earlier copy of the same recording
+                        # (near-silent excerpts have no fingerprint and are always analyzed)
+                        fingerprint, duration = result
+                        match = fingerprints.find(fingerprint, duration) if fingerprint is not None else None
+                        if match is None:
+                            if fingerprint is not None:
+                                fingerprints.add(audio_file.name, fingerprint, duration)
+                            pool.submit(('analyze', path), ('analyze', path))
+                            continue
+                        original, distance = match
+                        if original in failed:
+                            fail(audio_file, kind, TaskFailure('error', f"duplicate of {original}, which failed", 0.0))
+                        elif original not in analyzed:
+                            waiting.setdefault(original, []).append((audio_file, distance))
+                        else:
+                            duplicates.setdefault(original, []).append((audio_file.name, distance))
+                            finish(audio_file, self._reuse_analysis(analyzed[original], audio_file.name, original))
+                        continue
+                    
+                    data, elapsed, cache_hit = result
+                    # Peaks go to a binary sidecar, not the JSON or the library
+                    waveform = data.pop('waveform', None)
+                    results = TrackAnalysis.from_dict(data) if set(FIELD_NAMES) <= set(data) else data
+                    analysis_time += elapsed
+                    if cache_hit is not None:
+                        cache_hits += cache_hit
+                        cache_misses += not cache_hit
+                    analyzed[audio_file.name] = results
+                    finish(audio_file, results, waveform)
+                    for duplicate, distance in waiting.pop(audio_file.name, []):
+                        duplicates.setdefault(audio_file.name, []).append((duplicate.name, distance))
+                        finish(duplicate, self._reuse_analysis(results, duplicate.name, audio_file.name))
                 
-            except Exception as e:
-                print(f"\nError analyzing {audio_file.name}: {e}")
-                continue
+                except Exception as e:
+                    fail(audio_file, kind, TaskFailure('error', str(e), 0.0))
+                    continue
         
-        # Generate reports
-        self._generate_summary_report(all_results, output_path)
-        self._generate_csv_export(all_results, output_path)
-        self._generate_genre_report(all_results, output_path)
+        self._save_quarantine(quarantine, output_path)
+        self._generate_failures_report(list(failed.values()), len(audio_files), len(skipped), pool.restarts,
+                                       output_path)
+        
+        if not all_results:
+            print(f"\nNo tracks could be analyzed; see {output_path / 'failures.txt'}")
+            return
+        
+        # Reports list tracks in directory order, however the workers finished
+        order = {f.name: i for i, f in enumerate(audio_files)}
+        all_results.sort(key=lambda r: order.get(r['file_name'], len(order)))
+        
+        # Generate reports (a subset of features only has the CSV)
+        if isinstance(all_results[0], TrackAnalysis):
+            self._generate_summary_report(all_results, output_path)
+            self._generate_csv_export(all_results, output_path)
+            self._save_table(all_results, output_path)
+            self._generate_genre_report(all_results, output_path)
+        else:
+            self._generate_csv_export(all_results, output_path)
+        if self.dedupe:
+            self._generate_duplicates_report(duplicates, len(all_results),
+                                             analysis_time / max(len(analyzed), 1), output_path)
+        
+        if self.audio_cache is not None:
+            stats = self.audio_cache.stats()
+            print(f"\nDecoded audio cache: {cache_hits} hits, {cache_misses} misses, "
+                  f"{stats['size_mb']}MB of {stats['max_mb']}MB")
         
         print(f"\n✓ Batch analysis complete! Results saved to {output_dir}/")
         
-    def _save_track_descriptions(self, results: dict, output_path: Path):
+    def _reuse_analysis(self, original: TrackAnalysis, file_name: str, original_name: str) -> TrackAnalysis:
+        """Copy an earlier track's analysis for a duplicate file"""
+        data = dict(original.items())
+        data.pop('peak_rss_mb', None)
+        data['file_name'] = file_name
+        data['duplicate_of'] = original_name
+        return TrackAnalysis.from_dict(data) if isinstance(original, TrackAnalysis) else data
+    
+    @staticmethod
+    def _save_waveform(data: bytes, file_name: str, output_path: Path):
+        track_dir = output_path / "individual_tracks"
+        with open(track_dir / f"{Path(file_name).stem}_waveform.bin", 'wb') as f:
+            f.write(data)
+    
+    @staticmethod
+    def _copy_waveform(original_name: str, file_name: str, output_path: Path):
+        """Give a duplicate file the waveform of the copy that was analyzed, if one was saved"""
+        track_dir = output_path / "individual_tracks"
+        original = track_dir / f"{Path(original_name).stem}_waveform.bin"
+        if original.exists():
+            shutil.copyfile(original, track_dir / f"{Path(file_name).stem}_waveform.bin")
+    
+    @staticmethod
+    def _load_quarantine(output_path: Path) -> dict:
+        """Files quarantined by earlier runs: resolved path -> details"""
+        try:
+            with open(output_path / "quarantine.json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    @staticmethod
+    def _save_quarantine(quarantine: dict, output_path: Path):
+        quarantine_file = output_path / "quarantine.json"
+        if quarantine or quarantine_file.exists():
+            with open(quarantine_file, 'w') as f:
+                json.dump(quarantine, f, indent=2)
+    
+    @staticmethod
+    def _is_quarantined(quarantine: dict, audio_file: Path) -> bool:
+        """Whether a file was quarantined and hasn't changed since"""
+        entry = quarantine.get(str(audio_file.resolve()))
+        if entry is None:
+            return False
+        stat = audio_file.stat()
+        return entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+    
+    @staticmethod
+    def _quarantine(quarantine: dict, audio_file: Path, stage: str, failure: TaskFailure):
+        stat = audio_file.stat()
+        quarantine[str(audio_file.resolve())] = {
+            'file_name': audio_file.name,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'stage': stage,
+            'reason': failure.reason,
+            'message': failure.message,
+            'date': datetime.now().isoformat(timespec='seconds'),
+        }
+    
+    def _save_track_descriptions(self, results: TrackAnalysis, output_path: Path):
         """Save individual track descriptions"""
         track_dir = output_path / "individual_tracks"
         track_dir.mkdir(exist_ok=True)
@@ -77,15 +340,14 @@ class BatchAnalyzer:
         # Save JSON
         json_file = track_dir / f"{Path(results['file_name']).stem}_analysis.json"
         with open(json_file, 'w') as f:
-            json.dump(results, f, indent=2)
+            json.dump(dict(results.items()), f, indent=2)
+        
+        # Descriptions need every field
+        if not isinstance(results, TrackAnalysis):
+            return
         
         # Save descriptions
-        descriptions = {
-            'youtube': self.generator.generate_youtube_description(results),
-            'podcast': self.generator.generate_podcast_description(results),
-            'library': self.generator.generate_library_tags(results),
-            'social': self.generator.generate_social_media(results)
-        }
+        descriptions = self.generator.generate_all(results)
         
         for format_type, description in descriptions.items():
             desc_file = track_dir / f"{Path(results['file_name']).stem}_{format_type}.txt"
@@ -187,6 +449,15 @@ class BatchAnalyzer:
             report.append(f"    {i}. {track['file_name']} ({track['valence']}%)")
         report.append("")
         
+        # Memory usage (lean mode)
+        peaks = [r['peak_rss_mb'] for r in results if r.get('peak_rss_mb') is not None]
+        if peaks:
+            report.append("MEMORY USAGE")
+            report.append("-"*70)
+            report.append(f"  Average Peak RSS: {sum(peaks)/len(peaks):.1f} MB")
+            report.append(f"  Highest Peak RSS: {max(peaks):.1f} MB")
+            report.append("")
+        
         report.append("="*70)
         
         # Save report
@@ -199,16 +470,84 @@ class BatchAnalyzer:
     
     def _generate_csv_export(self, results: list, output_path: Path):
         """Export results to CSV for easy analysis"""
-        df = pd.DataFrame(results)
+        df = pd.DataFrame(to_columns(results) if isinstance(results[0], TrackAnalysis) else results)
         
         # Flatten instruments list
-        df['instruments'] = df['instruments'].apply(lambda x: ', '.join(x))
+        if 'instruments' in df:
+            df['instruments'] = df['instruments'].apply(lambda x: ', '.join(x))
         
         # Save CSV
         csv_file = output_path / "music_analysis.csv"
         df.to_csv(csv_file, index=False)
         print(f"\n✓ Exported data to CSV: {csv_file}")
     
+    def _save_table(self, results: list, output_path: Path):
+        """Save all results as a compact binary table (see track_analysis.load_columns)"""
+        table_file = output_path / "music_analysis.tab"
+        save_table(results, table_file)
+        print(f"✓ Saved binary table: {table_file}")
+    
+    def _generate_duplicates_report(self, duplicates: dict, total: int, avg_analysis_time: float,
+                                    output_path: Path):
+        """Report groups of duplicate files and the analyses they saved"""
+        skipped = sum(len(copies) for copies in duplicates.values())
+        
+        report = []
+        report.append("="*60)
+        report.append("DUPLICATE GROUPS")
+        report.append("="*60)
+        report.append(f"Groups: {len(duplicates)}")
+        report.append(f"Duplicate Files: {skipped} of {total} ({skipped / max(total, 1) * 100:.1f}%)")
+        report.append(f"Analyses Skipped: {skipped} (~{skipped * avg_analysis_time:.0f}s saved)")
+        report.append("")
+        
+        for i, (original, copies) in enumerate(sorted(duplicates.items()), 1):
+            report.append(f"{i}. {original}")
+            for name, distance in copies:
+                report.append(f"   • {name} (fingerprint distance: {distance} bits)")
+        report.append("="*60)
+        
+        report_file = output_path / "duplicate_groups.txt"
+        with open(report_file, 'w') as f:
+            f.write('\n'.join(report))
+        
+        if skipped:
+            print(f"✓ Reused analyses for {skipped} duplicate files: {report_file}")
+    
+    def _generate_failures_report(self, failures: list, total: int, skipped: int, restarts: int,
+                                  output_path: Path):
+        """Report files that could not be analyzed, and why"""
+        quarantined = sum(failure.fatal for _, _, failure in failures)
+        
+        report = []
+        report.append("="*60)
+        report.append("FAILED FILES")
+        report.append("="*60)
+        report.append(f"Failed: {len(failures)} of {total}")
+        report.append(f"Quarantined: {quarantined} (hung, crashed or ran out of memory; "
+                      f"skipped by later runs until they change)")
+        report.append(f"Skipped (quarantined earlier): {skipped}")
+        report.append(f"Worker Restarts: {restarts}")
+        report.append("")
+        
+        for i, (audio_file, stage, failure) in enumerate(sorted(failures, key=lambda f: f[0].name), 1):
+            report.append(f"{i}. {audio_file.name}")
+            details = f"{failure.reason} while {'fingerprinting' if stage == 'fingerprint' else 'analyzing'}"
+            if failure.elapsed:
+                details += f" after {failure.elapsed:.1f}s"
+            if failure.peak_rss_mb:
+                details += f", peak memory {failure.peak_rss_mb:.0f}MB"
+            report.append(f"   • {details}{' (quarantined)' if failure.fatal else ''}")
+            report.append(f"   • {failure.message}")
+        report.append("="*60)
+        
+        report_file = output_path / "failures.txt"
+        with open(report_file, 'w') as f:
+            f.write('\n'.join(report))
+        
+        if failures:
+            print(f"⚠️  {len(failures)} files failed ({quarantined} quarantined): {report_file}")
+    
     def _generate_genre_report(self, results: list, output_path: Path):
         """Generate detailed genre-specific reports"""
         genre_dir = output_path / "genre_reports"
@@ -269,23 +608,72 @@ class BatchAnalyzer:
 
 def main():
     """Main entry point for batch analysis"""
-    import sys
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="Analyze all audio files in a directory and generate "
+                    "comprehensive reports and descriptions.",
+        epilog="Example: python batch_analyzer.py sample_tracks/"
+    )
+    parser.add_argument('input_dir', help="Directory containing audio files")
+    parser.add_argument('output_dir', nargs='?', default="batch_results",
+                        help="Directory to save results (default: batch_results)")
+    parser.add_argument('--lean', action='store_true',
+                        help="Memory-lean analysis (float32, segmented spectra, reused buffers); reports peak RSS")
+    parser.add_argument('--memory-budget', type=float, metavar='MB',
+                        help="Per-process memory budget; larger tracks are analyzed from a shorter excerpt")
+    parser.add_argument('--library', metavar='DB',
+                        help="Add each track to this library database as it finishes (e.g. music_library.db)")
+    parser.add_argument('--no-dedupe', action='store_true',
+                        help="Analyze every file, even duplicates of earlier files")
+    parser.add_argument('--audio-cache', metavar='DIR',
+                        help="Cache decoded audio here so re-running over the same files skips decoding")
+    parser.add_argument('--audio-cache-size', type=float, default=2048, metavar='MB',
+                        help="Size limit of the decoded audio cache (default: 2048)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes analyzing files in parallel (default: 1)")
+    parser.add_argument('--file-timeout', type=float, default=300, metavar='SECONDS',
+                        help="Kill the worker of a file still being processed after this long (default: 300)")
+    parser.add_argument('--file-memory', type=float, metavar='MB',
+                        help="Kill the worker of a file once it uses this much memory, 0 for no limit "
+                             f"(default: twice --memory-budget, else {DEFAULT_FILE_MEMORY_MB})")
+    parser.add_argument('--retry-quarantined', action='store_true',
+                        help="Try files that hung or crashed in earlier runs again")
+    parser.add_argument('--waveforms', action='store_true',
+                        help="Save each track's waveform peaks (individual_tracks/<track>_waveform.bin)")
+    parser.add_argument('--classifier-backend', choices=['torch', 'int8', 'onnx', 'none'], default='none',
+                        help="Load the classifier on this inference backend in each worker "
+                             "(default: none; genre detection doesn't use it yet)")
+    parser.add_argument('--features', metavar='LIST',
+                        help="Comma-separated features to compute, skipping the rest "
+                             f"({', '.join(MusicAnalyzer.FEATURES)}); only the per-track JSON and CSV are written")
+    args = parser.parse_args()
     
-    if len(sys.argv) < 2:
-        print("Batch Music Analyzer")
-        print("="*50)
-        print("Usage: python batch_analyzer.py <directory>")
-        print("\nExample:")
-        print("  python batch_analyzer.py sample_tracks/")
-        print("\nThis will analyze all audio files in the directory and")
-        print("generate comprehensive reports and descriptions.")
-        return
+    features = [name.strip() for name in args.features.split(',') if name.strip()] if args.features else None
+    unknown = [name for name in features or () if name not in MusicAnalyzer.FEATURES]
+    if unknown:
+        parser.error(f"unknown features: {', '.join(unknown)}")
     
-    input_dir = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else "batch_results"
+    file_memory = args.file_memory
+    if file_memory is None:
+        file_memory = 2 * args.memory_budget if args.memory_budget else DEFAULT_FILE_MEMORY_MB
     
-    batch = BatchAnalyzer()
-    batch.analyze_directory(input_dir, output_dir)
+    batch = BatchAnalyzer(
+        lean=args.lean,
+        memory_budget_mb=args.memory_budget,
+        library_path=args.library,
+        dedupe=not args.no_dedupe,
+        audio_cache_dir=args.audio_cache,
+        audio_cache_mb=args.audio_cache_size,
+        workers=args.workers,
+        file_timeout=args.file_timeout or None,
+        file_memory_mb=file_memory or None,
+        retry_quarantined=args.retry_quarantined,
+        waveforms=args.waveforms,
+        features=features,
+        classifier_backend=None if args.classifier_backend == 'none' else args.classifier_backend
+    )
+    batch.analyze_directory(args.input_dir, args.output_dir)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+"""
+Performance Benchmarks for Music Description Generator
+Measure the speed of analysis building blocks against their reference implementations
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+
+import numpy as np
+import librosa
+
+import fast_features
+import inference_backends
+from fast_features import frame_stats, spectral_stats, FRAME_LENGTH, HOP_LENGTH
+from memory_monitor import current_rss_bytes
+from music_analyzer import MusicAnalyzer
+
+
+def load_signal(audio_path: str = None, seconds: float = MusicAnalyzer.MAX_DURATION, seed: int = 0):
+    """Load a track for benchmarking, or synthesize one when no file is given"""
+    sr = MusicAnalyzer.SAMPLE_RATE
+    if audio_path:
+        return librosa.load(audio_path, sr=sr, duration=seconds)
+
+    # Different seeds shift the chord and the hit rate
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    root = 220 * 2 ** (seed % 12 / 12)
+    beat = 60 / (120 + 7 * (seed % 9))
+    y = 0.3 * np.sin(2 * np.pi * root * t) + 0.2 * np.sin(2 * np.pi * root * 1.5 * t)
+    y += 0.4 * np.exp(-(t % beat) * 30) * rng.standard_normal(len(t))  # 120 BPM hits for seed 0
+    return (y / np.abs(y).max()).astype(np.float32), sr
+
+
+def time_call(func, repeat: int) -> float:
+    """Best-of-N wall time of func() in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def print_table(title: str, header: list, rows: list):
+    """Print benchmark rows as an aligned table"""
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)))
+    print("="*70)
+
+
+def benchmark_kernels(args):
+    """Fused frame-statistics kernels versus separate librosa feature calls"""
+    y, sr = load_signal(args.audio)
+    S = np.abs(librosa.stft(y, n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH))
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=FRAME_LENGTH)
+
+    def reference():
+        return (
+            librosa.feature.zero_crossing_rate(y)[0],
+            librosa.feature.rms(y=y)[0],
+            librosa.feature.spectral_centroid(S=S, sr=sr)[0],
+            librosa.feature.spectral_rolloff(S=S, sr=sr)[0],
+        )
+
+    def fused():
+        zcr, rms = frame_stats(y)
+        centroid, rolloff = spectral_stats(S, freqs)
+        return zcr, rms, centroid, rolloff
+
+    expected = reference()
+    backends = [('numba', True), ('numpy', False)] if fast_features.HAVE_NUMBA else [('numpy', False)]
+    reference_time = time_call(reference, args.repeat)
+    rows = [['librosa', f"{reference_time * 1000:.1f}", '1.0x', '-']]
+
+    for name, use_numba in backends:
+        fast_features.HAVE_NUMBA = use_numba
+        actual = fused()  # warm up (JIT compile)
+        max_error = max(float(np.max(np.abs(a - e))) for a, e in zip(actual, expected))
+        elapsed = time_call(fused, args.repeat)
+        rows.append([f"fused ({name})", f"{elapsed * 1000:.1f}", f"{reference_time / elapsed:.1f}x", f"{max_error:.2e}"])
+    fast_features.HAVE_NUMBA = backends[0][1]
+
+    print_table(
+        f"ZCR + RMS + spectral centroid/rolloff ({len(y) / sr:.0f}s at {sr} Hz, best of {args.repeat})",
+        ['implementation', 'ms', 'speedup', 'max abs diff'],
+        rows
+    )
+
+
+def benchmark_classifier(args):
+    """Classifier latency, throughput, memory and accuracy drift per inference backend"""
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            model = args.model or inference_backends.create_test_model(tmp)
+        except ImportError:
+            print("torch is required to build the local test model; pass --model with an exported model directory")
+            sys.exit(1)
+        if args.audio:
+            signals = [load_signal(path, args.clip_seconds)[0] for path in args.audio]
+        else:
+            signals = [load_signal(seconds=args.clip_seconds, seed=seed)[0] for seed in range(args.clips)]
+        sr = MusicAnalyzer.SAMPLE_RATE
+        batches = [signals[i:i + args.batch_size] for i in range(0, len(signals), args.batch_size)]
+
+        rows = []
+        reference = None
+        for name in args.backends.split(','):
+            rss_before = current_rss_bytes() or 0
+            start = time.perf_counter()
+            try:
+                backend = inference_backends.create_backend(
+                    name, model,
+                    threads=args.threads,
+                    interop_threads=args.interop_threads,
+                    clip_seconds=args.clip_seconds
+                )
+            except Exception as e:
+                rows.append([name] + ['-'] * 6 + [f"unavailable: {e}"])
+                continue
+            load_time = time.perf_counter() - start
+            memory = ((current_rss_bytes() or 0) - rss_before) / (1024 * 1024)
+
+            probabilities = backend.probabilities(signals, sr)  # warm up
+            latencies = []
+            for _ in range(args.repeat):
+                for y in signals:
+                    start = time.perf_counter()
+                    backend.classify(y, sr)
+                    latencies.append(time.perf_counter() - start)
+            throughput = len(signals) / time_call(lambda: [backend.classify_batch(batch, sr) for batch in batches],
+                                                 args.repeat)
+
+            # Drift against the first backend benchmarked (torch eager by default)
+            if reference is None:
+                reference = probabilities
+                drift, agreement = '-', '-'
+            else:
+                drift = f"{np.abs(probabilities - reference).max():.2e}"
+                agreement = f"{np.mean(probabilities.argmax(axis=1) == reference.argmax(axis=1)) * 100:.0f}%"
+
+            rows.append([
+                name,
+                f"{load_time:.1f}",
+                f"{memory:.0f}",
+                f"{np.percentile(latencies, 50) * 1000:.1f}",
+                f"{np.percentile(latencies, 95) * 1000:.1f}",
+                f"{throughput:.1f}",
+                drift,
+                agreement
+            ])
+            del backend
+
+    print_table(
+        f"Classifier backends ({len(signals)} x {args.clip_seconds:.0f}s clips, batch {args.batch_size}, "
+        f"{args.threads or 'default'} threads, {args.repeat} repeats)",
+        ['backend', 'load s', 'RSS +MB', 'p50 ms', 'p95 ms', 'clips/s', 'max prob diff', 'top-1 agree'],
+        rows
+    )
+
+
+FEATURE_SETS = 'loudness;energy,loudness;instruments;tempo;key;tempo,key;danceability;genre,mood;all'
+
+
+def benchmark_features(args):
+    """Analysis time of feature subsets, each running only the extractors it needs"""
+    y, sr = load_signal(args.audio)
+    analyzer = MusicAnalyzer(lean=args.lean, classifier_backend=None)
+
+    def analyze(features):
+        return lambda: analyzer.analyze_signal(y, sr, 'benchmark', features)
+
+    full_time = time_call(analyze(None), args.repeat)
+    rows = []
+    for subset in args.sets.split(';'):
+        features = None if subset == 'all' else subset.split(',')
+        plan = analyzer.GRAPH.plan(analyzer.select_features(features), inputs=('y', 'sr'))
+        intermediates = ['/'.join(e.provides) for e in plan if e.name not in analyzer.FEATURES]
+        elapsed = full_time if features is None else time_call(analyze(features), args.repeat)
+        rows.append([
+            subset,
+            len(plan),
+            ', '.join(intermediates) or '-',
+            f"{elapsed * 1000:.1f}",
+            f"{elapsed / full_time * 100:.0f}%"
+        ])
+
+    print_table(
+        f"Feature subsets ({len(y) / sr:.0f}s at {sr} Hz{', lean' if args.lean else ''}, best of {args.repeat}; "
+        f"decoding not included)",
+        ['features', 'extractors', 'intermediates', 'ms', 'of full'],
+        rows
+    )
+
+
+def main():
+    """Main entry point for benchmarks"""
+    parser = argparse.ArgumentParser(description="Music Description Generator benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    kernels = subparsers.add_parser('kernels', help=benchmark_kernels.__doc__)
+    kernels.add_argument('audio', nargs='?', help="Audio file to use (default: synthetic signal)")
+    kernels.add_argument('--repeat', type=int, default=10)
+    kernels.set_defaults(func=benchmark_kernels)
+
+    classifier = subparsers.add_parser('classifier', help=benchmark_classifier.__doc__)
+    classifier.add_argument('audio', nargs='*', help="Audio files to classify (default: synthetic clips)")
+    classifier.add_argument('--model', help="Model id or local directory (default: a tiny random local model)")
+    classifier.add_argument('--backends', default=','.join(inference_backends.BACKENDS),
+                            help="Comma-separated backends; drift is measured against the first "
+                                 "(default: torch,int8,onnx)")
+    classifier.add_argument('--threads', type=int, help="Intra-op threads (default: runtime's choice)")
+    classifier.add_argument('--interop-threads', type=int, help="Inter-op threads (default: runtime's choice)")
+    classifier.add_argument('--clips', type=int, default=16, help="Number of synthetic clips (default: 16)")
+    classifier.add_argument('--clip-seconds', type=float, default=inference_backends.CLIP_SECONDS)
+    classifier.add_argument('--batch-size', type=int, default=8)
+    classifier.add_argument('--repeat', type=int, default=3)
+    classifier.set_defaults(func=benchmark_classifier)
+
+    features = subparsers.add_parser('features', help=benchmark_features.__doc__)
+    features.add_argument('audio', nargs='?', help="Audio file to use (default: synthetic signal)")
+    features.add_argument('--sets', default=FEATURE_SETS,
+                          help="Semicolon-separated feature subsets, each comma-separated, 'all' for a full "
+                               f"analysis (default: {FEATURE_SETS})")
+    features.add_argument('--lean', action='store_true', help="Use the analyzer's memory-lean mode")
+    features.add_argument('--repeat', type=int, default=3)
+    features.set_defaults(func=benchmark_features)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,585 @@
+"""
+Chunked, Resumable Uploads
+Receive large audio files in pieces and start analysis before the upload completes
+"""
+
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import numpy as np
+import librosa
+import soundfile as sf
+
+from track_analysis import TrackAnalysis
+
+try:
+    import soxr
+except ImportError:  # soxr ships with librosa>=0.10, but stay usable without it
+    soxr = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single server process (python app.py), threads only
+    fcntl = None
+
+
+# Formats that can be decoded while the upload is still in progress
+STREAMABLE_EXTENSIONS = {'.wav', '.flac'}
+
+REPLAY_BLOCK_SIZE = 8 * 1024 * 1024  # Bytes read at a time when re-decoding from disk
+
+# Files in an upload's directory: created (exclusively) by the process that
+# runs the analysis, and the outcome it publishes for the others
+CLAIM_FILE = 'analysis.claim'
+RESULT_FILE = 'analysis.json'
+RESULT_POLL_INTERVAL = 0.2   # Seconds between checks for another process's result
+CLAIM_TIMEOUT = 600          # Seconds after which an unfinished claim is presumed lost
+
+
+class UploadError(Exception):
+    """Raised for invalid chunked upload requests"""
+
+    def __init__(self, message: str, status: int = 400, received: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.received = received
+
+
+class SignalAccumulator:
+    """Collect decoded mono blocks, resampling them to the analysis rate as they arrive"""
+
+    def __init__(self, target_sr: int, max_duration: float):
+        self.target_sr = target_sr
+        self.max_duration = max_duration
+        self.source_sr = None
+        self._source_frames = 0
+        self._max_source_frames = None
+        self._blocks = []
+        self._resampler = None
+        self._signal = None
+
+    def set_source_rate(self, sr: int):
+        """Configure the native sample rate of the incoming blocks"""
+        self.source_sr = sr
+        self._max_source_frames = int(round(self.max_duration * sr))
+        if soxr is not None and sr != self.target_sr:
+            self._resampler = soxr.ResampleStream(sr, self.target_sr, 1, dtype='float32', quality='HQ')
+
+    @property
+    def full(self) -> bool:
+        """Whether the whole analysis window has been decoded"""
+        return self._max_source_frames is not None and self._source_frames >= self._max_source_frames
+
+    def add(self, block: np.ndarray):
+        """Add a native-rate mono block, trimming anything past the analysis window"""
+        if self.full or len(block) == 0:
+            return
+        block = block[:self._max_source_frames - self._source_frames]
+        self._source_frames += len(block)
+        if self._resampler is not None:
+            block = self._resampler.resample_chunk(block, last=self.full)
+        self._blocks.append(block)
+
+    def signal(self) -> np.ndarray:
+        """Return the accumulated signal at the analysis sample rate"""
+        if self._signal is None:
+            if self._resampler is not None and not self.full:
+                self._blocks.append(self._resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True))
+            y = np.concatenate(self._blocks) if self._blocks else np.zeros(0, dtype=np.float32)
+            if soxr is None and self.source_sr != self.target_sr:
+                y = librosa.resample(y, orig_sr=self.source_sr, target_sr=self.target_sr)
+            self._blocks = []
+            self._signal = y
+        return self._signal
+
+
+class WavStreamDecoder:
+    """Incremental RIFF/WAVE decoder fed with raw bytes as they arrive"""
+
+    def __init__(self, accumulator: SignalAccumulator):
+        self.accumulator = accumulator
+        self._buffer = bytearray()
+        self._header_done = False
+        self._channels = None
+        self._sample_width = None
+        self._is_float = False
+        self._data_remaining = None
+
+    def feed(self, data: bytes):
+        """Decode every complete frame available so far"""
+        if self.accumulator.full:
+            return
+        self._buffer.extend(data)
+        if not self._header_done and not self._parse_header():
+            return
+
+        frame_bytes = self._channels * self._sample_width
+        available = len(self._buffer)
+        if self._data_remaining is not None:
+            available = min(available, self._data_remaining)
+        n_frames = available // frame_bytes
+        if n_frames == 0:
+            return
+        raw = bytes(self._buffer[:n_frames * frame_bytes])
+        del self._buffer[:n_frames * frame_bytes]
+        if self._data_remaining is not None:
+            self._data_remaining -= len(raw)
+        self.accumulator.add(self._to_mono(raw, n_frames))
+
+    def _parse_header(self) -> bool:
+        """Parse the RIFF header once enough bytes have arrived"""
+        buf = self._buffer
+        if len(buf) < 12:
+            return False
+        if buf[:4] != b'RIFF' or buf[8:12] != b'WAVE':
+            raise ValueError("Not a RIFF/WAVE file")
+
+        pos = 12
+        while pos + 8 <= len(buf):
+            chunk_id = bytes(buf[pos:pos + 4])
+            chunk_size = struct.unpack('<I', buf[pos + 4:pos + 8])[0]
+            if chunk_id == b'data':
+                if self._channels is None:
+                    raise ValueError("WAV data chunk precedes fmt chunk")
+                del self._buffer[:pos + 8]
+                # Streaming writers leave the size as 0 or 0xFFFFFFFF
+                if chunk_size not in (0, 0xFFFFFFFF):
+                    self._data_remaining = chunk_size
+                self._header_done = True
+                return True
+            if pos + 8 + chunk_size > len(buf):
+                return False
+            if chunk_id == b'fmt ':
+                self._parse_fmt(bytes(buf[pos + 8:pos + 8 + chunk_size]))
+            pos += 8 + chunk_size + (chunk_size & 1)
+        return False
+
+    def _parse_fmt(self, fmt: bytes):
+        """Read the sample format from the fmt chunk"""
+        format_tag, channels, sample_rate = struct.unpack('<HHI', fmt[:8])
+        bits = struct.unpack('<H', fmt[14:16])[0]
+        if format_tag == 0xFFFE and len(fmt) >= 26:
+            format_tag = struct.unpack('<H', fmt[24:26])[0]
+        if format_tag not in (1, 3):
+            raise ValueError(f"Unsupported WAV encoding: {format_tag}")
+
+        self._channels = channels
+        self._sample_width = bits // 8
+        self._is_float = format_tag == 3
+        self.accumulator.set_source_rate(sample_rate)
+
+    def _to_mono(self, raw: bytes, n_frames: int) -> np.ndarray:
+        """Convert interleaved PCM bytes to a mono float32 block"""
+        width = self._sample_width
+        if self._is_float:
+            samples = np.frombuffer(raw, dtype='<f4' if width == 4 else '<f8').astype(np.float32)
+        elif width == 1:
+            samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+        elif width == 2:
+            samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768
+        elif width == 3:
+            padded = np.zeros((n_frames * self._channels, 4), dtype=np.uint8)
+            padded[:, 1:] = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+            samples = padded.view('<i4')[:, 0].astype(np.float32) / np.float32(2147483648)
+        else:
+            samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / np.float32(2147483648)
+        return samples.reshape(n_frames, self._channels).mean(axis=1)
+
+
+class FlacStreamDecoder:
+    """
+    Incremental FLAC decoder for a file that is still being written
+
+    Only frames comfortably inside the bytes received so far are decoded,
+    estimated from the total size announced when the upload started.
+    """
+
+    SAFETY_MARGIN = 256 * 1024
+
+    def __init__(self, accumulator: SignalAccumulator, path: Path, total_size: int):
+        self.accumulator = accumulator
+        self.path = path
+        self.total_size = total_size
+        self._position = 0
+
+    def feed(self, data: bytes, received: int):
+        """Decode newly available frames from the partial file"""
+        if self.accumulator.full:
+            return
+        complete = received >= self.total_size
+        if not complete and received < self.SAFETY_MARGIN * 2:
+            return
+
+        try:
+            f = sf.SoundFile(str(self.path))
+        except RuntimeError:
+            # Metadata blocks (e.g. cover art) have not fully arrived yet
+            if complete:
+                raise
+            return
+
+        with f:
+            if self.accumulator.source_sr is None:
+                self.accumulator.set_source_rate(f.samplerate)
+            if complete:
+                target = f.frames
+            else:
+                target = int(f.frames * (received - self.SAFETY_MARGIN) / self.total_size * 0.9)
+            if target <= self._position:
+                return
+            f.seek(self._position)
+            block = f.read(target - self._position, dtype='float32', always_2d=True)
+
+        self._position += len(block)
+        self.accumulator.add(block.mean(axis=1))
+
+
+class ChunkedUpload:
+    """State of a single in-progress upload"""
+
+    def __init__(self, upload_id: str, filename: str, size: int, directory: Path):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.size = size
+        self.directory = directory
+        self.path = directory / filename
+        self.received = self.path.stat().st_size if self.path.exists() else 0
+        self.decoded = 0   # Bytes fed to the decoder; differs from received after another process appended
+        self.updated = time.time()
+        self.lock = threading.Lock()
+        self.accumulator = None
+        self.decoder = None
+        self.future = None
+
+    @property
+    def complete(self) -> bool:
+        return self.received >= self.size
+
+    def status(self) -> Dict:
+        return {
+            'upload_id': self.upload_id,
+            'file_name': self.filename,
+            'size': self.size,
+            'received': self.received,
+            'complete': self.complete,
+            'analysis_started': self.future is not None or (self.directory / CLAIM_FILE).exists()
+        }
+
+
+class ChunkedUploadManager:
+    """
+    Track resumable uploads and overlap decoding/analysis with the transfer
+
+    WAV and FLAC uploads are decoded as chunks arrive. As soon as the
+    analysis window (the first MAX_DURATION seconds) has been decoded, the
+    analysis is submitted to the executor, so the result is usually ready
+    shortly after the last byte lands. Other formats are analyzed when the
+    upload finishes. An early analysis takes an admission slot, if one is
+    free; otherwise it waits for the finish.
+
+    Upload state lives on disk (`<upload_dir>/<upload_id>/`), so an upload
+    can be resumed after a restart, and the chunks of one upload may be
+    handled by different server processes. The file is the source of truth:
+    appends and finishes hold a file lock on the upload, take the bytes
+    received from the file size, and re-decode from disk when another
+    process has appended since this one last saw the upload. Exactly one
+    process analyzes an upload: it claims the analysis with a file created
+    exclusively in the upload's directory and writes the outcome there, and
+    a finish handled by another process waits for that outcome.
+    """
+
+    EXPIRY_SECONDS = 24 * 60 * 60
+
+    def __init__(self, upload_dir: str, analyzer, executor, max_file_size: int,
+                 admission: Optional[threading.Semaphore] = None,
+                 dumps: Callable[[Any], str] = json.dumps):
+        """
+        Args:
+            upload_dir: Where upload state is kept (shared by server processes)
+            analyzer: MusicAnalyzer running the analyses
+            executor: Pool the analyses run on
+            max_file_size: Largest upload accepted, in bytes
+            admission: Slots limiting concurrent analyses; early analyses
+                only start when one is free (None for no limit)
+            dumps: Serializes an analysis to JSON for other processes
+        """
+        self.upload_dir = Path(upload_dir)
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.analyzer = analyzer
+        self.executor = executor
+        self.max_file_size = max_file_size
+        self.admission = admission
+        self.dumps = dumps
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def start(self, filename: str, size: int) -> ChunkedUpload:
+        """Register a new upload of `size` bytes"""
+        if size <= 0:
+            raise UploadError("Upload size must be positive")
+        if size > self.max_file_size:
+            raise UploadError(f"File too large (max {self.max_file_size // (1024 * 1024)}MB)", status=413)
+
+        self._purge_expired()
+        upload_id = uuid.uuid4().hex
+        directory = self.upload_dir / upload_id
+        directory.mkdir()
+        with open(directory / 'upload.json', 'w') as f:
+            json.dump({'filename': filename, 'size': size}, f)
+
+        upload = ChunkedUpload(upload_id, filename, size, directory)
+        upload.path.touch()
+        self._init_decoder(upload)
+        with self._lock:
+            self._uploads[upload_id] = upload
+        return upload
+
+    def get(self, upload_id: str) -> ChunkedUpload:
+        """Look up an upload (restoring it from disk if needed), with the bytes received so far"""
+        directory = self.upload_dir / upload_id
+        meta_file = directory / 'upload.json'
+        if not upload_id.isalnum() or not meta_file.exists():
+            with self._lock:
+                self._uploads.pop(upload_id, None)   # finished or aborted by another process
+            raise UploadError("Unknown upload", status=404)
+
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is None:
+                with open(meta_file) as f:
+                    meta = json.load(f)
+                upload = ChunkedUpload(upload_id, meta['filename'], meta['size'], directory)
+                self._init_decoder(upload)
+                self._uploads[upload_id] = upload
+
+        with upload.lock:
+            try:
+                upload.received = upload.path.stat().st_size
+            except FileNotFoundError:
+                raise UploadError("Unknown upload", status=404)
+        return upload
+
+    def append(self, upload_id: str, offset: int, data: bytes) -> ChunkedUpload:
+        """Write a chunk that must start exactly at the bytes received so far"""
+        upload = self.get(upload_id)
+        with self._locked(upload):
+            if offset != upload.received:
+                raise UploadError("Offset mismatch", status=409, received=upload.received)
+            if upload.received + len(data) > upload.size:
+                raise UploadError("Chunk exceeds declared upload size", status=413, received=upload.received)
+
+            with open(upload.path, 'r+b') as f:
+                f.seek(offset)
+                f.write(data)
+            upload.received += len(data)
+            upload.updated = time.time()
+            self._decode(upload, data)
+        return upload
+
+    def finish(self, upload_id: str) -> Dict:
+        """Wait for (or run) the analysis of a completed upload"""
+        upload = self.get(upload_id)
+        with self._locked(upload):
+            if not upload.complete:
+                raise UploadError("Upload incomplete", status=409, received=upload.received)
+            if upload.future is None and self._claim(upload):
+                # The caller holds an admission slot for this analysis
+                analyze = self._analyze_decoded if upload.decoder is not None else self._analyze_file
+                upload.future = self.executor.submit(self._run_claimed, upload, analyze)
+
+        try:
+            if upload.future is not None:
+                return upload.future.result()
+            return self._claimed_result(upload)
+        finally:
+            self.discard(upload_id)
+
+    def discard(self, upload_id: str):
+        """Forget an upload and delete its data"""
+        with self._lock:
+            upload = self._uploads.pop(upload_id, None)
+        directory = upload.directory if upload else self.upload_dir / upload_id
+        if upload_id.isalnum():
+            shutil.rmtree(directory, ignore_errors=True)
+
+    @contextmanager
+    def _locked(self, upload: ChunkedUpload) -> Iterator[None]:
+        """
+        Hold the upload against other threads and processes, with its state
+        brought up to date with the file on disk
+        """
+        with upload.lock:
+            try:
+                lock_file = open(upload.directory / 'upload.lock', 'a')
+            except FileNotFoundError:
+                raise UploadError("Unknown upload", status=404)
+            with lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    upload.received = upload.path.stat().st_size
+                except FileNotFoundError:
+                    raise UploadError("Unknown upload", status=404)
+                if upload.future is None and (upload.directory / CLAIM_FILE).exists():
+                    # Another process is analyzing it; nothing to decode here
+                    upload.decoder = upload.accumulator = None
+                    upload.decoded = upload.received
+                elif upload.decoded != upload.received:
+                    self._replay(upload)
+                yield
+
+    def _replay(self, upload: ChunkedUpload):
+        """Decode the bytes on disk through a fresh decoder (unless analysis has already started)"""
+        received = upload.received
+        if upload.future is None:
+            self._init_decoder(upload)
+            with open(upload.path, 'rb') as f:
+                while upload.decoded < received and upload.decoder is not None and upload.future is None:
+                    block = f.read(min(REPLAY_BLOCK_SIZE, received - upload.decoded))
+                    if not block:
+                        break
+                    upload.received = upload.decoded + len(block)   # read by the FLAC decoder
+                    self._decode(upload, block)
+        upload.received = upload.decoded = received
+
+    def _init_decoder(self, upload: ChunkedUpload):
+        """Attach an incremental decoder for streamable formats"""
+        upload.decoded = 0
+        upload.accumulator = None
+        upload.decoder = None
+        extension = upload.path.suffix.lower()
+        if extension not in STREAMABLE_EXTENSIONS:
+            return
+        upload.accumulator = SignalAccumulator(self.analyzer.SAMPLE_RATE, self.analyzer.MAX_DURATION)
+        if extension == '.wav':
+            upload.decoder = WavStreamDecoder(upload.accumulator)
+        else:
+            upload.decoder = FlacStreamDecoder(upload.accumulator, upload.path, upload.size)
+
+    def _decode(self, upload: ChunkedUpload, data: bytes):
+        """Feed new bytes to the decoder and start analysis once the window is complete"""
+        upload.decoded += len(data)
+        if upload.decoder is None or upload.future is not None:
+            return
+        try:
+            if isinstance(upload.decoder, FlacStreamDecoder):
+                upload.decoder.feed(data, upload.received)
+            else:
+                upload.decoder.feed(data)
+        except Exception as e:
+            # Fall back to decoding the whole file once it has arrived
+            print(f"Incremental decoding disabled for {upload.filename}: {e}")
+            upload.decoder = None
+            upload.accumulator = None
+            return
+
+        if upload.accumulator.full:
+            self._start_early(upload)
+
+    def _start_early(self, upload: ChunkedUpload):
+        """Analyze the decoded window before the upload finishes, if a slot is free and no other process has"""
+        if self.admission is not None and not self.admission.acquire(blocking=False):
+            return  # tried again with the next chunk, or run by finish()
+        try:
+            if self._claim(upload):
+                upload.future = self.executor.submit(self._run_claimed, upload, self._analyze_decoded,
+                                                     self.admission is not None)
+            else:
+                upload.decoder = upload.accumulator = None
+        finally:
+            if upload.future is None and self.admission is not None:
+                self.admission.release()
+
+    def _claim(self, upload: ChunkedUpload) -> bool:
+        """Make this process the one analyzing the upload; False if another process already is"""
+        try:
+            fd = os.open(upload.directory / CLAIM_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        except FileNotFoundError:
+            raise UploadError("Unknown upload", status=404)
+        os.close(fd)
+        return True
+
+    def _run_claimed(self, upload: ChunkedUpload, analyze: Callable[[ChunkedUpload], Dict],
+                     release: bool = False) -> Dict:
+        """Run a claimed analysis and publish its outcome for other processes"""
+        try:
+            results = analyze(upload)
+        except Exception as e:
+            self._publish(upload, {'error': str(e) or type(e).__name__})
+            raise
+        finally:
+            upload.decoder = upload.accumulator = None
+            if release:
+                self.admission.release()
+        self._publish(upload, {'analysis': results.to_dict() if isinstance(results, TrackAnalysis) else results})
+        return results
+
+    def _publish(self, upload: ChunkedUpload, outcome: Dict):
+        """Write an analysis outcome to the upload's directory (atomically)"""
+        path = upload.directory / RESULT_FILE
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            text = self.dumps(outcome)
+        except (TypeError, ValueError) as e:
+            # Waiting processes must still hear of the outcome
+            text = json.dumps({'error': f"Analysis result not serializable: {e}"})
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass    # the upload was discarded meanwhile
+
+    def _claimed_result(self, upload: ChunkedUpload) -> Dict:
+        """
+        Wait for the outcome of an analysis claimed by another process,
+        analyzing the file here if that process seems to have gone away
+        """
+        claim = upload.directory / CLAIM_FILE
+        while True:
+            try:
+                with open(upload.directory / RESULT_FILE) as f:
+                    outcome = json.load(f)
+                break
+            except FileNotFoundError:
+                pass
+            try:
+                claimed_at = claim.stat().st_mtime
+            except FileNotFoundError:
+                raise UploadError("Unknown upload", status=404)
+            if claimed_at < time.time() - CLAIM_TIMEOUT:
+                return self._analyze_file(upload)
+            time.sleep(RESULT_POLL_INTERVAL)
+
+        if 'error' in outcome:
+            raise RuntimeError(outcome['error'])
+        return TrackAnalysis.from_dict(outcome['analysis'])
+
+    def _analyze_decoded(self, upload: ChunkedUpload) -> Dict:
+        """Analyze the signal decoded while the upload was in progress"""
+        y = upload.accumulator.signal()
+        return self.analyzer.analyze_signal(y, self.analyzer.SAMPLE_RATE, upload.filename)
+
+    def _analyze_file(self, upload: ChunkedUpload) -> Dict:
+        """Analyze the completed file"""
+        return self.analyzer.analyze_audio(str(upload.path))
+
+    def _purge_expired(self):
+        """Remove uploads that have been idle for too long"""
+        cutoff = time.time() - self.EXPIRY_SECONDS
+        for directory in self.upload_dir.iterdir():
+            if not directory.is_dir():
+                continue
+            last_write = max((p.stat().st_mtime for p in directory.iterdir()), default=directory.stat().st_mtime)
+            if last_write < cutoff:
+                self.discard(directory.name)
@@ -0,0 +1,178 @@
+"""
+Fused Frame-Level Feature Kernels
+Compute ZCR, RMS, spectral centroid and rolloff in single passes
+
+The kernels reproduce librosa's defaults (centered frames, edge padding for
+zero-crossing rate, zero padding for RMS) so results agree with
+`librosa.feature.*` to floating point tolerance. They are JIT-compiled with
+numba, which librosa itself depends on; the vectorized NumPy fallback (for
+environments where numba can't be imported) follows librosa's own
+expressions, so it gives identical results.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+ZCR_THRESHOLD = 1e-10
+
+
+def _n_frames(n_samples: int, frame_length: int, hop_length: int) -> int:
+    """Number of centered frames, as produced by librosa"""
+    padded = n_samples + 2 * (frame_length // 2)
+    return max(0, 1 + (padded - frame_length) // hop_length)
+
+
+if HAVE_NUMBA:
+
+    @njit(cache=True)
+    def _frame_stats_kernel(y, frame_length, hop_length, n_frames, threshold, zcr, rms):
+        pad = frame_length // 2
+        n = y.shape[0]
+        first = y[0]
+        last = y[n - 1]
+        for t in range(n_frames):
+            start = t * hop_length - pad
+            crossings = 0
+            energy = 0.0
+            prev_negative = False
+            for i in range(frame_length):
+                j = start + i
+                if j < 0:
+                    edge = first
+                    value = 0.0
+                elif j >= n:
+                    edge = last
+                    value = 0.0
+                else:
+                    edge = y[j]
+                    value = edge
+                energy += value * value
+                negative = edge < 0.0 and -edge > threshold
+                if i > 0 and negative != prev_negative:
+                    crossings += 1
+                prev_negative = negative
+            zcr[t] = crossings / frame_length
+            rms[t] = np.sqrt(energy / frame_length)
+
+    @njit(cache=True)
+    def _spectral_stats_kernel(S, freqs, roll_percent, tiny, centroid, rolloff):
+        n_bins, n_frames = S.shape
+        for t in range(n_frames):
+            total = 0.0
+            weighted = 0.0
+            # Rolloff accumulates in the spectrogram's own dtype, like np.cumsum
+            native_total = S[0, t] - S[0, t]
+            for k in range(n_bins):
+                value = S[k, t]
+                total += value
+                native_total += value
+                weighted += freqs[k] * value
+            centroid[t] = weighted / total if total >= tiny else weighted
+
+            threshold = roll_percent * native_total
+            running = S[0, t] - S[0, t]
+            rolloff[t] = freqs[n_bins - 1]
+            for k in range(n_bins):
+                running += S[k, t]
+                if running >= threshold:
+                    rolloff[t] = freqs[k]
+                    break
+
+
+def _frame_stats_numpy(y, frame_length, hop_length, n_frames, threshold):
+    """Vectorized fallback for frame_stats"""
+    pad = frame_length // 2
+    windows = np.lib.stride_tricks.sliding_window_view
+
+    edge_padded = np.pad(y, pad, mode='edge')
+    frames = windows(edge_padded, frame_length)[::hop_length][:n_frames]
+    negative = (frames < 0) & (np.abs(frames) > threshold)
+    zcr = np.count_nonzero(negative[:, 1:] != negative[:, :-1], axis=1) / frame_length
+
+    zero_padded = np.pad(y, pad, mode='constant')
+    frames = windows(zero_padded, frame_length)[::hop_length][:n_frames]
+    rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / frame_length)
+    return zcr, rms.astype(np.float32)
+
+
+def _spectral_stats_numpy(S, freqs, roll_percent, tiny):
+    """
+    Vectorized fallback for spectral_stats, evaluated the way librosa does
+    (same normalization, dtypes and cumulative sums), so results are the same
+    with or without numba
+    """
+    # Centroid: bin frequencies weighted by the L1-normalized column
+    # (librosa.util.normalize, leaving near-silent columns unnormalized)
+    length = np.sum(np.abs(S).astype(float), axis=0, keepdims=True)
+    length[length < tiny] = 1.0
+    normalized = np.empty_like(S)
+    normalized[:] = S / length
+    centroid = np.sum(freqs[:, None] * normalized, axis=0)
+
+    # Rolloff: the first bin whose cumulative energy reaches roll_percent of
+    # the column's cumulative total (not of a separately computed sum)
+    cumulative = np.cumsum(S, axis=0)
+    above = cumulative >= roll_percent * cumulative[-1]
+    rolloff = freqs[np.argmax(above, axis=0)]
+    return centroid, rolloff
+
+
+def frame_stats(y: np.ndarray, frame_length: int = FRAME_LENGTH, hop_length: int = HOP_LENGTH):
+    """
+    Zero-crossing rate and RMS energy of every frame in one pass
+
+    Args:
+        y: Mono audio signal
+        frame_length: Samples per frame
+        hop_length: Samples between frame starts
+
+    Returns:
+        Tuple of (zcr, rms) arrays, matching librosa.feature.zero_crossing_rate(y)[0]
+        and librosa.feature.rms(y=y)[0]
+    """
+    y = np.ascontiguousarray(y, dtype=np.float32)
+    n_frames = _n_frames(len(y), frame_length, hop_length)
+    if n_frames == 0 or len(y) == 0:
+        return np.zeros(0), np.zeros(0, dtype=np.float32)
+
+    if not HAVE_NUMBA:
+        return _frame_stats_numpy(y, frame_length, hop_length, n_frames, ZCR_THRESHOLD)
+
+    zcr = np.empty(n_frames)
+    rms = np.empty(n_frames, dtype=np.float32)
+    _frame_stats_kernel(y, frame_length, hop_length, n_frames, ZCR_THRESHOLD, zcr, rms)
+    return zcr, rms
+
+
+def spectral_stats(S: np.ndarray, freqs: np.ndarray, roll_percent: float = 0.85):
+    """
+    Spectral centroid and rolloff of every frame from one magnitude spectrogram
+
+    Args:
+        S: Magnitude spectrogram, shape (n_bins, n_frames)
+        freqs: Center frequency of each bin
+        roll_percent: Energy fraction below the rolloff frequency
+
+    Returns:
+        Tuple of (centroid, rolloff) arrays, matching
+        librosa.feature.spectral_centroid(S=S)[0] and spectral_rolloff(S=S)[0]
+    """
+    S = np.asarray(S)  # librosa's STFT is Fortran ordered: columns are contiguous
+    freqs = np.ascontiguousarray(freqs, dtype=np.float64)
+    tiny = float(np.finfo(S.dtype).tiny)
+
+    if not HAVE_NUMBA:
+        return _spectral_stats_numpy(S, freqs, roll_percent, tiny)
+
+    centroid = np.empty(S.shape[1])
+    rolloff = np.empty(S.shape[1])
+    _spectral_stats_kernel(S, freqs, S.dtype.type(roll_percent), tiny, centroid, rolloff)
+    return centroid, rolloff
@@ -0,0 +1,175 @@
+"""
+Feature Graph
+Registry of feature extractors and the values they depend on
+
+Each extractor declares the values it requires (the decoded signal, other
+intermediates such as the spectrogram or beats) and the values it provides.
+Asking for a set of features plans the smallest set of extractors that
+produces them, in dependency order; every intermediate is computed once,
+shared by all extractors that read it and released after its last reader.
+
+An extractor may also declare that it consumes one of its inputs (e.g.
+squares the spectrogram in place): it is then scheduled after every other
+reader of that value.
+
+    graph = FeatureGraph()
+
+    class Analyzer:
+        @graph.extractor('rms', requires=('y',))
+        def _rms(self, y): ...
+
+        @graph.extractor('energy', requires=('rms',))
+        def _energy(self, rms): ...
+
+    plan = graph.plan(['energy'], inputs=('y',))
+    values = {'y': y}
+    for extractor in graph.run(plan, analyzer, values, keep=['energy']):
+        ...
+"""
+
+import heapq
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple, Union
+
+
+class Extractor:
+    """One registered extractor: a function and the values it reads and provides"""
+
+    def __init__(self, index: int, function: Callable, provides: Tuple[str, ...],
+                 requires: Tuple[str, ...], consumes: Tuple[str, ...]):
+        self.index = index
+        self.function = function
+        self.provides = provides
+        self.requires = requires
+        self.consumes = consumes
+
+    @property
+    def name(self) -> str:
+        return self.provides[0]
+
+    def __repr__(self) -> str:
+        return f"Extractor({', '.join(self.provides)} <- {', '.join(self.requires)})"
+
+
+class FeatureGraph:
+    """Extractors by the values they provide, and planning of minimal runs"""
+
+    def __init__(self):
+        self.extractors: Dict[str, Extractor] = {}   # provided value -> extractor
+        self._count = 0
+
+    def extractor(self, provides: Union[str, Sequence[str]], requires: Sequence[str] = (),
+                  consumes: Sequence[str] = ()) -> Callable:
+        """
+        Decorator registering a method as an extractor (the method is returned unchanged)
+
+        Args:
+            provides: Value name, or names when the method returns a tuple
+            requires: Values passed to the method as positional arguments, in order
+            consumes: Required values the method may overwrite in place
+        """
+        provides = (provides,) if isinstance(provides, str) else tuple(provides)
+        if not set(consumes) <= set(requires):
+            raise ValueError(f"{provides[0]}: consumed values must also be required")
+
+        def register(function: Callable) -> Callable:
+            extractor = Extractor(self._count, function, provides, tuple(requires), tuple(consumes))
+            for name in provides:
+                if name in self.extractors:
+                    raise ValueError(f"{name!r} is already provided by {self.extractors[name]}")
+                self.extractors[name] = extractor
+            self._count += 1
+            return function
+        return register
+
+    def plan(self, targets: Sequence[str], inputs: Iterable[str] = ()) -> List[Extractor]:
+        """
+        Extractors needed for targets, in the order to run them
+
+        Args:
+            targets: Values wanted; earlier targets are produced first where
+                dependencies allow, so callers can report them sooner
+            inputs: Values supplied by the caller
+
+        Raises:
+            ValueError: A target or requirement nothing provides, or a cycle
+        """
+        inputs = set(inputs)
+
+        # Rank each needed extractor by the earliest target that needs it
+        rank: Dict[Extractor, int] = {}
+        stack = [(name, i) for i, name in enumerate(targets)]
+        while stack:
+            name, i = stack.pop()
+            if name in inputs:
+                continue
+            if name not in self.extractors:
+                raise ValueError(f"Nothing provides {name!r}")
+            extractor = self.extractors[name]
+            if rank.get(extractor, len(targets)) <= i:
+                continue
+            rank[extractor] = i
+            stack.extend((required, i) for required in extractor.requires)
+
+        # Run after the providers of the inputs, and consumers after the other readers
+        before = {extractor: set() for extractor in rank}
+        for extractor in rank:
+            before[extractor].update(self.extractors[name] for name in extractor.requires if name not in inputs)
+            for name in extractor.consumes:
+                before[extractor].update(other for other in rank
+                                         if other is not extractor and name in other.requires)
+
+        waiting = {extractor: len(after) for extractor, after in before.items()}
+        unblocks = {extractor: [] for extractor in rank}
+        for extractor, after in before.items():
+            for other in after:
+                unblocks[other].append(extractor)
+
+        ready = [(rank[e], e.index, e) for e, count in waiting.items() if count == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, _, extractor = heapq.heappop(ready)
+            order.append(extractor)
+            for other in unblocks[extractor]:
+                waiting[other] -= 1
+                if waiting[other] == 0:
+                    heapq.heappush(ready, (rank[other], other.index, other))
+        if len(order) < len(rank):
+            raise ValueError("Extractor dependencies form a cycle")
+        return order
+
+    def run(self, plan: List[Extractor], owner, values: Dict, keep: Iterable[str] = ()) -> Iterator[Extractor]:
+        """
+        Run a plan, adding each provided value to values
+
+        Intermediate values are removed from values after their last reader
+        (values in keep, and the caller's inputs, stay).
+
+        Args:
+            plan: Extractors from plan()
+            owner: Object the extractor methods are called on
+            values: The plan's inputs; filled in as extractors run
+            keep: Values to keep until the end (the targets)
+
+        Yields:
+            Each extractor after it has run
+        """
+        keep = set(keep)
+        readers: Dict[str, int] = {}
+        for extractor in plan:
+            for name in extractor.requires:
+                readers[name] = readers.get(name, 0) + 1
+        inputs = set(values)
+
+        for extractor in plan:
+            outputs = extractor.function(owner, *(values[name] for name in extractor.requires))
+            if len(extractor.provides) == 1:
+                outputs = (outputs,)
+            for name, value in zip(extractor.provides, outputs):
+                if readers.get(name) or name in keep:
+                    values[name] = value
+            for name in extractor.requires:
+                readers[name] -= 1
+                if readers[name] == 0 and name not in keep and name not in inputs:
+                    del values[name]
+            yield extractor
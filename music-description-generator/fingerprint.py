@@ -0,0 +1,189 @@
+"""
+Audio Fingerprinting
+Cheap fingerprints for spotting duplicate and near-duplicate audio files
+
+A fingerprint is a 128-bit SimHash of a short excerpt's chroma and log-mel
+band energies, averaged over 32 time blocks and normalized so that
+re-encoding (bitrate, format, sample rate) and gain changes barely move it.
+Copies of the same recording differ in a few bits; different recordings
+differ in about half of them.
+
+FingerprintIndex finds near-duplicates with locality-sensitive hashing: the
+bits are split into bands, and any stored fingerprint sharing a whole band
+with the query is a candidate, verified by Hamming distance. Because a
+distance of at most MAX_DISTANCE flips bits in fewer bands than there are,
+every match within the threshold is guaranteed to be found.
+
+Silent and near-silent excerpts are not fingerprinted (they would all look
+alike), and only files of about the same known length can match, so
+different edits sharing an intro are not merged.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import librosa
+import soundfile as sf
+
+
+FINGERPRINT_SAMPLE_RATE = 11025
+FINGERPRINT_DURATION = 15.0     # Seconds of audio fingerprinted
+MAX_LEADING_SILENCE = 5.0       # Extra seconds decoded so leading silence can be skipped
+SILENCE_DB = -40                # Samples this far below the peak count as silence
+MIN_RMS_DB = -60                # Quieter excerpts (dBFS RMS) are not fingerprinted
+N_BLOCKS = 32
+N_MELS = 20
+N_BITS = 128
+N_BANDS = 16                    # 8-bit LSH bands; any distance below this is always found
+MAX_DISTANCE = 10               # Re-encodes differ by ~0-2 bits, unrelated tracks by ~64
+DURATION_TOLERANCE = 1.0        # Seconds two copies' full lengths may differ
+
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Fixed random hyperplanes, so fingerprints are comparable across runs
+_PLANES = np.random.default_rng(20240611).standard_normal((N_BITS, N_BLOCKS * (12 + N_MELS)))
+
+
+def _blocks(features: np.ndarray) -> np.ndarray:
+    """Average features over N_BLOCKS equal time blocks"""
+    edges = np.linspace(0, features.shape[1], N_BLOCKS + 1)
+    frames = np.arange(features.shape[1])
+    block_of_frame = np.searchsorted(edges, frames, side='right') - 1
+    counts = np.bincount(block_of_frame, minlength=N_BLOCKS)
+    sums = np.zeros((features.shape[0], N_BLOCKS))
+    for block in range(N_BLOCKS):
+        sums[:, block] = features[:, block_of_frame == block].sum(axis=1)
+    return sums / np.maximum(counts, 1)
+
+
+def fingerprint_signal(y: np.ndarray, sr: int = FINGERPRINT_SAMPLE_RATE) -> Optional[np.ndarray]:
+    """
+    Fingerprint a mono signal
+
+    Args:
+        y: Audio signal, ideally at FINGERPRINT_SAMPLE_RATE
+        sr: Sample rate of y
+
+    Returns:
+        Fingerprint as N_BITS // 8 packed bytes (uint8 array), or None if
+        the excerpt is quieter than MIN_RMS_DB
+    """
+    # Skip leading silence, which differs between encoders and rips
+    peak = np.abs(y).max() if len(y) else 0
+    if peak > 0:
+        y = y[np.argmax(np.abs(y) > peak * 10 ** (SILENCE_DB / 20)):]
+    y = y[:int(FINGERPRINT_DURATION * sr)]
+    if not len(y) or np.sqrt(np.mean(np.square(y, dtype=np.float64))) < 10 ** (MIN_RMS_DB / 20):
+        return None
+    if len(y) < N_FFT:
+        y = np.pad(y, (0, N_FFT - len(y)))
+
+    S = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH)) ** 2
+    chroma = librosa.feature.chroma_stft(S=S, sr=sr)
+    mel = librosa.feature.melspectrogram(S=S, sr=sr, n_mels=N_MELS)
+    log_mel = np.log1p(mel * (1000 / max(mel.max(), 1e-10)))
+
+    # Per-band means are removed so EQ, gain and codec tilt cancel out;
+    # only how each band changes over time remains
+    features = np.vstack([_blocks(chroma), _blocks(log_mel)])
+    features -= features.mean(axis=1, keepdims=True)
+    bits = _PLANES @ features.ravel() > 0
+    return np.packbits(bits)
+
+
+def compute_fingerprint(audio_path: str) -> Tuple[Optional[np.ndarray], Optional[float]]:
+    """
+    Fingerprint an audio file from a short, low-rate decode
+
+    Args:
+        audio_path: Path to audio file
+
+    Returns:
+        Tuple of (fingerprint or None if too quiet, full duration in seconds
+        or None if unknown)
+    """
+    y, sr = librosa.load(audio_path, sr=FINGERPRINT_SAMPLE_RATE, mono=True,
+                         duration=FINGERPRINT_DURATION + MAX_LEADING_SILENCE)
+    try:
+        duration = sf.info(audio_path).duration
+    except Exception:
+        # Formats libsndfile can't open (e.g. MP3/M4A with older versions)
+        try:
+            duration = librosa.get_duration(path=audio_path)
+        except Exception:
+            duration = None
+    return fingerprint_signal(y, sr), duration
+
+
+def hamming_distance(a: np.ndarray, b: np.ndarray) -> int:
+    """Number of differing bits between two fingerprints"""
+    return int(np.unpackbits(np.bitwise_xor(a, b)).sum())
+
+
+class FingerprintIndex:
+    """
+    LSH index of fingerprints for near-duplicate lookup
+
+    Usage:
+        index = FingerprintIndex()
+        match = index.find(fingerprint, duration)
+        if match is None:
+            index.add(key, fingerprint, duration)
+    """
+
+    def __init__(self, max_distance: int = MAX_DISTANCE, duration_tolerance: float = DURATION_TOLERANCE):
+        """
+        Args:
+            max_distance: Largest Hamming distance (in bits) counted as a duplicate
+            duration_tolerance: Largest difference in full length, in seconds
+        """
+        if max_distance >= N_BANDS:
+            raise ValueError(f"max_distance must be below {N_BANDS} for every match to be found")
+        self.max_distance = max_distance
+        self.duration_tolerance = duration_tolerance
+        self.keys: List[str] = []
+        self.fingerprints: List[np.ndarray] = []
+        self.durations: List[Optional[float]] = []
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(N_BANDS)]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: str, fingerprint: np.ndarray, duration: Optional[float] = None):
+        """Store a fingerprint under key"""
+        position = len(self.keys)
+        self.keys.append(key)
+        self.fingerprints.append(fingerprint)
+        self.durations.append(duration)
+        for band, value in enumerate(fingerprint.tobytes()):
+            self._buckets[band].setdefault(value, []).append(position)
+
+    def find(self, fingerprint: np.ndarray, duration: Optional[float] = None) -> Optional[Tuple[str, int]]:
+        """
+        Closest stored near-duplicate of a fingerprint
+
+        Args:
+            fingerprint: Fingerprint to look up
+            duration: Full length of the audio; without it (or for stored
+                fingerprints without one) nothing matches, as files sharing
+                only their first seconds would otherwise be merged
+
+        Returns:
+            (key, Hamming distance) of the best match, or None
+        """
+        if duration is None:
+            return None
+        candidates = set()
+        for band, value in enumerate(fingerprint.tobytes()):
+            candidates.update(self._buckets[band].get(value, ()))
+
+        best = None
+        for position in candidates:
+            other = self.durations[position]
+            if other is None or abs(duration - other) > self.duration_tolerance:
+                continue
+            distance = hamming_distance(fingerprint, self.fingerprints[position])
+            if distance <= self.max_distance and (best is None or distance < best[1]):
+                best = (self.keys[position], distance)
+        return best
@@ -0,0 +1,344 @@
+"""
+Classifier Inference Backends
+Run the audio classification model on CPU with torch eager, int8-quantized
+torch or ONNX Runtime
+
+Every backend is a drop-in replacement for the `transformers` audio
+classification pipeline: call it with a signal and get back
+`[{'score': ..., 'label': ...}, ...]`. Audio is classified from a fixed-length
+clip, so input buffers can be allocated once and reused for every request.
+
+Backends:
+    - torch: the model in full precision, torch eager mode
+    - int8: Linear layers dynamically quantized to int8 (smaller, faster matmuls)
+    - onnx: the model exported once to ONNX and run with ONNX Runtime, with
+      inputs and outputs bound to preallocated buffers
+
+torch and onnxruntime are optional; each is only imported by the backends that
+need it.
+"""
+
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import librosa
+
+
+CLIP_SECONDS = 10.0
+ONNX_CACHE_DIR = 'onnx_models'
+TEST_LABELS = ('Electronic', 'Rock', 'Pop', 'Hip-Hop', 'Jazz', 'Classical', 'R&B', 'Ambient')
+
+
+class ClassifierBackend:
+    """
+    Base class: loads the feature extractor and labels, prepares fixed-length
+    inputs in reused buffers and turns logits into pipeline-style predictions
+
+    A backend runs one inference at a time (calls are serialized by a lock);
+    use `threads` for parallelism within each inference.
+    """
+
+    name = None
+
+    def __init__(self, model: str, threads: Optional[int] = None, interop_threads: Optional[int] = None,
+                 clip_seconds: float = CLIP_SECONDS):
+        """
+        Args:
+            model: Hugging Face model id or local model directory
+            threads: Threads used within an operator (intra-op); None keeps
+                the runtime's default
+            interop_threads: Threads used to run independent operators in
+                parallel; None keeps the runtime's default
+            clip_seconds: Length of audio classified per signal
+        """
+        from transformers import AutoConfig, AutoFeatureExtractor
+
+        self.model_name = model
+        self.threads = threads
+        self.interop_threads = interop_threads
+        self.feature_extractor = AutoFeatureExtractor.from_pretrained(model)
+        config = AutoConfig.from_pretrained(model)
+        self.labels = [config.id2label[i] for i in range(len(config.id2label))]
+        self.sampling_rate = self.feature_extractor.sampling_rate
+        self.clip_samples = int(clip_seconds * self.sampling_rate)
+        self._clips = {}    # batch size -> (batch, clip_samples) waveform buffer
+        self._lock = threading.Lock()
+
+    def __call__(self, inputs: Union[np.ndarray, Dict], top_k: int = 5) -> List[Dict]:
+        """
+        Classify one signal, like the transformers pipeline
+
+        Args:
+            inputs: Signal at the model's sampling rate, or
+                {'raw': signal, 'sampling_rate': sr}
+            top_k: Number of predictions returned
+
+        Returns:
+            List of {'score', 'label'} dictionaries, best first
+        """
+        if isinstance(inputs, dict):
+            return self.classify(inputs['raw'], inputs['sampling_rate'], top_k)
+        return self.classify(inputs, self.sampling_rate, top_k)
+
+    def classify(self, y: np.ndarray, sr: int, top_k: int = 5) -> List[Dict]:
+        """Top-k predictions for one mono signal"""
+        return self.classify_batch([y], sr, top_k)[0]
+
+    def classify_batch(self, signals: Sequence[np.ndarray], sr: int, top_k: int = 5) -> List[List[Dict]]:
+        """Top-k predictions for several mono signals, run as one batch"""
+        probabilities = self.probabilities(signals, sr)
+        predictions = []
+        for row in probabilities:
+            best = np.argsort(row)[::-1][:top_k]
+            predictions.append([{'score': float(row[i]), 'label': self.labels[i]} for i in best])
+        return predictions
+
+    def probabilities(self, signals: Sequence[np.ndarray], sr: int) -> np.ndarray:
+        """Class probabilities, shape (len(signals), len(labels))"""
+        logits = self.logits(signals, sr)
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def logits(self, signals: Sequence[np.ndarray], sr: int) -> np.ndarray:
+        """Raw model outputs, shape (len(signals), len(labels))"""
+        with self._lock:
+            return self._run(self._features(signals, sr)).copy()
+
+    def _features(self, signals: Sequence[np.ndarray], sr: int) -> Dict[str, np.ndarray]:
+        """Resample, trim or zero-pad each signal into the clip buffer and extract features"""
+        batch = len(signals)
+        clips = self._clips.get(batch)
+        if clips is None:
+            clips = self._clips[batch] = np.zeros((batch, self.clip_samples), dtype=np.float32)
+
+        for row, y in zip(clips, signals):
+            if sr != self.sampling_rate:
+                y = y[:int(np.ceil(self.clip_samples * sr / self.sampling_rate))]
+                y = librosa.resample(y, orig_sr=sr, target_sr=self.sampling_rate)
+            n = min(len(y), self.clip_samples)
+            row[:n] = y[:n]
+            row[n:] = 0
+        return dict(self.feature_extractor(list(clips), sampling_rate=self.sampling_rate, return_tensors='np'))
+
+    def _run(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """Run the model on extracted features and return logits"""
+        raise NotImplementedError
+
+
+class TorchBackend(ClassifierBackend):
+    """Full-precision model in torch eager mode"""
+
+    name = 'torch'
+
+    def __init__(self, model: str, threads: Optional[int] = None, interop_threads: Optional[int] = None,
+                 clip_seconds: float = CLIP_SECONDS):
+        super().__init__(model, threads, interop_threads, clip_seconds)
+        import torch
+
+        # Thread pools are process-wide; inter-op threads can only be set
+        # before torch runs any parallel work
+        if threads:
+            torch.set_num_threads(threads)
+        if interop_threads:
+            try:
+                torch.set_num_interop_threads(interop_threads)
+            except RuntimeError:
+                pass
+
+        self.torch = torch
+        self.model = self._load_model()
+        self._inputs = {}   # batch size -> {input name: tensor sharing memory with a numpy buffer}
+
+    def _load_model(self):
+        from transformers import AutoModelForAudioClassification
+        return AutoModelForAudioClassification.from_pretrained(self.model_name).eval()
+
+    def _run(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        batch = len(next(iter(features.values())))
+        inputs = self._inputs.get(batch)
+        if inputs is None:
+            inputs = self._inputs[batch] = {}
+            for name, value in features.items():
+                buffer = np.empty_like(value)
+                inputs[name] = (buffer, self.torch.from_numpy(buffer))
+
+        for name, value in features.items():
+            np.copyto(inputs[name][0], value)
+        with self.torch.inference_mode():
+            output = self.model(**{name: tensor for name, (_, tensor) in inputs.items()})
+        return output.logits.numpy()
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """Linear layers dynamically quantized to int8; activations stay float"""
+
+    name = 'int8'
+
+    def _load_model(self):
+        model = super()._load_model()
+        return self.torch.ao.quantization.quantize_dynamic(model, {self.torch.nn.Linear}, dtype=self.torch.qint8)
+
+
+class OnnxBackend(ClassifierBackend):
+    """Model exported to ONNX and run with ONNX Runtime"""
+
+    name = 'onnx'
+
+    def __init__(self, model: str, threads: Optional[int] = None, interop_threads: Optional[int] = None,
+                 clip_seconds: float = CLIP_SECONDS, onnx_path: Optional[str] = None):
+        """
+        Args:
+            model: Hugging Face model id or local model directory
+            threads: Threads used within an operator (intra-op)
+            interop_threads: Threads used to run independent operators in parallel
+            clip_seconds: Length of audio classified per signal
+            onnx_path: Exported graph to use; exported from the model on first
+                use if missing (default: model.onnx in a local model directory,
+                otherwise under onnx_models/)
+        """
+        super().__init__(model, threads, interop_threads, clip_seconds)
+        import onnxruntime
+
+        if onnx_path is None:
+            onnx_path = default_onnx_path(model)
+        if not Path(onnx_path).exists():
+            print(f"Exporting {model} to ONNX: {onnx_path}")
+            export_onnx(model, onnx_path, clip_seconds)
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads or 0     # 0: ONNX Runtime's default
+        options.inter_op_num_threads = interop_threads or 0
+        if interop_threads and interop_threads > 1:
+            options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Idle worker threads sleep instead of spinning, so web workers that
+        # share cores don't burn CPU between requests
+        options.add_session_config_entry('session.intra_op.allow_spinning', '0')
+
+        self.onnx_path = str(onnx_path)
+        self.session = onnxruntime.InferenceSession(self.onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        self.output_name = self.session.get_outputs()[0].name
+        self._bindings = {}     # batch size -> (IO binding, input buffers, logits buffer)
+
+    def _run(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        batch = len(next(iter(features.values())))
+        bound = self._bindings.get(batch)
+        if bound is None:
+            binding = self.session.io_binding()
+            inputs = {name: np.empty_like(features[name]) for name in self.input_names}
+            logits = np.empty((batch, len(self.labels)), dtype=np.float32)
+            for name, buffer in inputs.items():
+                binding.bind_input(name, 'cpu', 0, buffer.dtype, buffer.shape, buffer.ctypes.data)
+            binding.bind_output(self.output_name, 'cpu', 0, logits.dtype, logits.shape, logits.ctypes.data)
+            bound = self._bindings[batch] = (binding, inputs, logits)
+
+        binding, inputs, logits = bound
+        for name, buffer in inputs.items():
+            np.copyto(buffer, features[name])
+        self.session.run_with_iobinding(binding)
+        return logits
+
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    QuantizedTorchBackend.name: QuantizedTorchBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def create_backend(name: str, model: str, **options) -> ClassifierBackend:
+    """
+    Load a classifier with the named backend
+
+    Args:
+        name: One of BACKENDS ('torch', 'int8', 'onnx')
+        model: Hugging Face model id or local model directory
+        **options: Passed to the backend (threads, interop_threads, clip_seconds, ...)
+
+    Returns:
+        Backend instance, callable like the transformers pipeline
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown classifier backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name](model, **options)
+
+
+def default_onnx_path(model: str) -> Path:
+    """Where the exported graph of a model is kept"""
+    if Path(model).is_dir():
+        return Path(model) / 'model.onnx'
+    return Path(ONNX_CACHE_DIR) / f"{model.replace('/', '--')}.onnx"
+
+
+def export_onnx(model: str, onnx_path: str, clip_seconds: float = CLIP_SECONDS):
+    """
+    Export a model to ONNX for OnnxBackend (requires torch)
+
+    Args:
+        model: Hugging Face model id or local model directory
+        onnx_path: Output file
+        clip_seconds: Clip length the graph is traced with; the batch size stays dynamic
+    """
+    import torch
+    from transformers import AutoFeatureExtractor, AutoModelForAudioClassification
+
+    feature_extractor = AutoFeatureExtractor.from_pretrained(model)
+    classifier = AutoModelForAudioClassification.from_pretrained(model).eval()
+    clip = np.zeros(int(clip_seconds * feature_extractor.sampling_rate), dtype=np.float32)
+    features = feature_extractor([clip], sampling_rate=feature_extractor.sampling_rate, return_tensors='pt')
+
+    onnx_path = Path(onnx_path)
+    onnx_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = onnx_path.with_name(onnx_path.name + '.tmp')
+    with torch.no_grad():
+        torch.onnx.export(
+            classifier,
+            (dict(features),),
+            str(tmp_path),
+            input_names=list(features),
+            output_names=['logits'],
+            dynamic_axes={name: {0: 'batch'} for name in list(features) + ['logits']},
+            opset_version=14
+        )
+    tmp_path.replace(onnx_path)
+
+
+def create_test_model(path: str, labels: Sequence[str] = TEST_LABELS, seed: int = 0) -> str:
+    """
+    Save a tiny randomly initialized audio classifier for offline testing and
+    benchmarking (requires torch; nothing is downloaded)
+
+    Args:
+        path: Directory to save the model and feature extractor to
+        labels: Class labels
+        seed: Seed for the random weights
+
+    Returns:
+        The model directory, usable as `model` for any backend
+    """
+    import torch
+    from transformers import Wav2Vec2Config, Wav2Vec2FeatureExtractor, Wav2Vec2ForSequenceClassification
+
+    torch.manual_seed(seed)
+    config = Wav2Vec2Config(
+        hidden_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        intermediate_size=128,
+        conv_dim=(64, 64, 64),
+        conv_stride=(5, 4, 4),
+        conv_kernel=(10, 8, 4),
+        num_conv_pos_embeddings=16,
+        num_conv_pos_embedding_groups=4,
+        classifier_proj_size=32,
+        num_labels=len(labels),
+        id2label=dict(enumerate(labels)),
+        label2id={label: i for i, label in enumerate(labels)},
+    )
+    Wav2Vec2ForSequenceClassification(config).eval().save_pretrained(path)
+    Wav2Vec2FeatureExtractor(sampling_rate=16000, do_normalize=True).save_pretrained(path)
+    return str(path)
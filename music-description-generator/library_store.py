@@ -0,0 +1,660 @@
+"""
+Music Library Store
+Indexed store of analysis results with range and faceted queries
+
+Tracks are persisted in SQLite, which batch runs update one track at a time.
+Queries run against an in-memory column index (one NumPy array per field,
+categorical fields as integer codes) that is refreshed incrementally from
+SQLite whenever tracks have been added, so range filters, sorting and facet
+counts over a million tracks take milliseconds.
+
+The filter fields deliberately have no SQLite indexes. Queries combine many
+optional ranges and categories and then sort and count facets, and a B-tree
+serves at most one range per query, so SQLite would still scan most rows. A
+full pass over a few contiguous arrays is faster and just as fast for any mix
+of filters, and it costs SQLite nothing on writes. SQLite indexes only the
+columns used to read changes (seq) and text sorting. The column index is saved
+next to the database every INDEX_SAVE_ROWS tracks, so opening a store reads only
+the tracks added since then.
+
+Usage:
+    python library_store.py import batch_results/
+    python library_store.py query --key "A Minor" --tempo 120-128 --energy 70- --genre Electronic
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from track_analysis import TrackAnalysis, load_table
+
+
+# Filterable fields: categorical fields take one value or a list of values,
+# range fields take (min, max) with None for an open end
+CATEGORY_FIELDS = ('key', 'genre', 'sub_genre', 'mood', 'time_signature')
+RANGE_FIELDS = ('tempo', 'energy', 'danceability', 'valence', 'duration_seconds', 'loudness')
+TEXT_SORT_FIELDS = ('file_name', 'analysis_date')
+SORT_FIELDS = RANGE_FIELDS + CATEGORY_FIELDS + TEXT_SORT_FIELDS
+FACET_FIELDS = CATEGORY_FIELDS + ('instrument',)
+
+_INSTRUMENT_SEPARATOR = '\x1f'
+
+# The column index is saved next to the database once this many tracks have
+# been loaded since the last save, so new processes only read recent changes
+INDEX_SAVE_ROWS = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    file_name TEXT NOT NULL,
+    key TEXT,
+    genre TEXT,
+    sub_genre TEXT,
+    mood TEXT,
+    time_signature TEXT,
+    tempo REAL,
+    energy INTEGER,
+    danceability INTEGER,
+    valence INTEGER,
+    duration_seconds REAL,
+    loudness REAL,
+    instruments TEXT,
+    analysis_date TEXT,
+    seq INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS track_records (
+    track_id INTEGER PRIMARY KEY REFERENCES tracks(id) ON DELETE CASCADE,
+    record BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (name, value) VALUES ('seq', 0), ('epoch', 0);
+CREATE INDEX IF NOT EXISTS idx_tracks_seq ON tracks(seq);
+CREATE INDEX IF NOT EXISTS idx_tracks_file_name ON tracks(file_name);
+CREATE INDEX IF NOT EXISTS idx_tracks_analysis_date ON tracks(analysis_date);
+"""
+
+_COLUMN_SQL = f"SELECT id, {', '.join(CATEGORY_FIELDS + RANGE_FIELDS)}, instruments FROM tracks"
+
+Range = Tuple[Optional[float], Optional[float]]
+
+
+def parse_range(text: str) -> Range:
+    """
+    Parse a range such as "120-128", "70-" (at least), "-100" (at most) or "95"
+
+    Negative bounds work where unambiguous: "-20--10", "-20-", "--10".
+
+    Returns:
+        (min, max) tuple with None for an open end
+    """
+    text = text.replace('–', '-').replace(' ', '')
+    for i in range(1, len(text)):
+        if text[i] == '-' and (text[i - 1].isdigit() or text[i - 1] == '.'):
+            high = text[i + 1:]
+            return float(text[:i]), float(high) if high else None
+    if text.startswith('-'):
+        return None, float(text[1:])
+    value = float(text)
+    return value, value
+
+
+class _Labels:
+    """Integer codes for the values of a categorical field"""
+
+    def __init__(self, labels: Sequence[str] = ()):
+        self.labels = list(labels)
+        self.codes = {label: code for code, label in enumerate(self.labels)}
+
+    def encode(self, values: Sequence[str]) -> np.ndarray:
+        for value in dict.fromkeys(values):
+            if value not in self.codes:
+                self.codes[value] = len(self.labels)
+                self.labels.append(value)
+        return np.fromiter(map(self.codes.__getitem__, values), dtype=np.int32, count=len(values))
+
+    def copy(self) -> '_Labels':
+        return _Labels(self.labels)
+
+
+class _ColumnIndex:
+    """
+    Snapshot of the filterable fields, one array per field
+
+    Rows are ordered by track id. Refreshing returns a new snapshot, so
+    queries running in other threads keep a consistent view.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self.epoch = 0
+        self.created = 0
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.columns = {field: np.zeros(0, dtype=np.int32) for field in CATEGORY_FIELDS}
+        self.columns.update({field: np.zeros(0) for field in RANGE_FIELDS})
+        self.labels = {field: _Labels() for field in CATEGORY_FIELDS}
+        self.instruments = _Labels()
+        self.instrument_matrix = np.zeros((0, 0), dtype=bool)
+        self.text_ranks = {}
+        self.fetched = 0
+
+    def save(self, path: str):
+        """Write the snapshot to disk (atomically) for other processes to start from"""
+        arrays = {'ids': self.ids, 'versions': np.array([self.seq, self.epoch, self.created]),
+                  'instrument_matrix': self.instrument_matrix,
+                  'instrument_labels': np.array(self.instruments.labels, dtype=str)}
+        for field, column in self.columns.items():
+            arrays[f"column_{field}"] = column
+        for field, labels in self.labels.items():
+            arrays[f"labels_{field}"] = np.array(labels.labels, dtype=str)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        Path(tmp_path).replace(path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['_ColumnIndex']:
+        """Snapshot saved by save(), or None if missing or unreadable"""
+        try:
+            with np.load(path) as data:
+                index = cls()
+                index.seq, index.epoch, index.created = (int(v) for v in data['versions'])
+                index.ids = data['ids']
+                index.instrument_matrix = data['instrument_matrix']
+                index.instruments = _Labels(data['instrument_labels'].tolist())
+                index.columns = {field: data[f"column_{field}"] for field in CATEGORY_FIELDS + RANGE_FIELDS}
+                index.labels = {field: _Labels(data[f"labels_{field}"].tolist()) for field in CATEGORY_FIELDS}
+                return index
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def refreshed(self, conn: sqlite3.Connection, seq: int, epoch: int, created: int) -> '_ColumnIndex':
+        """Snapshot including every change up to seq (reloading after deletions)"""
+        full = epoch != self.epoch or created != self.created
+        rows = conn.execute(
+            _COLUMN_SQL + " WHERE seq > ? AND seq <= ? ORDER BY id", (0 if full else self.seq, seq)
+        ).fetchall()
+
+        new = _ColumnIndex()
+        new.seq, new.epoch, new.created = seq, epoch, created
+        new.fetched = self.fetched + len(rows) if not full else len(rows)
+        if not full:
+            new.labels = {field: labels.copy() for field, labels in self.labels.items()}
+            new.instruments = self.instruments.copy()
+            if not rows:
+                new.ids, new.columns, new.instrument_matrix = self.ids, self.columns, self.instrument_matrix
+                new.text_ranks = self.text_ranks
+                return new
+
+        ids, *fields = zip(*rows) if rows else ((),) * (2 + len(CATEGORY_FIELDS) + len(RANGE_FIELDS))
+        ids = np.array(ids, dtype=np.int64)
+        values = dict(zip(CATEGORY_FIELDS + RANGE_FIELDS, fields))
+        changed = {field: new.labels[field].encode(values[field]) for field in CATEGORY_FIELDS}
+        changed.update({field: np.array(values[field], dtype=np.float64) for field in RANGE_FIELDS})
+
+        # Instrument lists repeat a lot; decode each distinct list once
+        distinct = _Labels()
+        list_codes = distinct.encode(fields[-1])
+        instrument_codes = [
+            new.instruments.encode(label.split(_INSTRUMENT_SEPARATOR) if label else [])
+            for label in distinct.labels
+        ]
+        width = len(new.instruments.labels)
+        list_matrix = np.zeros((len(instrument_codes), width), dtype=bool)
+        for row, codes in enumerate(instrument_codes):
+            list_matrix[row, codes] = True
+        changed_matrix = list_matrix[list_codes]
+
+        if full:
+            new.ids, new.columns, new.instrument_matrix = ids, changed, changed_matrix
+            return new
+
+        # Updated tracks are overwritten (in copies); new tracks, whose ids
+        # are always larger, are appended
+        positions = np.searchsorted(self.ids, ids)
+        existing = positions < len(self.ids)
+        existing[existing] = self.ids[positions[existing]] == ids[existing]
+        updated = positions[existing]
+
+        columns = {}
+        for field, column in self.columns.items():
+            column = column.copy()
+            column[updated] = changed[field][existing]
+            columns[field] = np.concatenate([column, changed[field][~existing]])
+        matrix = np.zeros((len(self.ids), width), dtype=bool)
+        matrix[:, :self.instrument_matrix.shape[1]] = self.instrument_matrix
+        matrix[updated] = changed_matrix[existing]
+
+        new.ids = np.concatenate([self.ids, ids[~existing]])
+        new.columns = columns
+        new.instrument_matrix = np.concatenate([matrix, changed_matrix[~existing]])
+        return new
+
+    def mask(self, filters: Dict, conn: sqlite3.Connection) -> np.ndarray:
+        """Boolean mask of rows matching all filters"""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for name, value in filters.items():
+            if value is None or (not isinstance(value, str) and len(value) == 0):
+                continue
+            if name in CATEGORY_FIELDS:
+                codes = self.labels[name].codes
+                values = [value] if isinstance(value, str) else value
+                mask &= np.isin(self.columns[name], [codes[v] for v in values if v in codes])
+            elif name in RANGE_FIELDS:
+                low, high = value
+                if low is not None:
+                    mask &= self.columns[name] >= low
+                if high is not None:
+                    mask &= self.columns[name] <= high
+            elif name == 'instrument':
+                # Tracks must feature every listed instrument
+                for instrument in ([value] if isinstance(value, str) else value):
+                    code = self.instruments.codes.get(instrument)
+                    if code is None:
+                        mask[:] = False
+                    else:
+                        mask &= self.instrument_matrix[:, code]
+            elif name == 'file_name':
+                pattern = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                matches = conn.execute(
+                    "SELECT id FROM tracks WHERE file_name LIKE ? ESCAPE '\\'", (f"%{pattern}%",)
+                ).fetchall()
+                mask &= np.isin(self.ids, np.array([row[0] for row in matches], dtype=np.int64))
+            else:
+                raise ValueError(f"Unknown filter: {name}")
+        return mask
+
+    def sort_key(self, field: str, conn: sqlite3.Connection) -> np.ndarray:
+        """Per-row values whose order is the order of field"""
+        if field in RANGE_FIELDS:
+            return self.columns[field]
+        if field in CATEGORY_FIELDS:
+            labels = self.labels[field].labels
+            rank = np.empty(len(labels), dtype=np.int64)
+            rank[np.argsort(np.array(labels, dtype=object))] = np.arange(len(labels))
+            return rank[self.columns[field]]
+        if field not in self.text_ranks:
+            # Text fields are ordered by SQLite (via their index), once per snapshot
+            ordered = np.array([row[0] for row in conn.execute(f"SELECT id FROM tracks ORDER BY {field}, id")],
+                               dtype=np.int64)
+            ordered = ordered[np.isin(ordered, self.ids)]
+            rank = np.full(len(self.ids), len(ordered), dtype=np.int64)
+            rank[np.searchsorted(self.ids, ordered)] = np.arange(len(ordered))
+            self.text_ranks[field] = rank
+        return self.text_ranks[field]
+
+
+class LibraryStore:
+    """
+    Indexed store of TrackAnalysis records
+
+    Each thread gets its own SQLite connection and all threads share the
+    column index, so one store can serve a threaded web server. SQLite runs
+    in WAL mode so searches keep working while a batch run adds tracks.
+    """
+
+    def __init__(self, db_path: str = "music_library.db"):
+        """
+        Args:
+            db_path: SQLite database file (created if missing)
+        """
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._index = None
+        self._index_path = None if self.db_path == ':memory:' else self.db_path + '.index.npz'
+        conn = self._connection()
+        with conn:
+            conn.executescript(SCHEMA)
+            # Identifies this database, so a saved index is never applied to a recreated one
+            conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('created', ?)", (time.time_ns(),))
+
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection to the database"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def _versions(conn: sqlite3.Connection) -> Tuple[int, int, int]:
+        """Current (seq, epoch, created) change counters and database identity"""
+        versions = dict(conn.execute("SELECT name, value FROM meta"))
+        return versions['seq'], versions['epoch'], versions['created']
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, name: str) -> int:
+        """Increment and return a change counter"""
+        conn.execute("UPDATE meta SET value = value + 1 WHERE name = ?", (name,))
+        return conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()[0]
+
+    # Writing
+
+    def add(self, record: Union[TrackAnalysis, Dict], path: str = None):
+        """
+        Add or replace one track
+
+        Args:
+            record: Analysis results
+            path: Unique identifier of the source file (default: its file name)
+        """
+        self.add_many([(record, path)])
+
+    def add_many(self, entries: Iterable[Union[TrackAnalysis, Dict, Tuple]]) -> int:
+        """
+        Add or replace many tracks in a single transaction
+
+        Args:
+            entries: Records, or (record, path) pairs
+
+        Returns:
+            Number of tracks written
+        """
+        count = 0
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                seq = self._bump(conn, 'seq')
+                for entry in entries:
+                    record, path = entry if isinstance(entry, tuple) else (entry, None)
+                    if not isinstance(record, TrackAnalysis):
+                        record = TrackAnalysis.from_dict(record)
+                    self._upsert(conn, record, path or record.file_name, seq)
+                    count += 1
+        return count
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, record: TrackAnalysis, path: str, seq: int):
+        conn.execute(
+            """
+            INSERT INTO tracks (path, file_name, key, genre, sub_genre, mood, time_signature,
+                                tempo, energy, danceability, valence, duration_seconds,
+                                loudness, instruments, analysis_date, seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                file_name=excluded.file_name, key=excluded.key, genre=excluded.genre,
+                sub_genre=excluded.sub_genre, mood=excluded.mood,
+                time_signature=excluded.time_signature, tempo=excluded.tempo,
+                energy=excluded.energy, danceability=excluded.danceability,
+                valence=excluded.valence, duration_seconds=excluded.duration_seconds,
+                loudness=excluded.loudness, instruments=excluded.instruments,
+                analysis_date=excluded.analysis_date, seq=excluded.seq
+            """,
+            (path, record.file_name, record.key, record.genre, record.sub_genre, record.mood,
+             record.time_signature, record.tempo, record.energy, record.danceability,
+             record.valence, record.duration_seconds, record.loudness,
+             _INSTRUMENT_SEPARATOR.join(record.instruments), record.analysis_date, seq)
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO track_records (track_id, record) SELECT id, ? FROM tracks WHERE path = ?",
+            (record.pack(), path)
+        )
+
+    def remove(self, path: str) -> bool:
+        """Remove a track; returns whether it existed"""
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                removed = conn.execute("DELETE FROM tracks WHERE path = ?", (path,)).rowcount > 0
+                if removed:
+                    self._bump(conn, 'epoch')
+                return removed
+
+    def import_results(self, results_dir: str) -> int:
+        """
+        Import the output of a batch run
+
+        Args:
+            results_dir: Batch output directory (uses music_analysis.tab when
+                present, otherwise individual_tracks/*_analysis.json)
+
+        Returns:
+            Number of tracks imported
+        """
+        results_path = Path(results_dir)
+        table = results_path / "music_analysis.tab"
+        if table.exists():
+            return self.add_many(load_table(table))
+
+        def records():
+            for json_file in sorted((results_path / "individual_tracks").glob("*_analysis.json")):
+                with open(json_file) as f:
+                    yield json.load(f)
+
+        return self.add_many(records())
+
+    # Querying
+
+    def _current_index(self) -> _ColumnIndex:
+        """Column index including every committed change"""
+        conn = self._connection()
+        versions = self._versions(conn)
+        index = self._index
+        if index is None or (index.seq, index.epoch, index.created) != versions:
+            with self._index_lock:
+                index = self._index
+                if index is None:
+                    saved = _ColumnIndex.load(self._index_path) if self._index_path else None
+                    usable = saved is not None and saved.created == versions[2] and saved.epoch == versions[1] \
+                        and saved.seq <= versions[0]
+                    index = saved if usable else _ColumnIndex()
+                if (index.seq, index.epoch, index.created) != versions:
+                    index = index.refreshed(conn, *versions)
+                    if self._index_path and index.fetched >= INDEX_SAVE_ROWS:
+                        try:
+                            index.save(self._index_path)
+                            index.fetched = 0
+                        except OSError:
+                            pass
+                self._index = index
+        return index
+
+    def query(self, sort: str = 'tempo', descending: bool = False,
+              limit: int = 50, offset: int = 0, **filters) -> List[TrackAnalysis]:
+        """
+        Find tracks matching all filters
+
+        Args:
+            sort: Field to order by (see SORT_FIELDS)
+            descending: Reverse the order
+            limit: Maximum number of tracks returned (at least 0)
+            offset: Number of matching tracks to skip (at least 0)
+            **filters: key/genre/sub_genre/mood/time_signature (value or list),
+                tempo/energy/danceability/valence/duration_seconds/loudness
+                ((min, max) tuple), instrument (value or list, all required),
+                file_name (substring)
+
+        Returns:
+            List of TrackAnalysis records
+
+        Example:
+            store.query(key='A Minor', tempo=(120, 128), energy=(70, None), genre='Electronic')
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort by {sort}; choose from {', '.join(SORT_FIELDS)}")
+        if limit < 0 or offset < 0:
+            raise ValueError("limit and offset must not be negative")
+        if limit == 0:
+            return []
+        conn = self._connection()
+        index = self._current_index()
+        rows = np.flatnonzero(index.mask(filters, conn))
+
+        # Partial sort: only rows that can appear on this page are ordered,
+        # with ties broken by track id so paging is stable
+        end = offset + limit
+        values = index.sort_key(sort, conn)[rows]
+        if descending:
+            values = -values
+        if end < len(rows):
+            cutoff = np.partition(values, end - 1)[end - 1]
+            candidates = values <= cutoff
+            rows, values = rows[candidates], values[candidates]
+        page = rows[np.lexsort((index.ids[rows], values))][offset:end]
+        return self.get(index.ids[page].tolist())
+
+    def get(self, ids: Sequence[int]) -> List[TrackAnalysis]:
+        """Records of the given track ids, in the same order (missing ids are skipped)"""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return []
+        records = dict(self._connection().execute(
+            f"SELECT track_id, record FROM track_records WHERE track_id IN ({', '.join('?' * len(ids))})", ids
+        ).fetchall())
+        return [TrackAnalysis.unpack(records[i]) for i in ids if i in records]
+
+    def columns(self, fields: Sequence[str], **filters) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Values of some fields for every track matching the filters, for
+        computations over the whole library
+
+        Args:
+            fields: Range fields (returned as floats) or categorical fields
+                (returned as object arrays of strings)
+            **filters: Same as query
+
+        Returns:
+            Tuple of (track ids, {field: values}), all in the same order
+        """
+        index = self._current_index()
+        rows = np.flatnonzero(index.mask(filters, self._connection()))
+        values = {}
+        for field in fields:
+            if field in CATEGORY_FIELDS:
+                labels = np.array(index.labels[field].labels, dtype=object)
+                values[field] = labels[index.columns[field][rows]]
+            elif field in RANGE_FIELDS:
+                values[field] = index.columns[field][rows]
+            else:
+                raise ValueError(f"Unknown field: {field}")
+        return index.ids[rows], values
+
+    def count(self, **filters) -> int:
+        """Number of tracks matching the filters (same arguments as query)"""
+        return int(np.count_nonzero(self._current_index().mask(filters, self._connection())))
+
+    def facets(self, fields: Sequence[str] = ('genre', 'key', 'mood'), limit: int = 20,
+               **filters) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        Value counts of categorical fields among tracks matching the filters
+
+        Args:
+            fields: Fields to count (see FACET_FIELDS)
+            limit: Maximum values returned per field, most common first
+            **filters: Same as query
+
+        Returns:
+            Dictionary mapping each field to [(value, count), ...]
+        """
+        for field in fields:
+            if field not in FACET_FIELDS:
+                raise ValueError(f"Cannot facet on {field}; choose from {', '.join(FACET_FIELDS)}")
+        index = self._current_index()
+        mask = index.mask(filters, self._connection())
+
+        results = {}
+        for field in fields:
+            if field == 'instrument':
+                labels = index.instruments.labels
+                counts = index.instrument_matrix[mask].sum(axis=0)
+            else:
+                labels = index.labels[field].labels
+                counts = np.bincount(index.columns[field][mask], minlength=len(labels))
+            order = sorted(np.flatnonzero(counts), key=lambda code: (-counts[code], labels[code]))
+            results[field] = [(labels[code], int(counts[code])) for code in order[:limit]]
+        return results
+
+    def __len__(self) -> int:
+        return len(self._current_index().ids)
+
+
+def main():
+    """Command-line interface for the library store"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Indexed music library built from analysis results")
+    parser.add_argument('--db', default="music_library.db", help="Library database (default: music_library.db)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help="Import the results of a batch run")
+    import_parser.add_argument('results_dir', nargs='+', help="Batch output directories")
+
+    query_parser = subparsers.add_parser(
+        'query', help="Search the library",
+        epilog='Ranges: "120-128", "70-" (at least), "-40" (at most). '
+               'Repeat --key/--genre/--mood to match any of several values.'
+    )
+    for field in CATEGORY_FIELDS:
+        query_parser.add_argument(f"--{field.replace('_', '-')}", dest=field, action='append')
+    query_parser.add_argument('--instrument', action='append', help="Required instrument (repeatable)")
+    for field in RANGE_FIELDS:
+        query_parser.add_argument(f"--{field.replace('_', '-')}", dest=field, type=parse_range, metavar='RANGE')
+    query_parser.add_argument('--name', dest='file_name', help="File name contains")
+    query_parser.add_argument('--sort', default='tempo', choices=SORT_FIELDS)
+    query_parser.add_argument('--desc', action='store_true', help="Sort descending")
+    query_parser.add_argument('--limit', type=int, default=50)
+    query_parser.add_argument('--facets', nargs='*', choices=FACET_FIELDS, metavar='FIELD',
+                              help="Also show value counts (default: genre key mood)")
+    query_parser.add_argument('--json', action='store_true', help="Output results as JSON lines")
+
+    args = parser.parse_args()
+    store = LibraryStore(args.db)
+
+    if args.command == 'import':
+        for results_dir in args.results_dir:
+            count = store.import_results(results_dir)
+            print(f"✓ Imported {count} tracks from {results_dir}")
+        print(f"Library now contains {len(store)} tracks ({args.db})")
+        return
+
+    start = time.perf_counter()
+    size = len(store)
+    loaded = time.perf_counter() - start
+
+    filters = {field: getattr(args, field) for field in CATEGORY_FIELDS + RANGE_FIELDS + ('instrument', 'file_name')}
+    start = time.perf_counter()
+    tracks = store.query(sort=args.sort, descending=args.desc, limit=args.limit, **filters)
+    total = store.count(**filters)
+    facets = store.facets(args.facets or ('genre', 'key', 'mood'), **filters) if args.facets is not None else None
+    elapsed = (time.perf_counter() - start) * 1000
+
+    if args.json:
+        for track in tracks:
+            print(json.dumps(track.to_dict()))
+        return
+
+    print(f"\n{total} of {size} tracks match ({elapsed:.1f} ms, index loaded in {loaded:.2f} s), showing {len(tracks)}")
+    print("="*70)
+    for track in tracks:
+        print(f"{track['file_name']}")
+        print(f"  {track['genre']} | {track['key']} | {track['tempo']} BPM | {track['mood']} | "
+              f"Energy {track['energy']}% | Danceability {track['danceability']}% | Valence {track['valence']}%")
+    if facets:
+        for field, counts in facets.items():
+            print(f"\n{field.replace('_', ' ').title()}:")
+            for value, count in counts:
+                print(f"  {value}: {count}")
+
+
+if __name__ == "__main__":
+    main()
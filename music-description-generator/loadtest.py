@@ -0,0 +1,533 @@
+"""
+Load Testing for the Music Description Generator Web Service
+Drive /upload and /download with synthetic tracks and measure how the server holds up
+
+Tracks are synthesized locally in a configurable mix of lengths. Every upload
+is made unique (one sample is changed per request) so the server's result
+cache doesn't answer repeats, unless --allow-cache-hits is given.
+
+Load is either closed-loop (--concurrency clients sending back to back) or
+open-loop (--rate requests per second with random arrivals, at most
+--concurrency outstanding). Open-loop latencies are measured from each
+request's scheduled arrival, so time spent waiting for a free client counts.
+
+With --deadline, uploads the server answers with 202 (still refining) are
+polled at their Location until they complete; the 202s are reported
+separately and the end-to-end latency of those uploads as 'complete'.
+
+Usage:
+    python loadtest.py run --concurrency 8 --duration 60 --output c8.json
+    python loadtest.py run --rate 2 --mix 10:0.7,60:0.3 --output r2.json
+    python loadtest.py compare c8.json r2.json
+"""
+
+import argparse
+import http.client
+import io
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+
+SAMPLE_RATE = 22050
+DESCRIPTION_FORMATS = ['youtube', 'podcast', 'library', 'social']
+POLL_WAIT = 10              # seconds each /result long poll may wait for a stage
+
+
+def synthesize_wav(seconds: float, seed: int = 0) -> bytes:
+    """A 16-bit mono WAV of a chord with noisy percussive hits"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    root = 220 * 2 ** (seed % 12 / 12)
+    beat = 60 / (100 + 7 * (seed % 9))
+    y = 0.3 * np.sin(2 * np.pi * root * t) + 0.2 * np.sin(2 * np.pi * root * 1.5 * t)
+    y += 0.4 * np.exp(-(t % beat) * 30) * rng.standard_normal(len(t))
+    pcm = (y / np.abs(y).max() * 32000).astype('<i2')
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def parse_mix(mix: str) -> List[Tuple[float, float]]:
+    """Parse 'seconds:weight,...' (e.g. '10:0.5,30:0.3,60:0.2') into normalized pairs"""
+    pairs = []
+    for item in mix.split(','):
+        seconds, _, weight = item.partition(':')
+        try:
+            pairs.append((float(seconds), float(weight or 1)))
+        except ValueError:
+            raise ValueError(f"Invalid file-size mix: {mix!r}")
+    total = sum(weight for _, weight in pairs)
+    if not pairs or total <= 0 or any(seconds <= 0 or weight < 0 for seconds, weight in pairs):
+        raise ValueError(f"Invalid file-size mix: {mix!r}")
+    return [(seconds, weight / total) for seconds, weight in pairs]
+
+
+def multipart_body(fields: Dict[str, str], filename: str, data: bytes) -> Tuple[bytes, str]:
+    """Encode form fields and one 'audio' file; returns (body, content type)"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="audio"; filename="{filename}"\r\n'
+        f'Content-Type: audio/wav\r\n\r\n'.encode()
+    )
+    parts.append(data)
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Client:
+    """HTTP client keeping one connection per thread"""
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method: str, path: str, body: bytes = None,
+                headers: Dict[str, str] = None, with_headers: bool = False) -> Tuple:
+        """
+        Send a request, reconnecting once if a kept-alive connection was dropped;
+        returns (status, body), or (status, body, headers) with with_headers
+        """
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                factory = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+                connection = self._local.connection = factory(self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                payload = response.read()
+                if with_headers:
+                    return response.status, payload, response.headers
+                return response.status, payload
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+            except Exception:
+                connection.close()
+                self._local.connection = None
+                raise
+
+
+class LoadTest:
+    """One load test run against a server"""
+
+    def __init__(self, args):
+        self.args = args
+        self.client = Client(args.url, args.timeout)
+        self.mix = parse_mix(args.mix)
+        self.rng = random.Random(args.seed)
+        self.records = []           # (start offset, endpoint, status, latency s, upload bytes)
+        self.server_samples = []    # (offset, /metrics response)
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._start = None
+
+        print(f"Synthesizing tracks for mix {args.mix}...")
+        self.tracks = {seconds: synthesize_wav(seconds, seed=args.seed + i)
+                       for i, (seconds, _) in enumerate(self.mix)}
+
+    def _claim(self) -> Optional[int]:
+        """Number the next upload, or None once --requests have been sent"""
+        with self._lock:
+            if self.args.requests and self._counter >= self.args.requests:
+                return None
+            self._counter += 1
+            return self._counter
+
+    def _next_upload(self, number: int) -> Tuple[str, bytes]:
+        """Pick a track from the mix; returns (file name, WAV bytes)"""
+        with self._lock:
+            seconds = self.rng.choices([s for s, _ in self.mix], [w for _, w in self.mix])[0]
+        data = self.tracks[seconds]
+        if not self.args.allow_cache_hits:
+            # Overwrite the last two samples with the request number, so the
+            # content hash differs on every upload
+            data = data[:-4] + number.to_bytes(4, 'little')
+        return f"load_{seconds:g}s_{number}.wav", data
+
+    def _record(self, scheduled: float, endpoint: str, status: int, size: int = 0):
+        latency = time.perf_counter() - scheduled
+        with self._lock:
+            self.records.append((scheduled - self._start, endpoint, status, latency, size))
+
+    def _follow(self, scheduled: float, location: str, payload: bytes) -> Tuple[int, bytes]:
+        """
+        Long-poll a progressive result until it completes; returns its final
+        (status, body), recorded as 'complete' with latency from upload start
+        """
+        path = urlsplit(location).path
+        status = 202
+        limit = time.perf_counter() + self.args.timeout
+        while status == 202 and time.perf_counter() < limit:
+            try:
+                seen = len(json.loads(payload)['stages'])
+            except (ValueError, KeyError):
+                seen = 0
+            try:
+                status, payload = self.client.request('GET', f"{path}?seen={seen}&wait={POLL_WAIT}")
+            except Exception:
+                status = 0
+        if status == 202:
+            status = 0
+        self._record(scheduled, 'complete', status)
+        return status, payload
+
+    def _session(self, scheduled: float, number: int):
+        """
+        One upload, followed by a description download for --download-ratio of them
+
+        With --deadline the server may answer 202 with a Location while it is
+        still refining; that result is polled until it completes, and the
+        download uses the final descriptions.
+        """
+        filename, data = self._next_upload(number)
+        fields = {'deadline': str(self.args.deadline)} if self.args.deadline is not None else {}
+        body, content_type = multipart_body(fields, filename, data)
+        try:
+            status, payload, headers = self.client.request(
+                'POST', '/upload', body, {'Content-Type': content_type}, with_headers=True
+            )
+        except Exception:
+            self._record(scheduled, 'upload', 0, len(data))
+            return
+        self._record(scheduled, 'upload', status, len(data))
+        if status == 202 and headers.get('Location'):
+            status, payload = self._follow(scheduled, headers['Location'], payload)
+
+        if status != 200 or self.rng.random() >= self.args.download_ratio:
+            return
+        try:
+            descriptions = json.loads(payload)['descriptions']
+        except (ValueError, KeyError):
+            return
+
+        format_type = self.rng.choice(DESCRIPTION_FORMATS)
+        start = time.perf_counter()
+        try:
+            status, _ = self.client.request(
+                'POST', f'/download/{format_type}',
+                json.dumps({'description': descriptions[format_type]}).encode(),
+                {'Content-Type': 'application/json'}
+            )
+        except Exception:
+            status = 0
+        self._record(start, 'download', status)
+
+    def _closed_loop(self, end: float):
+        while time.perf_counter() < end:
+            number = self._claim()
+            if number is None:
+                break
+            self._session(time.perf_counter(), number)
+
+    def _open_loop(self, end: float, executor: ThreadPoolExecutor):
+        arrival = time.perf_counter()
+        while True:
+            arrival += self.rng.expovariate(self.args.rate)
+            number = self._claim()
+            if arrival >= end or number is None:
+                break
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(self._session, arrival, number)
+
+    def _sample_server(self):
+        """Poll /metrics for the server's resource usage until the run ends"""
+        client = Client(self.args.url, self.args.timeout)
+        while True:
+            try:
+                status, payload = client.request('GET', '/metrics')
+                if status == 200:
+                    self.server_samples.append((time.perf_counter() - self._start, json.loads(payload)))
+            except Exception:
+                pass
+            if self._stop.wait(self.args.sample_interval):
+                break
+
+    def run(self) -> Dict:
+        """Run the test and return the results"""
+        args = self.args
+        mode = f"{args.rate} req/s open-loop" if args.rate else "closed-loop"
+        print(f"Load testing {args.url}: {mode}, concurrency {args.concurrency}, "
+              f"{f'{args.requests} requests' if args.requests else f'{args.duration}s'}")
+
+        started = datetime.now()
+        self._start = time.perf_counter()
+        end = self._start + (args.duration if not args.requests else float('inf'))
+        sampler = threading.Thread(target=self._sample_server, daemon=True)
+        sampler.start()
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            if args.rate:
+                self._open_loop(end, executor)
+            else:
+                for _ in range(args.concurrency):
+                    executor.submit(self._closed_loop, end)
+        wall = time.perf_counter() - self._start
+
+        self._stop.set()
+        sampler.join()
+
+        return {
+            'label': args.label,
+            'started': started.strftime("%Y-%m-%d %H:%M:%S"),
+            'config': {key: value for key, value in vars(args).items() if key not in ('func', 'output')},
+            'wall_seconds': round(wall, 2),
+            'summary': summarize(self.records, wall),
+            'timeline': timeline(self.records),
+            'server': summarize_server(self.server_samples),
+            'requests': [[round(offset, 3), endpoint, status, round(latency, 4), size]
+                         for offset, endpoint, status, latency, size in self.records],
+        }
+
+
+def summarize(records: list, wall: float) -> Dict[str, Dict]:
+    """
+    Latency percentiles, throughput and error rates per endpoint
+
+    202s (progressive results still refining) are counted as accepted, not
+    ok: their latency is to the first response, and the end-to-end latency
+    of those uploads is under 'complete'.
+    """
+    summary = {}
+    for endpoint in sorted({record[1] for record in records}):
+        rows = [record for record in records if record[1] == endpoint]
+        ok = [latency for _, _, status, latency, _ in rows if 200 <= status < 300 and status != 202]
+        accepted = sum(1 for row in rows if row[2] == 202)
+        rejected = sum(1 for row in rows if row[2] == 503)
+        errors = len(rows) - len(ok) - accepted - rejected
+        latencies = np.array(ok) * 1000
+        summary[endpoint] = {
+            'requests': len(rows),
+            'ok': len(ok),
+            'accepted': accepted,
+            'rejected': rejected,
+            'errors': errors,
+            'error_rate': round((errors + rejected) / len(rows), 4),
+            'throughput': round(len(ok) / wall, 3) if wall > 0 else None,
+            'mb_per_second': round(sum(row[4] for row in rows) / wall / (1024 * 1024), 2) if wall > 0 else None,
+            'latency_ms': {
+                'mean': round(float(latencies.mean()), 1),
+                'p50': round(float(np.percentile(latencies, 50)), 1),
+                'p95': round(float(np.percentile(latencies, 95)), 1),
+                'p99': round(float(np.percentile(latencies, 99)), 1),
+                'max': round(float(latencies.max()), 1),
+            } if len(ok) else None,
+        }
+    return summary
+
+
+def timeline(records: list) -> List[Dict]:
+    """Per-second counts of requests started, with their p50 latency"""
+    seconds = {}
+    for offset, _, status, latency, _ in records:
+        seconds.setdefault(int(offset), []).append((status, latency))
+    return [{
+        'second': second,
+        'requests': len(rows),
+        'failed': sum(1 for status, _ in rows if not 200 <= status < 300),
+        'p50_ms': round(float(np.median([latency for _, latency in rows])) * 1000, 1),
+    } for second, rows in sorted(seconds.items())]
+
+
+def summarize_server(samples: list) -> Dict:
+    """
+    Peak RSS and CPU use per server process from /metrics samples
+
+    Each sample comes from whichever worker process answered, so processes
+    are told apart by pid and CPU use is computed between a process's own
+    consecutive samples.
+    """
+    processes = {}
+    for offset, metrics in samples:
+        process = metrics.get('process')
+        if process:
+            processes.setdefault(process['pid'], []).append((offset, process))
+
+    summary = {}
+    for pid, rows in processes.items():
+        cpu = [(b['cpu_seconds'] - a['cpu_seconds']) / (t_b - t_a)
+               for (t_a, a), (t_b, b) in zip(rows, rows[1:]) if t_b > t_a]
+        rss = [process['rss_mb'] for _, process in rows if process['rss_mb'] is not None]
+        summary[str(pid)] = {
+            'samples': len(rows),
+            'peak_rss_mb': max(rss) if rss else None,
+            'final_rss_mb': rss[-1] if rss else None,
+            'mean_cpu_percent': round(100 * float(np.mean(cpu)), 1) if cpu else None,
+            'peak_threads': max(process['threads'] for _, process in rows),
+        }
+
+    # Cache counters are cumulative, so each process's last sample holds its total
+    latest = {}
+    for _, metrics in samples:
+        if 'process' in metrics and 'result_cache' in metrics:
+            latest[metrics['process']['pid']] = metrics['result_cache']
+    return {
+        'processes': summary,
+        'result_cache_hits': sum(cache['hits'] + cache['coalesced'] for cache in latest.values()) if latest else None,
+    }
+
+
+def run_label(results: Dict, path: str) -> str:
+    return results.get('label') or Path(path).stem
+
+
+def print_table(title: str, header: list, rows: list):
+    """Print rows as an aligned table"""
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)))
+    print("="*70)
+
+
+def report(results: Dict, path: Optional[str] = None):
+    """Print the results of one run"""
+    rows = []
+    for endpoint, stats in results['summary'].items():
+        latency = stats['latency_ms'] or {}
+        rows.append([endpoint, stats['requests'], stats['ok'], stats.get('accepted', 0),
+                     stats['rejected'], stats['errors'],
+                     f"{stats['error_rate'] * 100:.1f}%", stats['throughput'],
+                     latency.get('p50', '-'), latency.get('p95', '-'), latency.get('p99', '-')])
+    print_table(
+        f"Load test {run_label(results, path or '')} ({results['wall_seconds']}s)",
+        ['endpoint', 'requests', 'ok', '202', '503', 'errors', 'error rate', 'ok/s', 'p50 ms', 'p95 ms', 'p99 ms'],
+        rows
+    )
+
+    processes = results['server']['processes']
+    if processes:
+        print_table(
+            "Server processes (from /metrics)",
+            ['pid', 'samples', 'peak RSS MB', 'final RSS MB', 'mean CPU %', 'peak threads'],
+            [[pid, p['samples'], p['peak_rss_mb'], p['final_rss_mb'], p['mean_cpu_percent'], p['peak_threads']]
+             for pid, p in processes.items()]
+        )
+    else:
+        print("\nNo server metrics collected (is /metrics reachable?)")
+
+
+def run_load_test(args):
+    """Run a load test and save the results"""
+    if not args.rate and args.concurrency < 1:
+        sys.exit("--concurrency must be at least 1")
+    try:
+        test = LoadTest(args)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    try:
+        status, _ = test.client.request('GET', '/health')
+    except OSError as e:
+        sys.exit(f"Server not reachable at {args.url}: {e}")
+    if status != 200:
+        sys.exit(f"Server health check failed with HTTP {status}")
+
+    results = test.run()
+    report(results, args.output)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Results saved to {args.output}")
+
+
+def compare_runs(args):
+    """Compare saved load test results side by side"""
+    rows = []
+    for path in args.results:
+        with open(path) as f:
+            results = json.load(f)
+        config = results['config']
+        upload = results['summary'].get('upload')
+        if upload is None:
+            continue
+        latency = upload['latency_ms'] or {}
+        processes = results['server']['processes'].values()
+        rss = [p['peak_rss_mb'] for p in processes if p['peak_rss_mb'] is not None]
+        cpu = [p['mean_cpu_percent'] for p in processes if p['mean_cpu_percent'] is not None]
+        rows.append([
+            run_label(results, path),
+            f"{config['rate']}/s" if config['rate'] else f"c{config['concurrency']}",
+            upload['requests'], upload['throughput'],
+            latency.get('p50', '-'), latency.get('p95', '-'), latency.get('p99', '-'),
+            f"{upload['error_rate'] * 100:.1f}%",
+            max(rss) if rss else '-',
+            round(sum(cpu), 1) if cpu else '-',
+        ])
+    print_table(
+        "Upload performance by run",
+        ['run', 'load', 'requests', 'ok/s', 'p50 ms', 'p95 ms', 'p99 ms', 'error rate', 'peak RSS MB', 'CPU %'],
+        rows
+    )
+
+
+def main():
+    """Main entry point for load testing"""
+    parser = argparse.ArgumentParser(description="Load test the Music Description Generator web service")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help=run_load_test.__doc__)
+    run.add_argument('--url', default='http://localhost:5000', help="Server URL (default: http://localhost:5000)")
+    run.add_argument('--concurrency', type=int, default=4,
+                     help="Clients sending back to back; with --rate, the most requests outstanding (default: 4)")
+    run.add_argument('--rate', type=float, help="Open-loop arrival rate in requests per second (Poisson)")
+    run.add_argument('--duration', type=float, default=60, help="Seconds to generate load (default: 60)")
+    run.add_argument('--requests', type=int, help="Stop after this many uploads instead of after --duration")
+    run.add_argument('--mix', default='10:0.5,30:0.3,60:0.2', metavar='SECONDS:WEIGHT,...',
+                     help="Track lengths and their share of uploads (default: 10:0.5,30:0.3,60:0.2)")
+    run.add_argument('--download-ratio', type=float, default=0.25,
+                     help="Share of successful uploads followed by a /download (default: 0.25)")
+    run.add_argument('--deadline', type=float,
+                     help="Send uploads with this progressive-result deadline, polling 202s until complete")
+    run.add_argument('--allow-cache-hits', action='store_true',
+                     help="Upload identical files, so the server's result cache answers repeats")
+    run.add_argument('--timeout', type=float, default=300, help="Per-request timeout in seconds (default: 300)")
+    run.add_argument('--sample-interval', type=float, default=1.0,
+                     help="Seconds between /metrics samples (default: 1)")
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--label', help="Name of this run in comparisons (default: output file name)")
+    run.add_argument('--output', metavar='JSON', help="Save the results here")
+    run.set_defaults(func=run_load_test)
+
+    compare = subparsers.add_parser('compare', help=compare_runs.__doc__)
+    compare.add_argument('results', nargs='+', help="Results files saved by 'run --output'")
+    compare.set_defaults(func=compare_runs)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
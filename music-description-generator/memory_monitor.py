@@ -0,0 +1,118 @@
+"""
+Process Memory Monitoring
+Measure resident memory (RSS) and its peak while a track is analyzed
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """Current resident set size of this process (or of pid), or None if unavailable"""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+
+    if resource is not None and pid is None:
+        # ru_maxrss is the lifetime peak (KB on Linux, bytes on macOS); the
+        # best available approximation on platforms without /proc
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+    return None
+
+
+def current_vm_bytes() -> Optional[int]:
+    """Current virtual memory size (mapped address space) of this process, or None if unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def process_stats() -> Dict[str, Any]:
+    """Resource usage of this process: RSS, CPU seconds used and thread count"""
+    rss = current_rss_bytes()
+    times = os.times()
+    return {
+        'pid': os.getpid(),
+        'rss_mb': round(rss / (1024 * 1024), 1) if rss is not None else None,
+        'cpu_seconds': round(times.user + times.system, 3),
+        'threads': threading.active_count(),
+    }
+
+
+class PeakRSSMonitor:
+    """
+    Context manager sampling RSS in a background thread to find the peak
+
+    RSS is process-wide, so the peak only belongs to the monitored work when
+    nothing else was monitored in this process at the same time (exclusive).
+
+    Usage:
+        with PeakRSSMonitor() as monitor:
+            analyze()
+        if monitor.exclusive:
+            print(monitor.peak_mb)
+    """
+
+    _active = set()
+    _active_lock = threading.Lock()
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak_bytes = None
+        self.overlapped = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        if rss is not None and (self.peak_bytes is None or rss > self.peak_bytes):
+            self.peak_bytes = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        with PeakRSSMonitor._active_lock:
+            for other in PeakRSSMonitor._active:
+                other.overlapped = True
+                self.overlapped = True
+            PeakRSSMonitor._active.add(self)
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        with PeakRSSMonitor._active_lock:
+            PeakRSSMonitor._active.discard(self)
+        return False
+
+    @property
+    def exclusive(self) -> bool:
+        """Whether no other monitored work ran in this process meanwhile"""
+        return not self.overlapped
+
+    @property
+    def peak_mb(self) -> Optional[float]:
+        """Peak RSS in megabytes, rounded to 0.1"""
+        if self.peak_bytes is None:
+            return None
+        return round(self.peak_bytes / (1024 * 1024), 1)
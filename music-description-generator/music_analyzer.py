@@ -5,12 +5,20 @@ Main audio analysis and description generation system
 
 import librosa
 import numpy as np
-from transformers import pipeline
+import scipy.signal
 import soundfile as sf
 from pathlib import Path
 import json
+import threading
 from datetime import datetime
-from typing import Dict, List, Tuple
+from audio_cache import DecodedAudioCache
+from inference_backends import create_backend
+from fast_features import frame_stats, spectral_stats, FRAME_LENGTH, HOP_LENGTH
+from memory_monitor import PeakRSSMonitor, current_rss_bytes
+from track_analysis import TrackAnalysis, FIELD_NAMES
+from feature_graph import FeatureGraph
+from waveform import WaveformPeaks
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -18,19 +26,92 @@ warnings.filterwarnings('ignore')
 class MusicAnalyzer:
     """Advanced music analysis using Hugging Face models and librosa"""
     
-    def __init__(self):
-        """Initialize analysis models"""
-        print("Loading Hugging Face models...")
+    # Analysis sample rate and the length of audio analyzed per track
+    SAMPLE_RATE = 22050
+    MAX_DURATION = 60
+    
+    # Memory-lean mode: spectra are computed in segments of SEGMENT_FRAMES
+    # (~20s), with CQT_CONTEXT_FRAMES (~3s) of context either side so the
+    # segmented chromagram matches the full one. Peak memory was measured as
+    # a fixed segment cost plus a per-analyzed-second cost, used to size
+    # excerpts that fit the memory budget
+    SEGMENT_FRAMES = 864
+    CQT_CONTEXT_FRAMES = 128
+    LEAN_FIXED_BYTES = 20 * 1024 * 1024
+    LEAN_BYTES_PER_SECOND = 0.6 * 1024 * 1024
+    MIN_EXCERPT_DURATION = 10
+    DECODE_BLOCK_FRAMES = 65536
+    
+    CLASSIFIER_MODEL = "MIT/ast-finetuned-audioset-10-10-0.4593"  # Any audio-classification model
+    
+    # Progressive analysis stages, in the order their results become
+    # available. 'rough_tempo' estimates the tempo from the first
+    # ROUGH_TEMPO_SECONDS of onsets; 'rhythm' refines it over the whole signal
+    STAGES = ('overview', 'timbre', 'rough_tempo', 'rhythm', 'tonal', 'complete')
+    ROUGH_TEMPO_SECONDS = 15
+    
+    # Selectable features: result fields ('duration' includes
+    # duration_seconds and 'genre' sub_genre), each computed by an extractor
+    # in GRAPH along with just the intermediates it needs
+    FEATURES = ('duration', 'energy', 'loudness', 'waveform', 'instruments', 'tempo', 'time_signature',
+                'genre', 'danceability', 'key', 'mood', 'valence')
+    GRAPH = FeatureGraph()
+    
+    # Features reported by each stage ('rough_rhythm' previews the rhythm
+    # features from the rough tempo)
+    STAGE_FEATURES = (
+        ('overview', ('duration', 'energy', 'loudness', 'waveform')),
+        ('timbre', ('instruments',)),
+        ('rough_tempo', ('rough_rhythm',)),
+        ('rhythm', ('tempo', 'time_signature', 'genre', 'danceability')),
+        ('tonal', ('key', 'mood', 'valence')),
+    )
+    
+    def __init__(self, lean: bool = False, memory_budget_mb: Optional[float] = None,
+                 classifier_backend: Optional[str] = None, classifier_model: str = CLASSIFIER_MODEL,
+                 classifier_threads: Optional[int] = None,
+                 audio_cache: Optional[DecodedAudioCache] = None, waveform: bool = False):
+        """
+        Initialize analysis models
+        
+        Args:
+            lean: Keep signals and spectra in float32, decode in blocks and
+                reuse per-thread buffers across tracks; reports peak RSS
+                (`peak_rss_mb`, omitted when other analyses ran in this
+                process at the same time, as RSS is process-wide)
+            memory_budget_mb: Per-process memory budget; tracks that would
+                exceed it are analyzed from a shorter excerpt (implies lean)
+            classifier_backend: Inference backend for the classifier: 'torch',
+                'int8' or 'onnx' (see inference_backends.py), or None (the
+                default) to skip loading it; genre detection doesn't use its
+                output yet, so it is only worth loading to compare backends
+            classifier_model: Hugging Face model id or local model directory
+            classifier_threads: Classifier intra-op threads (default: runtime's choice)
+            audio_cache: Reuse decoded signals stored here instead of decoding
+                files again (see audio_cache.py)
+            waveform: Add a `waveform` peak pyramid (a WaveformPeaks, see
+                waveform.py) to the results, computed from the decoded signal
+        """
+        self.lean = lean or memory_budget_mb is not None
+        self.memory_budget_mb = memory_budget_mb
+        self.audio_cache = audio_cache
+        self.waveform = waveform
+        self._buffers = threading.local()
         
         # Audio classification model for genre detection
-        try:
-            self.genre_classifier = pipeline(
-                "audio-classification",
-                model="facebook/musicgen-small"  # Can use other models
-            )
-        except:
-            print("Note: Using fallback analysis. Install transformers for full features.")
+        if classifier_backend is None:
             self.genre_classifier = None
+        else:
+            print("Loading Hugging Face models...")
+            try:
+                self.genre_classifier = create_backend(
+                    classifier_backend,
+                    classifier_model,
+                    threads=classifier_threads
+                )
+            except ImportError:
+                print("Note: Using fallback analysis. Install torch and transformers for full features.")
+                self.genre_classifier = None
         
         # Mood mapping
         self.mood_mappings = {
@@ -44,78 +125,419 @@ class MusicAnalyzer:
         
         print("Music Analyzer initialized successfully!")
     
-    def analyze_audio(self, audio_path: str) -> Dict:
+    def analyze_audio(self, audio_path: str, features: Optional[List[str]] = None) -> TrackAnalysis:
         """
         Comprehensive audio analysis
         
         Args:
             audio_path: Path to audio file
+            features: Compute only these features and what they depend on
+                (see FEATURES; default: all)
             
         Returns:
-            Dictionary containing all analysis results
+            TrackAnalysis record (dict-compatible) containing all analysis
+            results, or a dict of the selected fields for a subset
+        """
+        for stage, results in self.analyze_progressive(audio_path, features, previews=False):
+            pass
+        return results
+    
+    def analyze_progressive(self, audio_path: str, features: Optional[List[str]] = None,
+                            previews: bool = True) -> Iterator[Tuple[str, Dict]]:
         """
+        Comprehensive audio analysis, yielding results as each stage finishes
+        
+        Args:
+            audio_path: Path to audio file
+            features: Features to compute (see FEATURES; default: all)
+            previews: Include the 'rough_tempo' stage
+            
+        Yields:
+            (stage, fields) tuples as described in analyze_signal_stages()
+        """
+        features = self.select_features(features)
         print(f"\nAnalyzing: {Path(audio_path).name}")
         print("-" * 50)
         
-        # Load audio file
-        y, sr = librosa.load(audio_path, duration=60)  # Analyze first 60 seconds
-        
-        # Basic info
-        duration = librosa.get_duration(y=y, sr=sr)
-        
-        # Tempo and beat analysis
-        tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
-        
-        # Key detection
-        chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
-        key = self._detect_key(chroma)
+        if not self.lean:
+            # Load audio file
+            y, sr = self.load_audio(audio_path)
+            
+            yield from self.analyze_signal_stages(y, sr, Path(audio_path).name, features, previews)
+            return
+        
+        with PeakRSSMonitor() as monitor:
+            y, sr = self.load_audio(audio_path)
+            for stage, results in self.analyze_signal_stages(y, sr, Path(audio_path).name, features, previews):
+                if stage != 'complete':
+                    yield stage, results
+            del y
+        if monitor.exclusive:
+            results['peak_rss_mb'] = monitor.peak_mb
+        yield 'complete', results
+    
+    def load_audio(self, audio_path: str) -> Tuple[np.ndarray, int]:
+        """Decode the analyzed portion of a file as a mono signal"""
+        duration = self._excerpt_duration() if self.lean else self.MAX_DURATION
+        if self.audio_cache is None:
+            return self._decode(audio_path, duration), self.SAMPLE_RATE
+        
+        # Cached signals always cover MAX_DURATION; a shorter excerpt is a prefix
+        decoder = 'lean' if self.lean else 'librosa'
+        y = self.audio_cache.get(audio_path, self.SAMPLE_RATE, self.MAX_DURATION, decoder)
+        if y is not None:
+            return y[:int(duration * self.SAMPLE_RATE)], self.SAMPLE_RATE
+        
+        y = self._decode(audio_path, duration)
+        if duration == self.MAX_DURATION:
+            y = self.audio_cache.put(audio_path, self.SAMPLE_RATE, self.MAX_DURATION, decoder, y)
+        return y, self.SAMPLE_RATE
+    
+    def _decode(self, audio_path: str, duration: float) -> np.ndarray:
+        """Decode the first `duration` seconds of a file at SAMPLE_RATE"""
+        if self.lean:
+            return self._load_audio_lean(audio_path, duration)
+        y, _ = librosa.load(audio_path, sr=self.SAMPLE_RATE, duration=duration)
+        return y
+    
+    def _excerpt_duration(self) -> float:
+        """Longest analysis window that fits in the memory budget"""
+        if self.memory_budget_mb is None:
+            return self.MAX_DURATION
+        
+        available = self.memory_budget_mb * 1024 * 1024 - (current_rss_bytes() or 0) - self.LEAN_FIXED_BYTES
+        duration = min(self.MAX_DURATION, available / self.LEAN_BYTES_PER_SECOND)
+        if duration < self.MIN_EXCERPT_DURATION:
+            raise MemoryError(
+                f"Memory budget of {self.memory_budget_mb}MB leaves room for only "
+                f"{max(duration, 0):.0f}s of audio (minimum {self.MIN_EXCERPT_DURATION}s)"
+            )
+        if duration < self.MAX_DURATION:
+            print(f"Memory budget: analyzing a {duration:.0f}s excerpt")
+        return duration
+    
+    def _load_audio_lean(self, audio_path: str, duration: float) -> np.ndarray:
+        """Stream-decode into reused buffers, downmixing block by block"""
+        try:
+            f = sf.SoundFile(audio_path)
+        except RuntimeError:
+            # Formats libsndfile can't read go through librosa/audioread,
+            # which also decodes incrementally and stops after `duration`
+            y, _ = librosa.load(audio_path, sr=self.SAMPLE_RATE, duration=duration)
+            return y
+        
+        with f:
+            native_sr = f.samplerate
+            n_frames = min(f.frames, int(duration * native_sr))
+            mono = self._buffer('decoded', (n_frames,), np.float32)
+            block = self._buffer('decode_block', (self.DECODE_BLOCK_FRAMES, f.channels), np.float32)
+            
+            position = 0
+            while position < n_frames:
+                count = min(self.DECODE_BLOCK_FRAMES, n_frames - position)
+                frames = f.read(dtype='float32', always_2d=True, out=block[:count])
+                if len(frames) == 0:
+                    break
+                np.mean(frames, axis=1, out=mono[position:position + len(frames)])
+                position += len(frames)
+        
+        if native_sr == self.SAMPLE_RATE:
+            return mono[:position].copy()
+        return librosa.resample(mono[:position], orig_sr=native_sr, target_sr=self.SAMPLE_RATE)
+    
+    def _buffer(self, name: str, shape: Tuple[int, ...], dtype, order: str = 'C') -> np.ndarray:
+        """Per-thread scratch array reused across tracks, grown on demand"""
+        buffers = self._buffers.__dict__
+        size = int(np.prod(shape))
+        flat = buffers.get(name)
+        if flat is None or flat.size < size or flat.dtype != dtype:
+            flat = np.empty(size, dtype=dtype)
+            buffers[name] = flat
+        return flat[:size].reshape(shape, order=order)
+    
+    @GRAPH.extractor('spectrogram', requires=('y',))
+    def _magnitude_spectrogram(self, y: np.ndarray) -> np.ndarray:
+        """
+        |STFT| of the signal
         
-        # Spectral features
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
+        Lean mode computes it segment by segment into reused float32
+        buffers, so the complex STFT never exists for the whole track.
+        """
+        if not self.lean:
+            return np.abs(librosa.stft(y, n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH))
+        
+        n_bins = 1 + FRAME_LENGTH // 2
+        n_frames = 1 + len(y) // HOP_LENGTH
+        S = self._buffer('magnitude', (n_bins, n_frames), np.float32, order='F')
+        stft_out = self._buffer('stft', (n_bins, self.SEGMENT_FRAMES), np.complex64, order='F')
+        pad = FRAME_LENGTH // 2
+        
+        for start in range(0, n_frames, self.SEGMENT_FRAMES):
+            stop = min(start + self.SEGMENT_FRAMES, n_frames)
+            # Same frames as a centered, zero-padded STFT of the whole signal
+            lo = start * HOP_LENGTH - pad
+            hi = (stop - 1) * HOP_LENGTH + FRAME_LENGTH - pad
+            segment = y[max(lo, 0):min(hi, len(y))]
+            if lo < 0 or hi > len(y):
+                segment = np.pad(segment, (max(-lo, 0), max(hi - len(y), 0)))
+            D = librosa.stft(segment, n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH, center=False, out=stft_out)
+            np.abs(D, out=S[:, start:stop])
+        return S
+    
+    def _estimate_tuning_lean(self, S: np.ndarray, sr: int, bins_per_octave: int = 36) -> float:
+        """librosa.estimate_tuning from an existing spectrogram, a segment at a time"""
+        pitches, magnitudes = [], []
+        step = self.SEGMENT_FRAMES // 4  # piptrack allocates several S-sized arrays
+        for start in range(0, S.shape[1], step):
+            pitch, mag = librosa.piptrack(S=S[:, start:start + step], sr=sr)
+            mask = pitch > 0
+            pitches.append(pitch[mask])
+            magnitudes.append(mag[mask])
+        pitch = np.concatenate(pitches)
+        mag = np.concatenate(magnitudes)
+        threshold = np.median(mag) if len(mag) else 0.0
+        return librosa.pitch_tuning(pitch[mag >= threshold], bins_per_octave=bins_per_octave)
+    
+    def _tempo_lean(self, onset_envelope: np.ndarray, sr: int, ac_size: float = 8.0) -> float:
+        """librosa's tempo estimate, averaging the tempogram a segment at a time"""
+        win_length = librosa.time_to_frames(ac_size, sr=sr, hop_length=HOP_LENGTH).item()
+        n = len(onset_envelope)
+        padded = np.pad(onset_envelope, win_length // 2, mode='linear_ramp', end_values=[0, 0])
+        frames = librosa.util.frame(padded, frame_length=win_length, hop_length=1)[:, :n]
+        window = scipy.signal.get_window('hann', win_length, fftbins=True)[:, np.newaxis]
+        
+        total = np.zeros(win_length)
+        for start in range(0, n, self.SEGMENT_FRAMES):
+            ac = librosa.autocorrelate(frames[:, start:start + self.SEGMENT_FRAMES] * window, axis=0)
+            total += librosa.util.normalize(ac, norm=np.inf, axis=0).sum(axis=1)
+        
+        mean_tempogram = (total / max(n, 1))[:, np.newaxis]
+        return librosa.feature.tempo(tg=mean_tempogram, sr=sr, hop_length=HOP_LENGTH, aggregate=None)[0]
+    
+    def _chroma_lean(self, y: np.ndarray, sr: int, tuning: float) -> np.ndarray:
+        """chroma_cqt computed over overlapping segments of the signal"""
+        n_frames = 1 + len(y) // HOP_LENGTH
+        chroma = np.empty((12, n_frames), dtype=np.float32)
+        for start in range(0, n_frames, self.SEGMENT_FRAMES):
+            stop = min(start + self.SEGMENT_FRAMES, n_frames)
+            lo = max(0, start - self.CQT_CONTEXT_FRAMES)
+            hi = min(n_frames, stop + self.CQT_CONTEXT_FRAMES)
+            segment = y[lo * HOP_LENGTH:hi * HOP_LENGTH] if hi < n_frames else y[lo * HOP_LENGTH:]
+            part = librosa.feature.chroma_cqt(y=segment, sr=sr, tuning=tuning)
+            chroma[:, start:stop] = part[:, start - lo:stop - lo]
+        return chroma
+    
+    def analyze_signal(self, y: np.ndarray, sr: int, file_name: str,
+                       features: Optional[List[str]] = None) -> TrackAnalysis:
+        """
+        Analyze an already decoded mono signal
         
-        # Zero crossing rate (useful for distinguishing percussion)
-        zcr = librosa.feature.zero_crossing_rate(y)[0]
+        Args:
+            y: Mono audio signal
+            sr: Sample rate of the signal
+            file_name: Name reported in the results
+            features: Features to compute (see FEATURES; default: all)
+            
+        Returns:
+            TrackAnalysis record containing all analysis results (a dict of
+            the selected fields for a subset)
+        """
+        if not self.lean:
+            for stage, results in self.analyze_signal_stages(y, sr, file_name, features, previews=False):
+                pass
+            return results
+        
+        with PeakRSSMonitor() as monitor:
+            for stage, results in self.analyze_signal_stages(y, sr, file_name, features, previews=False):
+                pass
+        if monitor.exclusive:
+            results['peak_rss_mb'] = monitor.peak_mb
+        return results
+    
+    def analyze_signal_stages(self, y: np.ndarray, sr: int, file_name: str,
+                              features: Optional[List[str]] = None,
+                              previews: bool = True) -> Iterator[Tuple[str, Dict]]:
+        """
+        Analyze an already decoded mono signal, yielding results as each stage finishes
         
-        # MFCC for timbre analysis
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+        Duration, loudness and energy (and the waveform, if enabled) come first,
+        then instruments and a rough tempo; the beat-tracked tempo and the
+        chroma-based key and mood come last. Only the extractors the selected
+        features need are run (see GRAPH), and stages without selected
+        features are skipped.
         
-        # RMS energy
-        rms = librosa.feature.rms(y=y)[0]
+        Args:
+            y: Mono audio signal
+            sr: Sample rate of the signal
+            file_name: Name reported in the results
+            features: Features to compute (see FEATURES; default: all)
+            previews: Report rhythm features from the rough tempo before the
+                beat-tracked ones ('rough_tempo' stage)
+            
+        Yields:
+            (stage, fields) tuples in STAGES order, where fields holds the
+            results found or refined by that stage, and finally
+            ('complete', results): a TrackAnalysis when every field was
+            computed, otherwise a dict of the selected fields
+        """
+        features = self.select_features(features)
+        if self.lean:
+            y = np.asarray(y, dtype=np.float32)
+        
+        rhythm = dict(self.STAGE_FEATURES)['rhythm']
+        stages = []
+        for stage, names in self.STAGE_FEATURES:
+            if stage == 'rough_tempo':
+                selected = names if previews and set(rhythm) & set(features) else ()
+            else:
+                selected = tuple(name for name in names if name in features)
+            if selected:
+                stages.append((stage, selected))
+        targets = [name for _, names in stages for name in names]
+        outputs = [field for name in targets for field in self.GRAPH.extractors[name].provides]
+        
+        values = {'y': y, 'sr': sr}
+        results = {'file_name': file_name}
+        done = set()
+        plan = self.GRAPH.plan(targets, inputs=values)
+        for extractor in self.GRAPH.run(plan, self, values, keep=outputs):
+            done.update(extractor.provides)
+            while stages and done.issuperset(stages[0][1]):
+                stage, names = stages.pop(0)
+                if stage == 'rough_tempo':
+                    # Previews of the selected rhythm features; refined by 'rhythm'
+                    fields = {field: value for field, value in values['rough_rhythm'].items()
+                              if field in outputs}
+                else:
+                    fields = {field: values[field] for name in names
+                              for field in self.GRAPH.extractors[name].provides}
+                    results.update(fields)
+                if stage == 'overview':
+                    fields = {'file_name': file_name, **fields}
+                yield stage, fields
+        
+        results['analysis_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if all(name in results for name in FIELD_NAMES):
+            yield 'complete', TrackAnalysis(**results)
+        else:
+            yield 'complete', results
+    
+    def select_features(self, features: Optional[List[str]] = None) -> List[str]:
+        """
+        Validated feature selection; None selects every feature (the waveform
+        only if enabled)
         
-        # Analyze components
+        Raises:
+            ValueError: Unknown feature names
+        """
+        if features is None:
+            return [name for name in self.FEATURES if name != 'waveform' or self.waveform]
+        unknown = [name for name in features if name not in self.FEATURES]
+        if unknown:
+            raise ValueError(f"Unknown features: {', '.join(unknown)} (available: {', '.join(self.FEATURES)})")
+        return list(dict.fromkeys(features))
+    
+    # Feature extractors, registered in GRAPH with the values they need.
+    # 'y' and 'sr' are the signal and its sample rate; the others are
+    # intermediates or result fields provided by other extractors
+    
+    @GRAPH.extractor(('duration', 'duration_seconds'), requires=('y', 'sr'))
+    def _duration(self, y, sr) -> Tuple[str, float]:
+        """Duration as m:ss and in seconds"""
+        duration = librosa.get_duration(y=y, sr=sr)
+        return f"{int(duration // 60)}:{int(duration % 60):02d}", duration
+    
+    @GRAPH.extractor(('zcr', 'rms'), requires=('y',))
+    def _frame_stats(self, y):
+        """
+        Zero crossing rate (useful for distinguishing percussion) and RMS
+        energy, computed together in one pass over the frames
+        """
+        return frame_stats(y)
+    
+    @GRAPH.extractor('loudness', requires=('rms',))
+    def _calculate_loudness(self, rms) -> float:
+        """Mean loudness in dB"""
+        return round(float(librosa.amplitude_to_db(rms).mean()), 1)
+    
+    @GRAPH.extractor('waveform', requires=('y', 'sr'))
+    def _waveform(self, y, sr) -> WaveformPeaks:
+        return WaveformPeaks.from_signal(y, sr)
+    
+    @GRAPH.extractor('spectral_centroids', requires=('spectrogram', 'sr'))
+    def _spectral_centroids(self, S, sr) -> np.ndarray:
+        """Spectral centroid of each frame (fused single-pass kernel)"""
+        freqs = librosa.fft_frequencies(sr=sr, n_fft=FRAME_LENGTH)
+        spectral_centroids, _ = spectral_stats(S, freqs)
+        return spectral_centroids
+    
+    @GRAPH.extractor('tuning', requires=('spectrogram', 'sr'))
+    def _estimate_tuning(self, S, sr) -> float:
+        """
+        Tuning deviation for the chromagram, estimated from the shared
+        spectrogram instead of the second STFT chroma_cqt would take
+        """
+        if self.lean:
+            return self._estimate_tuning_lean(S, sr)
+        return librosa.estimate_tuning(S=S, sr=sr, bins_per_octave=36)
+    
+    @GRAPH.extractor('onset_envelope', requires=('spectrogram', 'sr'), consumes=('spectrogram',))
+    def _onset_envelope(self, S, sr) -> np.ndarray:
+        """
+        Onset strength derived from the existing spectrogram (squared in
+        place) instead of a second STFT inside beat_track
+        """
+        np.square(S, out=S)
+        mel = librosa.power_to_db(librosa.feature.melspectrogram(S=S, sr=sr))
+        return librosa.onset.onset_strength(S=mel, sr=sr, aggregate=np.median)
+    
+    @GRAPH.extractor('rough_tempo', requires=('onset_envelope', 'sr'))
+    def _rough_tempo(self, onset_envelope, sr) -> float:
+        """Tempo of the opening ROUGH_TEMPO_SECONDS"""
+        rough_frames = librosa.time_to_frames(self.ROUGH_TEMPO_SECONDS, sr=sr, hop_length=HOP_LENGTH)
+        return librosa.feature.tempo(onset_envelope=onset_envelope[:rough_frames], sr=sr,
+                                     hop_length=HOP_LENGTH)[0]
+    
+    @GRAPH.extractor('rough_rhythm', requires=('rough_tempo', 'rms', 'spectral_centroids', 'zcr', 'sr'))
+    def _rough_rhythm(self, tempo, rms, spectral_centroids, zcr, sr) -> Dict:
+        """Rhythm features from the rough tempo, for the 'rough_tempo' stage"""
+        return self._rhythm_results(tempo, None, rms, spectral_centroids, zcr, sr)
+    
+    @GRAPH.extractor(('beat_tempo', 'beats'), requires=('onset_envelope', 'sr'))
+    def _beat_track(self, onset_envelope, sr):
+        """Tempo and beat positions over the whole signal"""
+        return librosa.beat.beat_track(
+            onset_envelope=onset_envelope, sr=sr, bpm=self._tempo_lean(onset_envelope, sr) if self.lean else None
+        )
+    
+    @GRAPH.extractor('tempo', requires=('beat_tempo',))
+    def _round_tempo(self, tempo) -> float:
+        return round(float(tempo), 1)
+    
+    @GRAPH.extractor(('genre', 'sub_genre'), requires=('spectral_centroids', 'zcr', 'beat_tempo'))
+    def _genre(self, spectral_centroids, zcr, tempo) -> Tuple[str, str]:
+        genre = self._detect_genre(spectral_centroids, zcr, tempo)
+        return genre['primary'], genre['secondary']
+    
+    @GRAPH.extractor('chroma', requires=('y', 'sr', 'tuning'))
+    def _chroma(self, y, sr, tuning) -> np.ndarray:
+        """Chromagram for key detection"""
+        if self.lean:
+            return self._chroma_lean(y, sr, tuning)
+        return librosa.feature.chroma_cqt(y=y, sr=sr, tuning=tuning)
+    
+    def _rhythm_results(self, tempo, beats, rms, spectral_centroids, zcr, sr) -> Dict:
+        """Results that depend on the tempo (beats may be None for a rough tempo)"""
         genre = self._detect_genre(spectral_centroids, zcr, tempo)
-        mood = self._detect_mood(rms, chroma, tempo)
-        instruments = self._detect_instruments(y, sr, spectral_centroids, zcr)
-        
-        # Audio features (Spotify-like)
-        energy = self._calculate_energy(rms)
-        danceability = self._calculate_danceability(tempo, beats, rms)
-        valence = self._calculate_valence(chroma, rms)
-        
-        # Loudness (in dB)
-        loudness = librosa.amplitude_to_db(rms).mean()
-        
-        results = {
-            'file_name': Path(audio_path).name,
-            'duration': f"{int(duration // 60)}:{int(duration % 60):02d}",
-            'duration_seconds': duration,
-            'tempo': round(tempo, 1),
-            'key': key,
+        return {
+            'tempo': round(float(tempo), 1),
             'time_signature': self._estimate_time_signature(beats, sr),
             'genre': genre['primary'],
             'sub_genre': genre['secondary'],
-            'mood': mood,
-            'instruments': instruments,
-            'energy': energy,
-            'danceability': danceability,
-            'valence': valence,
-            'loudness': round(loudness, 1),
-            'analysis_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            'danceability': self._calculate_danceability(tempo, beats, rms),
         }
-        
-        return results
     
+    @GRAPH.extractor('key', requires=('chroma',))
     def _detect_key(self, chroma) -> str:
         """Detect musical key from chroma features"""
         keys = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
@@ -156,6 +578,7 @@ class MusicAnalyzer:
         else:
             return {'primary': 'Pop', 'secondary': 'Contemporary'}
     
+    @GRAPH.extractor('mood', requires=('rms', 'chroma', 'beat_tempo'))
     def _detect_mood(self, rms, chroma, tempo) -> str:
         """Detect mood based on energy and tonality"""
         energy_level = np.mean(rms)
@@ -176,7 +599,8 @@ class MusicAnalyzer:
         
         return self.mood_mappings.get(key, 'Balanced & Melodic')
     
-    def _detect_instruments(self, y, sr, spectral_centroids, zcr) -> List[str]:
+    @GRAPH.extractor('instruments', requires=('y', 'sr', 'spectral_centroids', 'zcr', 'spectrogram'))
+    def _detect_instruments(self, y, sr, spectral_centroids, zcr, S=None) -> List[str]:
         """Detect likely instruments present in the audio"""
         instruments = []
         
@@ -194,7 +618,7 @@ class MusicAnalyzer:
             instruments.append('Synthesizer')
         
         # Bass detection (low frequency energy)
-        spectral_contrast = librosa.feature.spectral_contrast(y=y, sr=sr)
+        spectral_contrast = librosa.feature.spectral_contrast(y=y, sr=sr, S=S)
         if np.mean(spectral_contrast[0]) > 20:
             instruments.append('Bass')
         
@@ -208,11 +632,13 @@ class MusicAnalyzer:
         
         return instruments[:5]  # Limit to 5 instruments
     
+    @GRAPH.extractor('energy', requires=('rms',))
     def _calculate_energy(self, rms) -> int:
         """Calculate energy level (0-100)"""
         energy = np.mean(rms) * 100
         return min(100, int(energy * 150))  # Scale appropriately
     
+    @GRAPH.extractor('danceability', requires=('beat_tempo', 'beats', 'rms'))
     def _calculate_danceability(self, tempo, beats, rms) -> int:
         """Calculate danceability score (0-100)"""
         # Ideal dance tempo is around 120-130 BPM
@@ -228,6 +654,7 @@ class MusicAnalyzer:
         danceability = (tempo_score * 0.4 + rhythm_score * 0.3 + energy_score * 0.3)
         return min(100, int(danceability))
     
+    @GRAPH.extractor('valence', requires=('chroma', 'rms'))
     def _calculate_valence(self, chroma, rms) -> int:
         """Calculate valence/positivity (0-100)"""
         # Major keys and higher energy typically = higher valence
@@ -241,6 +668,7 @@ class MusicAnalyzer:
         valence = (tonality_score * 0.6 + energy_score * 0.4)
         return min(100, int(valence))
     
+    @GRAPH.extractor('time_signature', requires=('beats', 'sr'))
     def _estimate_time_signature(self, beats, sr) -> str:
         """Estimate time signature"""
         # Most popular music is in 4/4
@@ -251,6 +679,19 @@ class MusicAnalyzer:
 class DescriptionGenerator:
     """Generate descriptions in various formats"""
     
+    FORMATS = ('youtube', 'podcast', 'library', 'social')
+    
+    @staticmethod
+    def generate_all(analysis: Dict, formats: Iterable[str] = FORMATS) -> Dict[str, str]:
+        """Generate description formats (default: every supported one) for one analysis"""
+        generators = {
+            'youtube': DescriptionGenerator.generate_youtube_description,
+            'podcast': DescriptionGenerator.generate_podcast_description,
+            'library': DescriptionGenerator.generate_library_tags,
+            'social': DescriptionGenerator.generate_social_media
+        }
+        return {format_type: generators[format_type](analysis) for format_type in formats}
+    
     @staticmethod
     def generate_youtube_description(analysis: Dict) -> str:
         """Generate YouTube video description"""
@@ -388,37 +829,50 @@ Perfect for your {vibe} playlist! 💯
             return "Transitions between segments, background for interviews, and general podcast atmosphere"
 
 
-def analyze_track(audio_path: str, output_dir: str = "analysis_results"):
+def analyze_track(audio_path: str, output_dir: str = "analysis_results", features: Optional[List[str]] = None):
     """
     Analyze a single track and generate all descriptions
     
     Args:
         audio_path: Path to audio file
         output_dir: Directory to save results
+        features: Compute only these features (see MusicAnalyzer.FEATURES);
+            descriptions need every feature, so none are written for a subset
     """
     analyzer = MusicAnalyzer()
     generator = DescriptionGenerator()
     
     # Perform analysis
-    results = analyzer.analyze_audio(audio_path)
+    results = analyzer.analyze_audio(audio_path, features)
     
     # Create output directory
     output_path = Path(output_dir)
     output_path.mkdir(exist_ok=True)
     
+    # Waveform peaks are saved as binary (see waveform.py), not in the JSON,
+    # whether they came with a subset or with every feature
+    if 'waveform' in results:
+        waveform_file = output_path / f"{Path(audio_path).stem}_waveform.bin"
+        with open(waveform_file, 'wb') as f:
+            f.write(results.pop('waveform').pack())
+        print(f"\n✓ Saved waveform peaks: {waveform_file}")
+    
     # Save JSON results
     json_file = output_path / f"{Path(audio_path).stem}_analysis.json"
     with open(json_file, 'w') as f:
-        json.dump(results, f, indent=2)
+        json.dump(results.to_dict() if isinstance(results, TrackAnalysis) else results, f, indent=2)
     print(f"\n✓ Saved analysis: {json_file}")
     
+    if not isinstance(results, TrackAnalysis):
+        print("\n" + "="*50)
+        for name, value in results.items():
+            if name not in ('file_name', 'analysis_date'):
+                print(f"{name}: {value}")
+        print("="*50)
+        return results
+    
     # Generate and save descriptions
-    descriptions = {
-        'youtube': generator.generate_youtube_description(results),
-        'podcast': generator.generate_podcast_description(results),
-        'library': generator.generate_library_tags(results),
-        'social': generator.generate_social_media(results)
-    }
+    descriptions = generator.generate_all(results)
     
     for format_type, description in descriptions.items():
         desc_file = output_path / f"{Path(audio_path).stem}_{format_type}.txt"
@@ -443,10 +897,22 @@ def analyze_track(audio_path: str, output_dir: str = "analysis_results"):
 
 
 if __name__ == "__main__":
-    import sys
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="Analyze one audio file and generate descriptions.",
+        epilog="Example: python music_analyzer.py sample_tracks/track1.mp3 --features tempo,key"
+    )
+    parser.add_argument('audio_file', help="Audio file to analyze")
+    parser.add_argument('output_dir', nargs='?', default="analysis_results",
+                        help="Directory to save results (default: analysis_results)")
+    parser.add_argument('--features', metavar='LIST',
+                        help="Comma-separated features to compute, skipping the rest "
+                             f"({', '.join(MusicAnalyzer.FEATURES)}); no descriptions are generated")
+    args = parser.parse_args()
     
-    if len(sys.argv) < 2:
-        print("Usage: python music_analyzer.py <audio_file>")
-        print("Example: python music_analyzer.py sample_tracks/track1.mp3")
-    else:
-        analyze_track(sys.argv[1])
\ No newline at end of file
+    features = [name.strip() for name in args.features.split(',') if name.strip()] if args.features else None
+    unknown = [name for name in features or () if name not in MusicAnalyzer.FEATURES]
+    if unknown:
+        parser.error(f"unknown features: {', '.join(unknown)}")
+    analyze_track(args.audio_file, args.output_dir, features)
\ No newline at end of file
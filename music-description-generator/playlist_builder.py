@@ -0,0 +1,402 @@
+"""
+Harmonic Mix Playlist Builder
+Plan DJ sets whose keys and tempos blend and whose energy follows a curve
+
+Two tracks are compatible when their keys are neighbours on the Camelot wheel
+(the same key, one step around the wheel, or the relative major/minor) and
+their tempos differ by less than a tolerance. CompatibilityIndex sorts the
+tracks into buckets by Camelot key and tempo band, with bands as wide as the
+tolerance on a log scale, and precomputes for every bucket the tracks of the
+buckets that can hold its compatible tracks: finding the tracks that may
+follow one is a lookup plus a vectorized tempo check, never a library scan.
+
+Sets are planned by beam search: the partial sets with the lowest cost
+(distance from the target energy at each position, plus tempo changes) are
+extended one compatible, unused track at a time.
+
+Usage:
+    python playlist_builder.py --db music_library.db --length 30 --curve peak --genre Electronic
+    python playlist_builder.py --db music_library.db --start "opener.mp3" --curve rising --energy 40-90
+"""
+
+import argparse
+import json
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from library_store import LibraryStore, parse_range
+
+
+PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+_FLATS = {'Db': 'C#', 'Eb': 'D#', 'Gb': 'F#', 'Ab': 'G#', 'Bb': 'A#'}
+
+ENERGY_CURVES = ('rising', 'falling', 'peak', 'wave', 'flat')
+
+# Camelot codes are numbered 0-23 internally: 2 * (wheel number - 1), plus 1 for major (B)
+CAMELOT_CODES = 24
+
+# Energy points from the target within which next tracks are looked for first
+ENERGY_WINDOW = 8.0
+
+
+def camelot_code(key: str) -> int:
+    """
+    Camelot wheel position of a key
+
+    Args:
+        key: Key as reported by MusicAnalyzer, e.g. "A Minor" or "F# Major"
+
+    Returns:
+        Code from 0 to 23 (see camelot_name), or -1 if the key is not recognized
+    """
+    try:
+        note, mode = key.split()
+    except (AttributeError, ValueError):
+        return -1
+    note = _FLATS.get(note, note)
+    mode = mode.lower()
+    if note not in PITCH_CLASSES or mode not in ('major', 'minor'):
+        return -1
+
+    pitch = PITCH_CLASSES.index(note)
+    if mode == 'minor':
+        pitch = (pitch + 3) % 12  # minor keys share the number of their relative major
+    number = (7 * pitch + 7) % 12  # C major is 8B; each fifth up is one step clockwise
+    return 2 * number + (mode == 'major')
+
+
+def camelot_name(code: int) -> str:
+    """Camelot notation of a code, e.g. 14 -> "8A" """
+    return f"{code // 2 + 1}{'AB'[code % 2]}"
+
+
+def compatible_codes(code: int) -> Tuple[int, ...]:
+    """Codes that mix harmonically with code: itself, one step either way, and its relative"""
+    number, major = divmod(code, 2)
+    return (code,
+            2 * ((number + 1) % 12) + major,
+            2 * ((number - 1) % 12) + major,
+            2 * number + (1 - major))
+
+
+def energy_curve(shape: str, length: int, low: float = 40, high: float = 90) -> np.ndarray:
+    """
+    Target energy for each position of a set
+
+    Args:
+        shape: One of ENERGY_CURVES ('peak' builds to the high point about
+            two thirds in, then winds down; 'wave' has two peaks), or
+            comma-separated energies (e.g. "50,80,60,95") spread evenly over the set
+        length: Number of tracks
+        low: Lowest target energy (0-100)
+        high: Highest target energy (0-100)
+
+    Returns:
+        Array of length target energies
+    """
+    t = np.linspace(0, 1, length)
+    if shape == 'rising':
+        return low + (high - low) * t
+    if shape == 'falling':
+        return high - (high - low) * t
+    if shape == 'peak':
+        return np.interp(t, [0, 0.65, 1], [low, high, (low + high) / 2])
+    if shape == 'wave':
+        return low + (high - low) * (1 - np.cos(4 * np.pi * t)) / 2
+    if shape == 'flat':
+        return np.full(length, (low + high) / 2)
+    try:
+        points = [float(value) for value in shape.split(',')]
+    except ValueError:
+        raise ValueError(f"Unknown energy curve: {shape}; choose from {', '.join(ENERGY_CURVES)} "
+                         f"or give comma-separated energies") from None
+    return np.interp(t, np.linspace(0, 1, len(points)), points)
+
+
+class CompatibilityIndex:
+    """
+    Tracks bucketed by Camelot key and tempo band, for finding mixable neighbours
+
+    Usage:
+        index = CompatibilityIndex.from_library(LibraryStore('music_library.db'), genre='Electronic')
+        track_ids = index.plan(energy_curve('peak', 50))
+    """
+
+    def __init__(self, ids: Sequence[int], keys: Sequence[str], tempos: Sequence[float],
+                 energies: Sequence[float], tempo_tolerance: float = 0.06):
+        """
+        Args:
+            ids: Track identifiers, returned by plan()
+            keys: Key of each track ("A Minor"); tracks with unknown keys are left out
+            tempos: Tempo of each track in BPM
+            energies: Energy of each track (0-100)
+            tempo_tolerance: Largest relative tempo change between consecutive
+                tracks (0.06 = 6%)
+        """
+        keys = list(keys)
+        code_of = {key: camelot_code(key) for key in set(keys)}
+        codes = np.fromiter(map(code_of.__getitem__, keys), dtype=np.int64, count=len(keys))
+        tempos = np.asarray(tempos, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_tempos = np.log(tempos)
+        usable = (codes >= 0) & np.isfinite(log_tempos)
+
+        self.tempo_tolerance = tempo_tolerance
+        self.max_log_ratio = float(np.log1p(tempo_tolerance))
+        bands = np.floor(log_tempos[usable] / self.max_log_ratio).astype(np.int64)
+        bands -= bands.min() if len(bands) else 0
+        self.band_count = int(bands.max()) + 1 if len(bands) else 0
+        cells = codes[usable] * self.band_count + bands
+
+        # Rows are ordered by bucket, so each bucket is a contiguous range
+        order = np.argsort(cells, kind='stable')
+        self.ids = np.asarray(ids)[usable][order]
+        self.codes = codes[usable][order]
+        self.tempos = tempos[usable][order]
+        self.log_tempos = log_tempos[usable][order]
+        self.energies = np.asarray(energies, dtype=np.float64)[usable][order]
+        self.cells = cells[order]
+
+        # The compatibility graph between buckets: for each bucket, the rows of
+        # the buckets that can hold tracks mixing with its own. The tempo bands
+        # of one key are adjacent rows, so that is one range per compatible key.
+        starts = np.searchsorted(self.cells, np.arange(CAMELOT_CODES * self.band_count + 1))
+        self._ranges = np.zeros((CAMELOT_CODES * self.band_count, 4, 2), dtype=np.int64)
+        for code in range(CAMELOT_CODES):
+            for band in range(self.band_count):
+                low, high = max(band - 1, 0), min(band + 1, self.band_count - 1)
+                for i, other in enumerate(compatible_codes(code)):
+                    self._ranges[code * self.band_count + band, i] = (
+                        starts[other * self.band_count + low], starts[other * self.band_count + high + 1])
+
+    @classmethod
+    def from_library(cls, store: LibraryStore, tempo_tolerance: float = 0.06,
+                     **filters) -> 'CompatibilityIndex':
+        """
+        Index the tracks of a library
+
+        Args:
+            store: Library to plan from; plan() returns its track ids
+            tempo_tolerance: As for the constructor
+            **filters: Restrict the tracks, as for LibraryStore.query
+        """
+        ids, values = store.columns(('key', 'tempo', 'energy'), **filters)
+        return cls(ids, values['key'], values['tempo'], values['energy'], tempo_tolerance)
+
+    @classmethod
+    def from_records(cls, records: Sequence, tempo_tolerance: float = 0.06) -> 'CompatibilityIndex':
+        """Index TrackAnalysis records or result dictionaries; plan() returns their positions"""
+        return cls(np.arange(len(records)), [r['key'] for r in records], [r['tempo'] for r in records],
+                   [r['energy'] for r in records], tempo_tolerance)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows_of(self, ids: Sequence[int]) -> np.ndarray:
+        """Index rows of track ids (ids that are not indexed are skipped)"""
+        return np.flatnonzero(np.isin(self.ids, np.asarray(ids)))
+
+    def _candidates(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows of the buckets compatible with each of rows, and the position in rows each came from"""
+        ranges = self._ranges[self.cells[rows]].reshape(-1, 2)
+        lengths = ranges[:, 1] - ranges[:, 0]
+        offsets = np.cumsum(lengths) - lengths
+        candidates = np.arange(lengths.sum()) + np.repeat(ranges[:, 0] - offsets, lengths)
+        owners = np.repeat(np.arange(len(rows)), lengths.reshape(len(rows), 4).sum(axis=1))
+        return candidates, owners
+
+    def neighbors(self, row: int) -> np.ndarray:
+        """Rows of the tracks that mix with the track at row (excluding itself)"""
+        candidates, _ = self._candidates(np.array([row]))
+        close = np.abs(self.log_tempos[candidates] - self.log_tempos[row]) <= self.max_log_ratio + 1e-12
+        close &= candidates != row
+        return candidates[close]
+
+    def plan(self, targets: Sequence[float], start: Optional[int] = None, beam_width: int = 32,
+             tempo_weight: float = 1.0, exclude: Sequence[int] = (),
+             seed: Optional[int] = None) -> List:
+        """
+        Plan a set whose energy follows targets, each track mixable with the previous one
+
+        Args:
+            targets: Target energy of each position (see energy_curve); the
+                set has one track per target
+            start: Track id of the opening track (default: the best fit for
+                the first target)
+            beam_width: Partial sets kept at each step; wider searches find
+                closer fits more slowly
+            tempo_weight: Cost of a tempo change of 1% relative to an energy
+                difference of one point
+            exclude: Track ids that may not be used (e.g. earlier sets)
+            seed: Seed for breaking ties between equally good tracks
+                (default: a different set each call)
+
+        Returns:
+            Track ids in play order; shorter than targets if no compatible
+            unused track could extend any partial set
+        """
+        targets = np.asarray(targets, dtype=np.float64)
+        if len(targets) == 0 or len(self) == 0:
+            return []
+        # Below one energy point, so it only decides between equally good tracks
+        jitter = np.random.default_rng(seed).random(len(self))
+        blocked = np.zeros(len(self), dtype=bool)
+        blocked[self.rows_of(exclude)] = True
+        # Tempo changes are in log-tempo units; scaled so a 1% change costs tempo_weight
+        tempo_cost = tempo_weight / np.log(1.01)
+
+        if start is not None:
+            rows = self.rows_of([start])
+            if len(rows) == 0:
+                raise ValueError(f"Track {start} is not in the index (unknown key or tempo?)")
+            beams = [(0.0, (int(rows[0]),))]
+        else:
+            cost = np.abs(self.energies - targets[0]) + jitter
+            cost[blocked] = np.inf
+            count = min(beam_width, int(np.count_nonzero(~blocked)))
+            first = np.argpartition(cost, count - 1)[:count] if count else []
+            beams = sorted((float(cost[row]), (int(row),)) for row in first)
+
+        for target in targets[1:]:
+            extended = self._extend(beams, target, jitter, blocked, tempo_cost, beam_width)
+            if not extended:
+                break
+            beams = extended
+
+        best = min(beams)[1]
+        return self.ids[list(best)].tolist()
+
+    def _extend(self, beams: List[Tuple[float, Tuple[int, ...]]], target: float, jitter: np.ndarray,
+                blocked: np.ndarray, tempo_cost: float, beam_width: int) -> List[Tuple[float, Tuple[int, ...]]]:
+        """Best partial sets one track longer, every extension of every partial set scored in one pass"""
+        lasts = np.array([path[-1] for _, path in beams])
+        beam_costs = np.array([cost for cost, _ in beams])
+        candidates, owners = self._candidates(lasts)
+        misfit = np.abs(self.energies - target) + jitter
+        misfit[blocked] = np.inf
+
+        # Tracks far from the target energy are only scored when too few
+        # closer ones can follow
+        window = ENERGY_WINDOW
+        while True:
+            close = (misfit <= window)[candidates]
+            rows, row_owners = candidates[close], owners[close]
+            tempo_change = np.abs(self.log_tempos[rows] - self.log_tempos[lasts][row_owners])
+            cost = beam_costs[row_owners] + misfit[rows] + tempo_cost * tempo_change
+            cost[tempo_change > self.max_log_ratio + 1e-12] = np.inf
+            extended = self._best_extensions(beams, rows, row_owners, cost, beam_width)
+            if len(extended) == beam_width or window > 101:
+                return extended
+            window *= 2
+
+    @staticmethod
+    def _best_extensions(beams: List[Tuple[float, Tuple[int, ...]]], candidates: np.ndarray,
+                         owners: np.ndarray, cost: np.ndarray, beam_width: int) -> List[Tuple[float, Tuple[int, ...]]]:
+        """
+        Cheapest extensions that don't repeat a track, at most one per last
+        track so the beam stays diverse
+        """
+        used = [set(path) for _, path in beams]
+        limit = 4 * beam_width
+        while True:
+            # Only the cheapest few are ordered; more are looked at if too
+            # many of them repeat a track
+            if limit < len(cost):
+                top = np.argpartition(cost, limit - 1)[:limit]
+            else:
+                top = np.arange(len(cost))
+            top = top[np.argsort(cost[top], kind='stable')]
+
+            extended = {}
+            for i, row, owner in zip(top.tolist(), candidates[top].tolist(), owners[top].tolist()):
+                if cost[i] == np.inf or len(extended) == beam_width:
+                    return list(extended.values())
+                if row not in extended and row not in used[owner]:
+                    extended[row] = (float(cost[i]), beams[owner][1] + (row,))
+            if len(top) == len(cost):
+                return list(extended.values())
+            limit *= 4
+
+
+def main():
+    """Command-line interface for the playlist builder"""
+    parser = argparse.ArgumentParser(
+        description="Plan harmonically mixed sets from an analyzed music library",
+        epilog='Filters take the same values as library_store.py query, e.g. --genre Electronic --tempo 118-130.'
+    )
+    parser.add_argument('--db', default="music_library.db", help="Library database (default: music_library.db)")
+    parser.add_argument('--length', type=int, default=20, help="Tracks per set (default: 20)")
+    parser.add_argument('--curve', default='peak',
+                        help=f"Energy curve: {', '.join(ENERGY_CURVES)}, or energies such as 50,80,60,95 "
+                             f"(default: peak)")
+    parser.add_argument('--energy', dest='energy_span', type=parse_range, default=(40, 90), metavar='RANGE',
+                        help="Energy span of the curve (default: 40-90)")
+    parser.add_argument('--start', help="File name of the opening track")
+    parser.add_argument('--sets', type=int, default=1, help="Number of sets, without repeating tracks (default: 1)")
+    parser.add_argument('--tempo-tolerance', type=float, default=6.0,
+                        help="Largest tempo change between tracks, in percent (default: 6)")
+    parser.add_argument('--beam', type=int, default=32, help="Beam width of the search (default: 32)")
+    parser.add_argument('--seed', type=int, help="Random seed, for repeatable sets")
+    parser.add_argument('--genre', action='append', help="Only tracks of this genre (repeatable)")
+    parser.add_argument('--mood', action='append', help="Only tracks of this mood (repeatable)")
+    parser.add_argument('--tempo', type=parse_range, metavar='RANGE', help="Only tracks in this tempo range")
+    parser.add_argument('--json', action='store_true', help="Output sets as JSON lines")
+    args = parser.parse_args()
+
+    store = LibraryStore(args.db)
+    filters = {'genre': args.genre, 'mood': args.mood, 'tempo': args.tempo}
+
+    start = time.perf_counter()
+    index = CompatibilityIndex.from_library(store, args.tempo_tolerance / 100, **filters)
+    indexed = time.perf_counter() - start
+
+    if len(index) == 0:
+        print(f"No tracks with a recognized key and tempo in {args.db}")
+        return
+
+    start_id = None
+    if args.start:
+        ids = index.rows_of(store.columns((), file_name=args.start, **filters)[0])
+        if len(ids) == 0:
+            parser.error(f"No track named like {args.start!r} matches the filters (with a recognized key)")
+        start_id = int(index.ids[ids[0]])
+
+    low, high = (v if v is not None else default for v, default in zip(args.energy_span, (0, 100)))
+    try:
+        targets = energy_curve(args.curve, args.length, low, high)
+    except ValueError as e:
+        parser.error(str(e))
+    used = []
+    for number in range(1, args.sets + 1):
+        start = time.perf_counter()
+        track_ids = index.plan(targets, start=start_id if number == 1 else None, beam_width=args.beam,
+                               exclude=used, seed=args.seed)
+        planned = time.perf_counter() - start
+        used.extend(track_ids)
+        tracks = store.get(track_ids)
+
+        if args.json:
+            print(json.dumps({'set': number, 'tracks': [
+                {'file_name': track['file_name'], 'key': track['key'],
+                 'camelot': camelot_name(camelot_code(track['key'])),
+                 'tempo': track['tempo'], 'energy': track['energy'], 'target_energy': round(float(target), 1)}
+                for track, target in zip(tracks, targets)
+            ]}))
+            continue
+
+        print(f"\nSet {number}: {len(tracks)} tracks from {len(index)} indexed "
+              f"(planned in {planned * 1000:.0f} ms, index built in {indexed * 1000:.0f} ms)")
+        print("="*70)
+        for position, (track, target) in enumerate(zip(tracks, targets), 1):
+            print(f"{position:3d}. {track['file_name']}")
+            print(f"     {camelot_name(camelot_code(track['key'])):>3} {track['key']:<9} | "
+                  f"{track['tempo']:6.1f} BPM | Energy {track['energy']}% (target {target:.0f}%)")
+        if len(tracks) < args.length:
+            print(f"⚠️  No compatible track could follow position {len(tracks)}; "
+                  f"try a wider --tempo-tolerance or fewer filters")
+
+
+if __name__ == "__main__":
+    main()
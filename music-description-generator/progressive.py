@@ -0,0 +1,397 @@
+"""
+Progressive Analysis Results
+Publish an analysis stage by stage, so requests can answer before it finishes
+
+An analysis started here runs in the background, feeding the results of each
+stage (see MusicAnalyzer.STAGES) into a ProgressiveResult. A request waits on
+it until a deadline and responds with whatever is known by then, marked as
+still refining; later results are fetched by id.
+
+With a directory, every stage is also written there as a JSON snapshot, so
+any process sharing the directory (e.g. the other workers of serve.py) can
+answer polls for the result as a StoredResult.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple, Union
+
+from track_analysis import TrackAnalysis, renamed
+
+
+POLL_INTERVAL = 0.2     # Seconds between checks of a snapshot written by another process
+
+
+class ProgressiveResult:
+    """Results of one analysis, filled in as its stages finish"""
+
+    def __init__(self, file_name: str, analysis_key: Optional[str] = None,
+                 on_change: Optional[Callable[['ProgressiveResult'], None]] = None):
+        """
+        Args:
+            file_name: Name reported in the results
+            analysis_key: Key of the analysis in caller's stores (e.g. to link its waveform)
+            on_change: Called after every published stage or failure
+        """
+        self.id = uuid.uuid4().hex
+        self.file_name = file_name
+        self.analysis_key = analysis_key
+        self.fields = {'file_name': file_name}
+        self.stages = []
+        self.analysis: Optional[TrackAnalysis] = None
+        self.error: Optional[str] = None
+        self.finished_at: Optional[float] = None
+        self.on_change = on_change
+        self._followers: List['ProgressiveResult'] = []
+        self._changed = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        """Whether the analysis completed or failed"""
+        return self.finished_at is not None
+
+    def publish(self, stage: str, fields):
+        """Record the results of a finished stage ('complete' carries the TrackAnalysis)"""
+        with self._changed:
+            if stage == 'complete':
+                if fields['file_name'] != self.file_name:
+                    fields = renamed(fields, self.file_name)
+                self.analysis = fields
+                self.finished_at = time.monotonic()
+            else:
+                self.fields.update(fields)
+                self.fields['file_name'] = self.file_name
+            self.stages.append(stage)
+            self._changed.notify_all()
+            # Under the lock, so a follower added meanwhile gets each stage once
+            for follower in self._followers:
+                follower.publish(stage, fields)
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def fail(self, error: str):
+        """Record that the analysis failed"""
+        with self._changed:
+            self.error = error
+            self.finished_at = time.monotonic()
+            self._changed.notify_all()
+            for follower in self._followers:
+                follower.fail(error)
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def add_follower(self, follower: 'ProgressiveResult'):
+        """
+        Mirror this result's stages, past and future, into another result
+        of the same analysis (which reports its own file name)
+        """
+        with self._changed:
+            with follower._changed:
+                follower.fields.update(self.fields)
+                follower.fields['file_name'] = follower.file_name
+            for stage in self.stages:
+                follower.publish(stage, self.analysis if stage == 'complete' else {})
+            if self.error is not None:
+                follower.fail(self.error)
+            elif not self.done:
+                self._followers.append(follower)
+
+    def wait(self, timeout: float, seen: Optional[int] = None) -> bool:
+        """
+        Wait for the analysis to finish
+
+        Args:
+            timeout: Longest wait in seconds
+            seen: If given, also stop waiting once more than this many stages
+                have finished (for long polling)
+
+        Returns:
+            Whether the analysis has finished
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self.done or (seen is not None and len(self.stages) > seen),
+                max(timeout, 0)
+            )
+            return self.done
+
+    def snapshot(self) -> Dict:
+        """Best results available now"""
+        with self._changed:
+            return {
+                'id': self.id,
+                'refining': not self.done,
+                'stages': list(self.stages),
+                'analysis': self.analysis if self.analysis is not None else dict(self.fields),
+                'error': self.error,
+            }
+
+
+class StoredResult:
+    """
+    Read-only view of a ProgressiveResult published by another process,
+    with the same interface, read from its snapshot file
+    """
+
+    def __init__(self, path: str, data: Dict):
+        self.path = path
+        self._data = data
+
+    @property
+    def id(self) -> str:
+        return self._data['id']
+
+    @property
+    def analysis_key(self) -> Optional[str]:
+        return self._data['analysis_key']
+
+    @property
+    def done(self) -> bool:
+        return not self._data['refining']
+
+    def _reload(self):
+        """Read the latest snapshot (kept if the file is gone, e.g. expired meanwhile)"""
+        data = _read_snapshot(self.path)
+        if data is not None:
+            self._data = data
+
+    def wait(self, timeout: float, seen: Optional[int] = None) -> bool:
+        """Wait for the analysis to finish, as ProgressiveResult.wait(), by polling the file"""
+        deadline = time.monotonic() + max(timeout, 0)
+        while True:
+            self._reload()
+            if self.done or (seen is not None and len(self._data['stages']) > seen):
+                return self.done
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+    def snapshot(self) -> Dict:
+        """Best results available when last read"""
+        analysis = self._data['analysis']
+        if self._data['record']:
+            analysis = TrackAnalysis.from_dict(analysis)
+        return {
+            'id': self.id,
+            'refining': self._data['refining'],
+            'stages': list(self._data['stages']),
+            'analysis': analysis,
+            'error': self._data['error'],
+        }
+
+
+def _read_snapshot(path: str) -> Optional[Dict]:
+    """Contents of a snapshot file, or None if it doesn't exist"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class ProgressiveResults:
+    """
+    Progressive analyses in flight and recently finished, by id
+
+    Usage:
+        results = ProgressiveResults(executor, directory='uploads/results')
+        result = results.start(key, analyzer.analyze_progressive(path), name)
+        result.wait(deadline)
+        body = result.snapshot()
+    """
+
+    def __init__(self, executor: Executor, ttl: float = 600, directory: Optional[str] = None,
+                 dumps: Callable[[Any], str] = json.dumps):
+        """
+        Args:
+            executor: Pool the analyses run on
+            ttl: Seconds a finished result stays retrievable
+            directory: Where snapshots are shared with other processes
+                (None keeps results in this process only)
+            dumps: Serializes a snapshot to JSON (must handle the analysis
+                records and values in it)
+        """
+        self.executor = executor
+        self.ttl = ttl
+        self.directory = directory
+        self.dumps = dumps
+        self._results: Dict[str, ProgressiveResult] = {}
+        self._running: Dict[Hashable, ProgressiveResult] = {}
+        self._lock = threading.Lock()
+        self._purged_at = 0.0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, result_id: str) -> Optional[Union[ProgressiveResult, StoredResult]]:
+        """A result by id (published by this or another process), or None if unknown or expired"""
+        with self._lock:
+            self._expire()
+            result = self._results.get(result_id)
+        if result is not None or self.directory is None or not result_id.isalnum():
+            return result
+
+        path = self._path(result_id)
+        data = _read_snapshot(path)
+        if data is None or (not data['refining'] and data['finished_at'] < time.time() - self.ttl):
+            return None
+        return StoredResult(path, data)
+
+    def running(self, key: Hashable, file_name: Optional[str] = None) -> Optional[ProgressiveResult]:
+        """
+        The analysis in flight for key, if any; with a file_name other than
+        its own, a new result following it under that name
+        """
+        with self._lock:
+            result = self._running.get(key)
+        if result is None or file_name is None or file_name == result.file_name:
+            return result
+
+        follower = self._new_result(file_name, result.analysis_key)
+        with self._lock:
+            self._expire()
+            self._results[follower.id] = follower
+        result.add_follower(follower)
+        return follower
+
+    def finished(self, analysis: TrackAnalysis, analysis_key: Optional[str] = None) -> ProgressiveResult:
+        """Register an already complete analysis (e.g. from a cache)"""
+        result = self._new_result(analysis['file_name'], analysis_key)
+        result.publish('complete', analysis)
+        with self._lock:
+            self._expire()
+            self._results[result.id] = result
+        return result
+
+    def pending(self, future: Future, file_name: str, analysis_key: Optional[str] = None) -> ProgressiveResult:
+        """
+        Register an analysis running elsewhere (e.g. a plain upload of the
+        same content), completed with the TrackAnalysis the future resolves to
+        """
+        result = self._new_result(file_name, analysis_key)
+        with self._lock:
+            self._expire()
+            self._results[result.id] = result
+
+        def done(future: Future):
+            error = future.exception()
+            if error is None:
+                result.publish('complete', future.result())
+            else:
+                result.fail(str(error) or type(error).__name__)
+
+        future.add_done_callback(done)
+        return result
+
+    def start(self, key: Hashable, stages: Iterator[Tuple[str, Dict]], file_name: str,
+              on_complete: Optional[Callable[[TrackAnalysis], None]] = None,
+              on_error: Optional[Callable[[BaseException], None]] = None,
+              cleanup: Optional[Callable[[], None]] = None,
+              analysis_key: Optional[str] = None) -> ProgressiveResult:
+        """
+        Run an analysis in the background, publishing each stage
+
+        Args:
+            key: Identifies identical analyses (see running())
+            stages: Generator from MusicAnalyzer.analyze_progressive()
+            file_name: Name reported in the results
+            on_complete: Called with the final TrackAnalysis
+            on_error: Called with the exception when the analysis ends without
+                one (including when it can't be started)
+            cleanup: Called when the analysis ends, successfully or not
+            analysis_key: Stored with the result (see ProgressiveResult)
+
+        Returns:
+            The ProgressiveResult being filled in
+        """
+        result = self._new_result(file_name, analysis_key)
+        with self._lock:
+            self._expire()
+            self._results[result.id] = result
+            self._running[key] = result
+
+        def run():
+            error = None
+            completed = False
+            try:
+                for stage, fields in stages:
+                    result.publish(stage, fields)
+                if result.analysis is not None:
+                    if on_complete is not None:
+                        on_complete(result.analysis)
+                    completed = True
+            except Exception as e:
+                error = e
+                result.fail(str(e) or type(e).__name__)
+            finally:
+                with self._lock:
+                    self._running.pop(key, None)
+                if not result.done:
+                    result.fail('Analysis ended without a result')
+                if not completed and on_error is not None:
+                    on_error(error or RuntimeError(result.error or 'Analysis ended without a result'))
+                if cleanup is not None:
+                    cleanup()
+
+        try:
+            self.executor.submit(run)
+        except BaseException as e:
+            with self._lock:
+                self._running.pop(key, None)
+                del self._results[result.id]
+            if on_error is not None:
+                on_error(e)
+            if cleanup is not None:
+                cleanup()
+            raise
+        return result
+
+    def _new_result(self, file_name: str, analysis_key: Optional[str]) -> ProgressiveResult:
+        """A result whose changes are written to the shared directory, if any"""
+        if self.directory is None:
+            return ProgressiveResult(file_name, analysis_key)
+        self._purge_files()
+        result = ProgressiveResult(file_name, analysis_key, on_change=self._save)
+        self._save(result)    # known to other processes before its first stage
+        return result
+
+    def _path(self, result_id: str) -> str:
+        return os.path.join(self.directory, f"{result_id}.json")
+
+    def _save(self, result: ProgressiveResult):
+        """Write a result's snapshot for other processes (atomically, so readers never see half a file)"""
+        snapshot = result.snapshot()
+        snapshot['record'] = isinstance(snapshot['analysis'], TrackAnalysis)
+        snapshot['analysis_key'] = result.analysis_key
+        snapshot['finished_at'] = time.time() if result.done else None
+        path = self._path(result.id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.dumps(snapshot))
+        os.replace(tmp_path, path)
+
+    def _purge_files(self):
+        """Delete snapshots not written for more than ttl seconds (at most once a minute)"""
+        now = time.time()
+        if now - self._purged_at < 60:
+            return
+        self._purged_at = now
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < now - self.ttl:
+                        os.remove(entry.path)
+                except OSError:
+                    pass    # removed by another process meanwhile
+
+    def _expire(self):
+        """Drop results finished more than ttl seconds ago (lock held)"""
+        cutoff = time.monotonic() - self.ttl
+        expired = [result_id for result_id, result in self._results.items()
+                   if result.done and result.finished_at < cutoff]
+        for result_id in expired:
+            del self._results[result_id]
@@ -0,0 +1,203 @@
+"""
+Description Re-Rendering
+Regenerate description files from saved analyses, without touching the audio
+
+After a change to DescriptionGenerator (wording, hashtags, use cases), this
+rewrites the `<track>_<format>.txt` files of a batch_analyzer.py output
+directory from the `<track>_analysis.json` files next to them (or from the
+run's music_analysis.tab table). Tracks are split into chunks that worker
+processes render and write independently, returning only counts. A file is
+only rewritten when its content changes. An unchanged output costs a stat
+and a read, so refreshing one format of a large library takes minutes
+instead of the hours re-analysis would.
+
+Usage:
+    python render_descriptions.py batch_results/
+    python render_descriptions.py batch_results/ --formats youtube,social --workers 8
+    python render_descriptions.py batch_results/ --table --dry-run
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Union
+
+from tqdm import tqdm
+
+from music_analyzer import DescriptionGenerator
+from track_analysis import TrackAnalysis, FIELD_NAMES, load_table
+
+
+CHUNK_SIZE = 1000   # Tracks per worker task
+MAX_ERRORS_SHOWN = 10
+
+
+def find_analyses(track_dir: Path) -> List[str]:
+    """Per-track analysis files in a directory (scandir, as it may hold millions of files)"""
+    with os.scandir(track_dir) as entries:
+        return sorted(entry.path for entry in entries if entry.name.endswith('_analysis.json'))
+
+
+def write_if_changed(path: str, data: bytes, dry_run: bool = False) -> bool:
+    """
+    Write data to path unless the file already holds exactly that
+
+    Returns:
+        Whether the file was (or, with dry_run, would be) written
+    """
+    try:
+        # Most template changes alter the length, which settles it without a read
+        if os.path.getsize(path) == len(data):
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass  # no file yet
+    if not dry_run:
+        with open(path, 'wb') as f:
+            f.write(data)
+    return True
+
+
+def render_chunk(items: Sequence[Union[str, TrackAnalysis]], formats: Sequence[str], track_dir: str,
+                 dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Render and write the descriptions of one chunk of tracks (runs in a worker process)
+
+    Args:
+        items: Paths of analysis JSON files, or TrackAnalysis records
+        formats: Description formats to render
+        track_dir: Directory the description files go in
+        dry_run: Count changes without writing
+
+    Returns:
+        Counts of files 'written' and 'unchanged', analyses skipped as
+        'incomplete' (a subset of features, see batch_analyzer.py --features)
+        and 'errors' as (name, message) pairs
+    """
+    counts = {'tracks': 0, 'written': 0, 'unchanged': 0, 'incomplete': 0, 'errors': []}
+    for item in items:
+        try:
+            if isinstance(item, TrackAnalysis):
+                analysis = item
+            else:
+                # Saved analyses hold plain JSON values, which render the same
+                # as a TrackAnalysis without the cost of building one
+                with open(item) as f:
+                    analysis = json.load(f)
+                if not set(FIELD_NAMES) <= set(analysis):
+                    counts['incomplete'] += 1
+                    continue
+
+            stem = os.path.splitext(os.path.basename(analysis['file_name']))[0]
+            for format_type, description in DescriptionGenerator.generate_all(analysis, formats).items():
+                path = os.path.join(track_dir, f"{stem}_{format_type}.txt")
+                if write_if_changed(path, description.encode('utf-8'), dry_run):
+                    counts['written'] += 1
+                else:
+                    counts['unchanged'] += 1
+            counts['tracks'] += 1
+        except Exception as e:
+            name = item['file_name'] if isinstance(item, TrackAnalysis) else os.path.basename(item)
+            counts['errors'].append((name, f"{type(e).__name__}: {e}" if str(e) else type(e).__name__))
+    return counts
+
+
+def render_directory(output_dir: str, formats: Sequence[str] = DescriptionGenerator.FORMATS,
+                     workers: int = None, chunk_size: int = CHUNK_SIZE, use_table: bool = False,
+                     dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Re-render the description files of a batch output directory
+
+    Args:
+        output_dir: batch_analyzer.py output directory (or its individual_tracks)
+        formats: Description formats to render
+        workers: Worker processes (default: one per CPU; 1 renders in this process)
+        chunk_size: Tracks per worker task
+        use_table: Read the analyses from music_analysis.tab instead of the
+            per-track JSON files (faster to load; written at the end of each
+            batch run)
+        dry_run: Count the files that would change without writing
+
+    Returns:
+        Totals as returned by render_chunk(), for all tracks
+    """
+    output_path = Path(output_dir)
+    track_dir = output_path / "individual_tracks"
+    if not track_dir.is_dir():
+        track_dir, output_path = output_path, output_path.parent
+
+    if use_table:
+        items = load_table(str(output_path / "music_analysis.tab"))
+    else:
+        items = find_analyses(track_dir)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    totals = {'tracks': 0, 'written': 0, 'unchanged': 0, 'incomplete': 0, 'errors': []}
+    workers = workers or os.cpu_count() or 1
+    with tqdm(total=len(items), desc="Rendering descriptions") as progress:
+        def add(counts, size):
+            for name, value in counts.items():
+                totals[name] += value
+            progress.update(size)
+
+        if workers == 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                add(render_chunk(chunk, formats, str(track_dir), dry_run), len(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+                futures = {executor.submit(render_chunk, chunk, formats, str(track_dir), dry_run): len(chunk)
+                           for chunk in chunks}
+                for future in as_completed(futures):
+                    add(future.result(), futures[future])
+    return totals
+
+
+def main():
+    """Command-line interface for re-rendering descriptions"""
+    parser = argparse.ArgumentParser(
+        description="Regenerate description files from saved analyses (no audio is decoded), "
+                    "rewriting only files whose content changes.",
+        epilog="Example: python render_descriptions.py batch_results/ --formats youtube"
+    )
+    parser.add_argument('output_dir', nargs='?', default="batch_results",
+                        help="batch_analyzer.py output directory (default: batch_results)")
+    parser.add_argument('--formats', default=','.join(DescriptionGenerator.FORMATS),
+                        help=f"Comma-separated formats to render (default: {','.join(DescriptionGenerator.FORMATS)})")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f"Tracks per worker task (default: {CHUNK_SIZE})")
+    parser.add_argument('--table', action='store_true',
+                        help="Read analyses from music_analysis.tab instead of the per-track JSON files")
+    parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing")
+    args = parser.parse_args()
+
+    formats = [name.strip() for name in args.formats.split(',') if name.strip()]
+    unknown = [name for name in formats if name not in DescriptionGenerator.FORMATS]
+    if unknown:
+        parser.error(f"unknown formats: {', '.join(unknown)}")
+
+    start = time.perf_counter()
+    try:
+        totals = render_directory(args.output_dir, formats, args.workers, max(args.chunk_size, 1),
+                                  args.table, args.dry_run)
+    except OSError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - start
+
+    verb = "would be rewritten" if args.dry_run else "rewritten"
+    print(f"\n✓ Rendered {', '.join(formats)} for {totals['tracks']} tracks in {elapsed:.1f}s: "
+          f"{totals['written']} files {verb}, {totals['unchanged']} unchanged")
+    if totals['incomplete']:
+        print(f"  Skipped {totals['incomplete']} analyses of a subset of features (descriptions need every field)")
+    if totals['errors']:
+        print(f"  {len(totals['errors'])} tracks failed:")
+        for name, message in totals['errors'][:MAX_ERRORS_SHOWN]:
+            print(f"    {name}: {message}")
+
+
+if __name__ == "__main__":
+    main()
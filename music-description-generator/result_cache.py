@@ -0,0 +1,163 @@
+"""
+Analysis Result Cache
+Share one analysis between identical uploads, concurrent or repeated
+
+Uploads are keyed by a hash of their content. The first request for a key
+runs the analysis; requests for the same key arriving while it runs wait for
+that analysis instead of starting their own (single-flight), and later
+requests are answered from a bounded LRU of recent results.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, BinaryIO, Callable, Dict, Tuple
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def save_and_hash(stream: BinaryIO, output: BinaryIO) -> str:
+    """
+    Copy an upload stream to a file while hashing it
+
+    Args:
+        stream: Readable binary stream (e.g. an uploaded file's .stream)
+        output: Writable binary file
+
+    Returns:
+        SHA-256 hex digest of the content
+    """
+    digest = hashlib.sha256()
+    while True:
+        chunk = stream.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        output.write(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Single-flight LRU cache of analysis results
+
+    Usage:
+        cache = ResultCache(max_entries=256)
+        result, outcome = cache.get_or_compute(digest, lambda: analyze(path))
+        # outcome is 'hit', 'coalesced' or 'miss'
+    """
+
+    def __init__(self, max_entries: int = 256):
+        """
+        Args:
+            max_entries: Results kept; the least recently used are evicted
+        """
+        self.max_entries = max_entries
+        self._results = OrderedDict()   # key -> result, least recently used first
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.errors = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        """Cached result for key (counted as a hit), or None"""
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+            return result
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Tuple[Any, str]:
+        """
+        Cached result for key, computing it at most once at a time
+
+        Args:
+            key: Content hash
+            compute: Produces the result on a miss; if it raises, the error is
+                passed to every waiting request and nothing is cached
+
+        Returns:
+            Tuple of (result, outcome) where outcome is 'hit', 'coalesced' or 'miss'
+        """
+        outcome, value = self.lookup(key)
+        if outcome == 'hit':
+            return value, outcome
+        if outcome == 'coalesced':
+            return value.result(), outcome
+
+        try:
+            result = compute()
+        except BaseException as e:
+            self.fail(key, e)
+            raise
+        self.complete(key, result)
+        return result, outcome
+
+    def lookup(self, key: str) -> Tuple[str, Any]:
+        """
+        Cached or in-flight result for key, for callers that compute it
+        themselves (e.g. in the background)
+
+        Returns:
+            ('hit', result), ('coalesced', Future of the result in flight), or
+            ('miss', None): the caller then computes the result and must call
+            complete() or fail(), and lookups until then coalesce onto it
+        """
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return 'hit', result
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return 'coalesced', future
+            self._inflight[key] = Future()
+            self.misses += 1
+            return 'miss', None
+
+    def complete(self, key: str, result: Any):
+        """Cache the result of a miss returned by lookup(), passing it to the coalesced requests"""
+        with self._lock:
+            self._store(key, result)
+            future = self._inflight.pop(key)
+        future.set_result(result)
+
+    def fail(self, key: str, error: BaseException):
+        """End a miss returned by lookup() without a result, raising error in the coalesced requests"""
+        with self._lock:
+            future = self._inflight.pop(key)
+            self.errors += 1
+        future.set_exception(error)
+
+    def _store(self, key: str, result: Any):
+        """Insert as most recently used, evicting beyond max_entries (lock held)"""
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and occupancy, for monitoring"""
+        with self._lock:
+            requests = self.hits + self.coalesced + self.misses
+            return {
+                'hits': self.hits,
+                'coalesced': self.coalesced,
+                'misses': self.misses,
+                'errors': self.errors,
+                'evictions': self.evictions,
+                'entries': len(self._results),
+                'max_entries': self.max_entries,
+                'in_flight': len(self._inflight),
+                'hit_rate': round((self.hits + self.coalesced) / requests, 3) if requests else None,
+            }
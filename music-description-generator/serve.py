@@ -0,0 +1,132 @@
+"""
+Production Server for Music Description Generator
+Preloads models once and forks worker processes that share them copy-on-write
+"""
+
+import argparse
+import gc
+import os
+import sys
+
+
+def limit_native_threads(threads: int):
+    """Cap BLAS/OpenMP/numba thread pools; must run before numpy is imported"""
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMBA_NUM_THREADS'):
+        os.environ.setdefault(var, str(threads))
+
+
+def post_fork(server, worker):
+    """Apply per-worker thread limits inside each forked worker"""
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(int(os.environ['OMP_NUM_THREADS']))
+
+
+def pre_fork(server, worker):
+    """Move preloaded objects out of GC tracking so workers don't dirty shared pages"""
+    gc.freeze()
+
+
+def create_server(options: dict):
+    """Build a gunicorn application serving the preloaded Flask app"""
+    from gunicorn.app.base import BaseApplication
+
+    class MusicServer(BaseApplication):
+        """Gunicorn application that imports the Flask app once, in the master"""
+
+        def __init__(self, settings):
+            self.settings = settings
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            return app
+
+    return MusicServer(options)
+
+
+def main():
+    """Main entry point for the production server"""
+    parser = argparse.ArgumentParser(
+        description="Serve the Music Description Generator with preloaded workers",
+        epilog="Chunked uploads, progressive results and waveforms are shared through the "
+               "upload folder, so any worker can answer for them. The result cache (and with it "
+               "coalescing of identical uploads, GET /analysis/<sha256> and 304 answers) is per "
+               "worker: with several workers a repeat may be analyzed again and a lookup may 404. "
+               "Use --workers 1 if clients rely on those lookups."
+    )
+    parser.add_argument('--bind', default='0.0.0.0:5000', help="Address to listen on (default: 0.0.0.0:5000)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                        help="Number of worker processes, each with its own result cache (default: CPU count)")
+    parser.add_argument('--threads', type=int, default=8,
+                        help="Request-handling threads per worker (default: 8)")
+    parser.add_argument('--analysis-threads', type=int, default=1,
+                        help="Concurrent analyses per worker; further requests get 503 (default: 1)")
+    parser.add_argument('--native-threads', type=int, default=1,
+                        help="BLAS/OpenMP/torch threads per worker (default: 1)")
+    parser.add_argument('--lean', action='store_true',
+                        help="Memory-lean analysis mode (float32, segmented spectra, reused buffers)")
+    parser.add_argument('--memory-budget', type=float, metavar='MB',
+                        help="Per-worker memory budget; larger tracks are analyzed from a shorter excerpt")
+    parser.add_argument('--classifier-backend', choices=['torch', 'int8', 'onnx', 'none'], default='none',
+                        help="Load the classifier on this inference backend: torch eager, int8-quantized torch "
+                             "or ONNX Runtime (default: none; genre detection doesn't use it yet)")
+    parser.add_argument('--classifier-model', metavar='MODEL',
+                        help="Classifier model id or local directory")
+    parser.add_argument('--retry-after', type=int, default=5,
+                        help="Retry-After seconds sent with 503 responses (default: 5)")
+    parser.add_argument('--timeout', type=int, default=300,
+                        help="Kill workers silent for this many seconds (default: 300)")
+    parser.add_argument('--graceful-timeout', type=int, default=120,
+                        help="Seconds in-flight requests get to finish on reload/shutdown (default: 120)")
+    args = parser.parse_args()
+
+    limit_native_threads(args.native_threads)
+    os.environ['ANALYSIS_WORKERS'] = str(args.analysis_threads)
+    os.environ['MAX_INFLIGHT_ANALYSES'] = str(args.analysis_threads)
+    os.environ['RETRY_AFTER_SECONDS'] = str(args.retry_after)
+    if args.lean:
+        os.environ['LEAN_ANALYSIS'] = '1'
+    if args.memory_budget:
+        os.environ['MEMORY_BUDGET_MB'] = str(args.memory_budget)
+    os.environ['CLASSIFIER_BACKEND'] = args.classifier_backend
+    os.environ['CLASSIFIER_THREADS'] = str(args.native_threads)
+    if args.classifier_model:
+        os.environ['CLASSIFIER_MODEL'] = args.classifier_model
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        print("gunicorn is required for production serving: pip install gunicorn")
+        print("(gunicorn runs on Linux/macOS; on Windows use: python app.py)")
+        sys.exit(1)
+
+    print("\n" + "="*60)
+    print("Music Description Generator - Production Server")
+    print("="*60)
+    print(f"Listening on: {args.bind}")
+    print(f"Workers: {args.workers} x {args.threads} threads, {args.analysis_threads} concurrent analyses each")
+    print(f"Classifier backend: {args.classifier_backend}")
+    print("\nkill -HUP <master pid>   graceful reload of workers")
+    print("kill -USR2 <master pid>  zero-downtime upgrade after code changes")
+    print("="*60 + "\n")
+
+    create_server({
+        'bind': args.bind,
+        'workers': args.workers,
+        'worker_class': 'gthread',
+        'threads': args.threads,
+        'preload_app': True,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'pre_fork': pre_fork,
+        'post_fork': post_fork,
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""
+Live Stream Analysis
+Tag radio and stream feeds continuously from blocks of PCM audio
+
+StreamAnalyzer keeps per-frame features (RMS, zero crossings, spectral
+centroid, onset strength and chroma) for a rolling window of the most recent
+audio in fixed-size ring buffers, so memory stays constant however long the
+stream runs. At every update interval it derives tempo, key, energy and mood
+from the window with the same rules as MusicAnalyzer, and reports them.
+
+Frame features are computed as blocks arrive. The chromagram (a CQT, as for
+whole files) is computed at each update for the audio received since the
+previous one, with a few seconds of earlier audio as context. Either way the
+work per second of audio is constant and far below real time.
+
+Usage:
+    ffmpeg -i http://radio.example/stream -f s16le -ac 1 -ar 22050 - | \\
+        python stream_analyzer.py - --format s16le --rate 22050
+    python stream_analyzer.py tcp:127.0.0.1:9000 --interval 2
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sys
+import time
+from typing import BinaryIO, Callable, Dict, Iterator, Optional
+
+import librosa
+import numpy as np
+
+from chunked_upload import WavStreamDecoder
+from fast_features import FRAME_LENGTH, HOP_LENGTH
+from music_analyzer import MusicAnalyzer
+
+try:
+    import soxr
+except ImportError:  # soxr ships with librosa>=0.10, but stay usable without it
+    soxr = None
+
+
+READ_SIZE = 16384
+RAW_FORMATS = {'s16le': '<i2', 'f32le': '<f4'}
+
+
+class FeatureRing:
+    """Fixed-size buffer holding the most recent frames of a feature"""
+
+    def __init__(self, size: int, rows: Optional[int] = None):
+        self.size = size
+        self.frames = 0
+        self._data = np.zeros((rows, size) if rows else size, dtype=np.float32)
+        self._write = 0
+
+    def push(self, values: np.ndarray):
+        """Append frames (the last axis), overwriting the oldest"""
+        n = values.shape[-1]
+        if n > self.size:
+            values = values[..., -self.size:]
+            n = self.size
+        index = (self._write + np.arange(n)) % self.size
+        self._data[..., index] = values
+        self._write = (self._write + n) % self.size
+        self.frames += n
+
+    def values(self) -> np.ndarray:
+        """The buffered frames in time order"""
+        if self.frames < self.size:
+            return self._data[..., :self.frames]
+        return np.concatenate([self._data[..., self._write:], self._data[..., :self._write]], axis=-1)
+
+
+class StreamAnalyzer:
+    """
+    Rolling analysis of a live mono signal
+
+    Fed the same way as chunked_upload.SignalAccumulator (set_source_rate()
+    then add() with native-rate mono blocks), so the stream decoders there
+    can drive it directly.
+
+    Usage:
+        stream = StreamAnalyzer(on_update=print, interval=5)
+        stream.set_source_rate(44100)
+        for block in blocks:
+            stream.add(block)
+        stream.finish()
+    """
+
+    full = False  # A stream never fills up (decoders check this)
+
+    # Tempo estimates need several beats; before this much audio none is given
+    MIN_TEMPO_SECONDS = 4
+    
+    # Earlier audio included when computing the chromagram of new audio, so
+    # its first frames see the same surroundings as in a whole-file CQT
+    CHROMA_CONTEXT_SECONDS = 3
+
+    def __init__(self, on_update: Callable[[Dict], None], interval: float = 5.0, window: float = 30.0,
+                 analyzer: Optional[MusicAnalyzer] = None):
+        """
+        Args:
+            on_update: Called with the current results every `interval` seconds of audio
+            interval: Seconds of audio between updates
+            window: Seconds of the most recent audio the results describe
+            analyzer: Provides the tempo/key/mood rules (default: one without a classifier)
+        """
+        if interval <= 0 or window <= 0:
+            raise ValueError("interval and window must be positive")
+        self.on_update = on_update
+        self.analyzer = analyzer or MusicAnalyzer(classifier_backend=None)
+        self.sr = MusicAnalyzer.SAMPLE_RATE
+        self.interval = interval
+        self.window = window
+
+        self._mel_basis = librosa.filters.mel(sr=self.sr, n_fft=FRAME_LENGTH)
+        self._fft_window = librosa.filters.get_window('hann', FRAME_LENGTH, fftbins=True).astype(np.float32)
+        self._freqs = librosa.fft_frequencies(sr=self.sr, n_fft=FRAME_LENGTH)
+
+        # Ring buffers of per-frame features covering the window
+        self._size = int(np.ceil(window * self.sr / HOP_LENGTH))
+        self._rms = FeatureRing(self._size)
+        self._zcr = FeatureRing(self._size)
+        self._centroid = FeatureRing(self._size)
+        self._onset = FeatureRing(self._size)
+        self._chroma = FeatureRing(self._size, rows=12)
+
+        self._pending = np.zeros(0, dtype=np.float32)   # Samples not yet in a complete frame
+        self._chroma_audio = []                         # Context and audio since the last chromagram
+        self._chroma_context = 0
+        self._previous_mel = None
+        self._mel_db_max = -np.inf
+        self._resampler = None
+        self._source_sr = self.sr
+
+        self.samples = 0
+        self.processing_seconds = 0.0
+        self.updates = 0
+        self._next_update = int(interval * self.sr)
+
+    def set_source_rate(self, sr: int):
+        """Configure the native sample rate of the incoming blocks"""
+        self._source_sr = sr
+        if sr != self.sr and soxr is not None:
+            self._resampler = soxr.ResampleStream(sr, self.sr, 1, dtype='float32', quality='HQ')
+
+    def add(self, block: np.ndarray):
+        """Process a native-rate mono block, reporting results when an update is due"""
+        start = time.perf_counter()
+        block = np.asarray(block, dtype=np.float32)
+        if self._resampler is not None:
+            block = self._resampler.resample_chunk(block)
+        elif self._source_sr != self.sr:
+            block = librosa.resample(block, orig_sr=self._source_sr, target_sr=self.sr)
+        self._consume(block)
+        self.processing_seconds += time.perf_counter() - start
+
+        if self.samples >= self._next_update:
+            self._next_update = (self.samples // int(self.interval * self.sr) + 1) * int(self.interval * self.sr)
+            self._emit(final=False)
+
+    def finish(self):
+        """Report the results for the end of the stream"""
+        if self._resampler is not None:
+            self._consume(self._resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True))
+        if self._rms.frames:
+            self._emit(final=True)
+
+    def _consume(self, block: np.ndarray):
+        """Analyze every complete frame, keeping the remainder for the next block"""
+        self.samples += len(block)
+        self._chroma_audio.append(block)
+        pending = np.concatenate([self._pending, block]) if len(self._pending) else block
+        if len(pending) < FRAME_LENGTH:
+            self._pending = pending
+            return
+
+        n_frames = 1 + (len(pending) - FRAME_LENGTH) // HOP_LENGTH
+        # Frames older than the window would be overwritten right away
+        skip = max(n_frames - self._size - 1, 0)
+        frames = librosa.util.frame(pending[skip * HOP_LENGTH:], frame_length=FRAME_LENGTH,
+                                    hop_length=HOP_LENGTH)[:, :n_frames - skip]
+        self._analyze_frames(frames)
+        self._pending = pending[n_frames * HOP_LENGTH:].copy()
+
+    def _analyze_frames(self, frames: np.ndarray):
+        """Frame features, as MusicAnalyzer computes them, written to the ring buffers"""
+        rms = np.sqrt(np.mean(frames ** 2, axis=0))
+        zcr = np.mean(np.abs(np.diff(np.signbit(frames), axis=0)), axis=0)
+
+        S = np.abs(np.fft.rfft(frames * self._fft_window[:, None], axis=0))
+        centroid = (self._freqs @ S) / np.maximum(S.sum(axis=0), 1e-10)
+        np.square(S, out=S)
+
+        # Onset strength: median rise of the log-mel spectrum since the
+        # previous frame, with an 80 dB floor below the loudest frame so far
+        mel_db = 10 * np.log10(np.maximum(self._mel_basis @ S, 1e-10))
+        self._mel_db_max = max(self._mel_db_max, float(mel_db.max()))
+        np.maximum(mel_db, self._mel_db_max - 80, out=mel_db)
+        previous = self._previous_mel if self._previous_mel is not None else mel_db[:, :1]
+        rise = np.diff(np.concatenate([previous, mel_db], axis=1), axis=1)
+        onset = np.median(np.maximum(rise, 0), axis=0)
+        self._previous_mel = mel_db[:, -1:]
+
+        self._rms.push(rms)
+        self._zcr.push(zcr)
+        self._centroid.push(centroid)
+        self._onset.push(onset)
+
+    def _update_chroma(self):
+        """Chromagram of the audio received since the last update"""
+        y = np.concatenate(self._chroma_audio) if self._chroma_audio else np.zeros(0, dtype=np.float32)
+        n_new = (len(y) - self._chroma_context) // HOP_LENGTH
+        if n_new <= 0:
+            return
+        # Frame k is centered on sample k * HOP_LENGTH; frames within the
+        # context were added last time
+        first = self._chroma_context // HOP_LENGTH
+        chroma = librosa.feature.chroma_cqt(y=y, sr=self.sr, hop_length=HOP_LENGTH)
+        self._chroma.push(chroma[:, first:first + n_new])
+
+        end = self._chroma_context + n_new * HOP_LENGTH
+        context = min(end, self.CHROMA_CONTEXT_SECONDS * self.sr // HOP_LENGTH * HOP_LENGTH)
+        self._chroma_audio = [y[end - context:]]
+        self._chroma_context = context
+
+    def results(self) -> Dict:
+        """Tempo, key, energy and mood of the window"""
+        start = time.perf_counter()
+        self._update_chroma()
+        analyzer = self.analyzer
+        rms = self._rms.values()
+        zcr = self._zcr.values()
+        centroid = self._centroid.values()
+        chroma = self._chroma.values()
+        window_seconds = len(rms) * HOP_LENGTH / self.sr
+
+        tempo = None
+        if window_seconds >= self.MIN_TEMPO_SECONDS:
+            tempo = float(librosa.feature.tempo(onset_envelope=self._onset.values(),
+                                                sr=self.sr, hop_length=HOP_LENGTH)[0])
+        genre = analyzer._detect_genre(centroid, zcr, tempo or 0)
+
+        results = {
+            'stream_seconds': round(self.samples / self.sr, 2),
+            'window_seconds': round(window_seconds, 2),
+            'tempo': round(tempo, 1) if tempo is not None else None,
+            'key': analyzer._detect_key(chroma),
+            'mood': analyzer._detect_mood(rms, chroma, tempo or 0),
+            'energy': analyzer._calculate_energy(rms),
+            'loudness': round(float(librosa.amplitude_to_db(rms).mean()), 1),
+            'valence': analyzer._calculate_valence(chroma, rms),
+            'danceability': analyzer._calculate_danceability(tempo, None, rms) if tempo is not None else None,
+            'genre': genre['primary'],
+            'sub_genre': genre['secondary'],
+        }
+        self.processing_seconds += time.perf_counter() - start
+        return results
+
+    def _emit(self, final: bool):
+        results = self.results()
+        results['final'] = final
+        # Processing time per second of audio; must stay well below 1
+        results['realtime_factor'] = round(self.processing_seconds / max(self.samples / self.sr, 1e-9), 4)
+        self.updates += 1
+        self.on_update(results)
+
+
+class RawPCMDecoder:
+    """Decoder for headerless interleaved PCM, fed with raw bytes as they arrive"""
+
+    def __init__(self, stream: StreamAnalyzer, sample_format: str, sr: int, channels: int):
+        self.stream = stream
+        self.dtype = np.dtype(RAW_FORMATS[sample_format])
+        self.channels = channels
+        self._frame_bytes = self.dtype.itemsize * channels
+        self._buffer = bytearray()
+        stream.set_source_rate(sr)
+
+    def feed(self, data: bytes):
+        """Decode every complete frame available so far"""
+        self._buffer.extend(data)
+        n_frames = len(self._buffer) // self._frame_bytes
+        if n_frames == 0:
+            return
+        raw = bytes(self._buffer[:n_frames * self._frame_bytes])
+        del self._buffer[:n_frames * self._frame_bytes]
+        samples = np.frombuffer(raw, dtype=self.dtype).astype(np.float32)
+        if self.dtype.kind == 'i':
+            samples /= 32768
+        self.stream.add(samples.reshape(n_frames, self.channels).mean(axis=1))
+
+
+def analyze_stream(source: BinaryIO, stream: StreamAnalyzer, sample_format: str = 'auto',
+                   sr: int = MusicAnalyzer.SAMPLE_RATE, channels: int = 1):
+    """
+    Feed a byte stream to a StreamAnalyzer until it ends
+
+    Args:
+        source: Binary file-like object (file, pipe or socket file)
+        stream: Analyzer receiving the decoded audio
+        sample_format: 'wav', 's16le', 'f32le', or 'auto' (WAV if it starts
+            with a RIFF header, else s16le)
+        sr: Sample rate of raw PCM
+        channels: Channel count of raw PCM
+    """
+    first = source.read(READ_SIZE)
+    if sample_format == 'auto':
+        sample_format = 'wav' if first[:4] == b'RIFF' else 's16le'
+    decoder = WavStreamDecoder(stream) if sample_format == 'wav' else RawPCMDecoder(stream, sample_format, sr, channels)
+
+    data = first
+    while data:
+        decoder.feed(data)
+        data = source.read1(READ_SIZE) if hasattr(source, 'read1') else source.read(READ_SIZE)
+    stream.finish()
+
+
+def socket_sources(address: str) -> Iterator[BinaryIO]:
+    """Listen on 'tcp:HOST:PORT' or 'unix:PATH' and yield each connection as a binary file"""
+    kind, _, target = address.partition(':')
+    if kind == 'tcp':
+        host, _, port = target.rpartition(':')
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host or '127.0.0.1', int(port)))
+    else:
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(target)
+        server.bind(target)
+
+    with server:
+        server.listen(1)
+        print(f"Listening on {address}", file=sys.stderr)
+        while True:
+            connection, peer = server.accept()
+            print(f"Stream connected: {peer or target}", file=sys.stderr)
+            with connection, connection.makefile('rb') as source:
+                yield source
+
+
+def main():
+    """Main entry point for live stream analysis"""
+    parser = argparse.ArgumentParser(
+        description="Analyze a live audio stream, printing updated results as JSON lines.",
+        epilog="Example: ffmpeg -i URL -f s16le -ac 1 -ar 22050 - | python stream_analyzer.py -"
+    )
+    parser.add_argument('source', help="'-' for stdin, a file, 'tcp:HOST:PORT' or 'unix:PATH' to listen on")
+    parser.add_argument('--format', choices=['auto', 'wav'] + list(RAW_FORMATS), default='auto',
+                        help="Input format (default: auto, WAV if the stream has a RIFF header, else s16le)")
+    parser.add_argument('--rate', type=int, default=MusicAnalyzer.SAMPLE_RATE,
+                        help="Sample rate of raw PCM input (default: 22050)")
+    parser.add_argument('--channels', type=int, default=1, help="Channels of raw PCM input (default: 1)")
+    parser.add_argument('--interval', type=float, default=5.0, help="Seconds of audio between updates (default: 5)")
+    parser.add_argument('--window', type=float, default=30.0,
+                        help="Seconds of recent audio the results describe (default: 30)")
+    args = parser.parse_args()
+
+    def emit(results):
+        print(json.dumps(results), flush=True)
+
+    # Keep stdout for results
+    with contextlib.redirect_stdout(sys.stderr):
+        analyzer = MusicAnalyzer(classifier_backend=None)
+
+    def run(source):
+        stream = StreamAnalyzer(emit, interval=args.interval, window=args.window, analyzer=analyzer)
+        analyze_stream(source, stream, args.format, args.rate, args.channels)
+
+    try:
+        if args.source == '-':
+            run(sys.stdin.buffer)
+        elif args.source.startswith(('tcp:', 'unix:')):
+            for source in socket_sources(args.source):
+                try:
+                    run(source)
+                except (ValueError, OSError) as e:
+                    print(f"Stream error: {e}", file=sys.stderr)
+        else:
+            with open(args.source, 'rb') as source:
+                run(source)
+    except KeyboardInterrupt:
+        pass
+    except ValueError as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
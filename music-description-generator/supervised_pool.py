@@ -0,0 +1,322 @@
+"""
+Supervised Worker Pool
+Run tasks in worker processes that are replaced when they hang, crash or
+use too much memory
+
+Each worker builds its task handler once (e.g. loading the analysis models)
+and then runs one task at a time. The supervisor gives every task a
+wall-clock limit and, where the memory of other processes can be read
+(/proc), a resident-memory limit checked several times a second. Since a
+fast allocation can outrun those checks, each worker's address space is also
+capped (RLIMIT_AS) at what its handler mapped plus the memory limit, so
+allocating past it fails with MemoryError inside the worker. A worker
+that exceeds either, or dies, is killed and a fresh one is started while the
+others carry on, so one pathological input costs one task slot for at most
+the time limit instead of stalling the run. Its task is reported as failed;
+exceptions raised by a task are reported the same way without replacing the
+worker.
+"""
+
+import collections
+import multiprocessing
+import signal
+import time
+from multiprocessing.connection import wait
+from typing import Any, Callable, Hashable, Iterator, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from memory_monitor import current_rss_bytes, current_vm_bytes
+
+
+MEMORY_POLL_INTERVAL = 0.2      # Seconds between checks of the workers' memory
+START_TIMEOUT = 300.0           # Seconds a new worker may take to build its handler
+STOP_TIMEOUT = 5.0              # Seconds workers get to exit before being killed
+
+
+class TaskFailure:
+    """Why a task produced no result"""
+
+    def __init__(self, reason: str, message: str, elapsed: float, peak_rss_mb: Optional[float] = None):
+        """
+        Args:
+            reason: 'timeout', 'memory' or 'crashed' (the worker was lost),
+                or 'error' (the task raised an exception)
+            message: Details for reports
+            elapsed: Seconds the task ran
+            peak_rss_mb: Highest worker memory seen while it ran, if measured
+        """
+        self.reason = reason
+        self.message = message
+        self.elapsed = elapsed
+        self.peak_rss_mb = peak_rss_mb
+
+    @property
+    def fatal(self) -> bool:
+        """Whether the task took its worker down, rather than raising an exception"""
+        return self.reason != 'error'
+
+    def __repr__(self) -> str:
+        return f"TaskFailure({self.reason!r}, {self.message!r}, elapsed={self.elapsed:.1f})"
+
+
+def _limit_address_space(memory_bytes: int):
+    """
+    Cap this process's address space at what it has mapped now plus
+    memory_bytes, so a runaway allocation raises MemoryError before the
+    supervisor's next check instead of exhausting the host's memory
+    """
+    mapped = current_vm_bytes()
+    if resource is None or mapped is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = mapped + int(memory_bytes)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _worker_main(conn, factory: Callable, factory_args: tuple, memory_bytes: Optional[int] = None):
+    """Worker process: build the handler, then run tasks until told to stop"""
+    # Ctrl-C is handled by the supervisor, which stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    handler = factory(*factory_args)
+    if memory_bytes:
+        # After the handler is built, so the models it loaded don't count
+        # against a limit meant for one task
+        _limit_address_space(memory_bytes)
+    conn.send(('ready', None, None))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        key, task = message
+        try:
+            conn.send(('done', key, handler(task)))
+        except MemoryError:
+            conn.send(('memory', key, "MemoryError"))
+            return  # the process may be left in a bad state; it is replaced
+        except Exception as e:
+            conn.send(('error', key, f"{type(e).__name__}: {e}" if str(e) else type(e).__name__))
+
+
+class _Worker:
+    """A worker process and the task it is running"""
+
+    def __init__(self, context, factory: Callable, factory_args: tuple, memory_bytes: Optional[int] = None):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main,
+                                       args=(child_conn, factory, factory_args, memory_bytes), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.key = None
+        self.started = time.monotonic()   # of the current task, or of startup
+        self.peak_rss = 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def peak_rss_mb(self) -> Optional[float]:
+        return round(self.peak_rss / (1024 * 1024), 1) if self.peak_rss else None
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def _exit_description(exitcode: Optional[int]) -> str:
+    if exitcode is not None and exitcode < 0:
+        try:
+            name = signal.Signals(-exitcode).name
+        except ValueError:
+            name = f"signal {-exitcode}"
+        hint = " (out of memory?)" if name == 'SIGKILL' else ""
+        return f"worker killed by {name}{hint}"
+    return f"worker exited with code {exitcode}"
+
+
+class SupervisedPool:
+    """
+    Process pool with per-task time and memory limits
+
+    Usage:
+        with SupervisedPool(make_handler, (options,), workers=4, timeout=120, memory_mb=2048) as pool:
+            for path in paths:
+                pool.submit(path, path)
+            for key, result, failure in pool.results():
+                ...   # failure is None or a TaskFailure
+    """
+
+    def __init__(self, factory: Callable, factory_args: tuple = (), workers: int = 1,
+                 timeout: Optional[float] = None, memory_mb: Optional[float] = None,
+                 start_method: str = 'spawn'):
+        """
+        Args:
+            factory: Called with factory_args in each worker to build its
+                handler, which is then called with each task and returns its
+                result (both must be importable and picklable)
+            factory_args: Arguments for factory
+            workers: Number of worker processes
+            timeout: Wall-clock limit per task in seconds (None for no limit)
+            memory_mb: Resident memory limit per worker (None for no limit;
+                not enforced where /proc is unavailable), also applied as
+                an address-space limit on top of what the handler mapped
+            start_method: multiprocessing start method; 'spawn' gives every
+                worker a clean interpreter
+        """
+        self.factory = factory
+        self.factory_args = factory_args
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.memory_bytes = memory_mb * 1024 * 1024 if memory_mb else None
+        self._context = multiprocessing.get_context(start_method)
+        self._queue = collections.deque()
+        self._pool: List[_Worker] = []
+        self.restarts = 0
+
+    def __enter__(self) -> 'SupervisedPool':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, key: Hashable, task: Any):
+        """Queue a task; its outcome is reported by results() under key"""
+        self._queue.append((key, task))
+
+    @property
+    def outstanding(self) -> int:
+        """Tasks queued or running"""
+        return len(self._queue) + sum(worker.key is not None for worker in self._pool)
+
+    def results(self) -> Iterator[Tuple[Hashable, Any, Optional[TaskFailure]]]:
+        """
+        Outcomes of the submitted tasks as they finish, including tasks
+        submitted while iterating
+
+        Yields:
+            Tuples of (key, result, failure): result is None if failure is set
+        """
+        while self.outstanding:
+            self._start_workers()
+            self._dispatch()
+            yield from self._collect()
+
+    def close(self):
+        """Stop all workers (running tasks are abandoned)"""
+        for worker in self._pool:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for worker in self._pool:
+            worker.process.join(max(deadline - time.monotonic(), 0) if worker.key is None else 0)
+            worker.kill()
+        self._pool = []
+
+    def _start_workers(self):
+        """Start workers up to the pool size, but not more than there are tasks for"""
+        while len(self._pool) < min(self.workers, self.outstanding):
+            self._pool.append(_Worker(self._context, self.factory, self.factory_args, self.memory_bytes))
+
+    def _dispatch(self):
+        for worker in self._pool:
+            if worker.ready and worker.key is None and self._queue:
+                key, task = self._queue.popleft()
+                worker.conn.send((key, task))
+                worker.key = key
+                worker.started = time.monotonic()
+                worker.peak_rss = 0
+
+    def _next_check(self) -> float:
+        """Seconds until a limit may next need enforcing"""
+        delays = [1.0]
+        if self.memory_bytes:
+            delays.append(MEMORY_POLL_INTERVAL)
+        for worker in self._pool:
+            if not worker.ready:
+                delays.append(START_TIMEOUT - worker.elapsed())
+            elif worker.key is not None and self.timeout:
+                delays.append(self.timeout - worker.elapsed())
+        return max(min(delays), 0)
+
+    def _collect(self) -> List[Tuple[Hashable, Any, Optional[TaskFailure]]]:
+        """Wait for messages or a limit, and return the outcomes of finished tasks"""
+        handles = [worker.conn for worker in self._pool] + [worker.process.sentinel for worker in self._pool]
+        wait(handles, self._next_check())
+
+        outcomes = []
+        for worker in list(self._pool):
+            retire = False
+            try:
+                while worker.conn.poll():
+                    kind, key, payload = worker.conn.recv()
+                    if kind == 'ready':
+                        worker.ready = True
+                        worker.started = time.monotonic()
+                        continue
+                    elapsed, worker.key = worker.elapsed(), None
+                    if kind == 'done':
+                        outcomes.append((key, payload, None))
+                    else:
+                        reason = 'error' if kind == 'error' else 'memory'
+                        outcomes.append((key, None, TaskFailure(reason, payload, elapsed, worker.peak_rss_mb())))
+                        retire = reason == 'memory'
+            except (EOFError, OSError):
+                pass  # the worker died; handled below
+
+            if retire:
+                self._replace(worker)
+            elif not worker.process.is_alive():
+                worker.process.join()
+                if not worker.ready:
+                    raise RuntimeError(f"Worker failed to start: {_exit_description(worker.process.exitcode)}")
+                if worker.key is not None:
+                    outcomes.append((worker.key, None, TaskFailure(
+                        'crashed', _exit_description(worker.process.exitcode), worker.elapsed(),
+                        worker.peak_rss_mb())))
+                self._replace(worker)
+            elif not worker.ready:
+                if worker.elapsed() > START_TIMEOUT:
+                    worker.kill()
+                    raise RuntimeError(f"Worker did not start within {START_TIMEOUT:.0f}s")
+            elif worker.key is not None:
+                failure = self._check_limits(worker)
+                if failure is not None:
+                    outcomes.append((worker.key, None, failure))
+                    self._replace(worker)
+        return outcomes
+
+    def _check_limits(self, worker: _Worker) -> Optional[TaskFailure]:
+        """Failure if the worker's task has exceeded its time or memory limit"""
+        if self.memory_bytes:
+            rss = current_rss_bytes(worker.process.pid)
+            if rss is not None:
+                worker.peak_rss = max(worker.peak_rss, rss)
+                if rss > self.memory_bytes:
+                    return TaskFailure('memory', f"used {rss / (1024 * 1024):.0f}MB, over the limit of "
+                                       f"{self.memory_bytes / (1024 * 1024):.0f}MB",
+                                       worker.elapsed(), worker.peak_rss_mb())
+        if self.timeout and worker.elapsed() > self.timeout:
+            return TaskFailure('timeout', f"still running after {self.timeout:.0f}s", worker.elapsed(),
+                               worker.peak_rss_mb())
+        return None
+
+    def _replace(self, worker: _Worker):
+        """Kill a worker; a new one is started if there is work for it"""
+        worker.kill()
+        self._pool.remove(worker)
+        self.restarts += 1
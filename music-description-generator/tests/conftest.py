@@ -0,0 +1,25 @@
+"""
+Shared test setup: the modules under test are top-level scripts, so the
+project directory is put on the import path (and inherited by the worker
+processes SupervisedPool spawns)
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def tone():
+    """Factory for a few seconds of a chord with a little noise, as float32"""
+    def make(seconds: float = 3.0, sr: int = 22050, channels: int = 1, seed: int = 0) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        t = np.arange(int(seconds * sr)) / sr
+        chord = sum(np.sin(2 * np.pi * f * t) for f in (220.0, 277.2, 329.6)) / 4
+        signal = chord[:, None] * np.linspace(0.5, 1.0, channels) + 0.05 * rng.standard_normal((len(t), channels))
+        return signal.astype(np.float32).squeeze()
+    return make
@@ -0,0 +1,156 @@
+"""Incremental WAV/FLAC decoding and chunked uploads, checked against soundfile"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from chunked_upload import (ChunkedUploadManager, FlacStreamDecoder, SignalAccumulator, UploadError,
+                            WavStreamDecoder)
+from track_analysis import FIELD_NAMES, TrackAnalysis
+
+
+SR = 22050
+
+
+def reference(path) -> np.ndarray:
+    """What soundfile decodes, averaged to mono the same way the decoders do"""
+    data, _ = sf.read(str(path), dtype='float32', always_2d=True)
+    return data.mean(axis=1)
+
+
+def assert_same_signal(actual: np.ndarray, expected: np.ndarray):
+    """Samples identical; a float32 downmix may round differently in the last bit (numpy's
+    reductions depend on memory alignment), so multichannel averages may differ by one ulp"""
+    assert actual.dtype == np.float32 and actual.shape == expected.shape
+    np.testing.assert_array_max_ulp(actual, expected, maxulp=1)
+
+
+def chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+@pytest.mark.parametrize('subtype', ['PCM_U8', 'PCM_16', 'PCM_24', 'PCM_32', 'FLOAT', 'DOUBLE'])
+@pytest.mark.parametrize('channels', [1, 2])
+def test_wav_decoder_matches_soundfile(tmp_path, tone, subtype, channels):
+    path = tmp_path / 'track.wav'
+    sf.write(str(path), tone(channels=channels), SR, subtype=subtype)
+    data = path.read_bytes()
+
+    accumulator = SignalAccumulator(SR, max_duration=60)
+    decoder = WavStreamDecoder(accumulator)
+    for chunk in chunks(data, 1001):   # splits the header and frames at odd places
+        decoder.feed(chunk)
+
+    if channels == 1:
+        np.testing.assert_array_equal(accumulator.signal(), reference(path))
+    else:
+        assert_same_signal(accumulator.signal(), reference(path))
+
+
+def test_wav_decoder_stops_at_analysis_window(tmp_path, tone):
+    path = tmp_path / 'track.wav'
+    sf.write(str(path), tone(seconds=3), SR)
+
+    accumulator = SignalAccumulator(SR, max_duration=1)
+    decoder = WavStreamDecoder(accumulator)
+    for chunk in chunks(path.read_bytes(), 4096):
+        decoder.feed(chunk)
+
+    assert accumulator.full
+    np.testing.assert_array_equal(accumulator.signal(), reference(path)[:SR])
+
+
+def test_wav_decoder_rejects_other_formats():
+    decoder = WavStreamDecoder(SignalAccumulator(SR, max_duration=60))
+    with pytest.raises(ValueError):
+        decoder.feed(b'fLaC' + bytes(64))
+
+
+@pytest.mark.parametrize('channels', [1, 2])
+def test_flac_decoder_matches_soundfile(tmp_path, tone, channels):
+    source = tmp_path / 'source.flac'
+    sf.write(str(source), tone(seconds=20, sr=44100, channels=channels), 44100, subtype='PCM_16')
+    data = source.read_bytes()
+    assert len(data) > 4 * FlacStreamDecoder.SAFETY_MARGIN   # so some frames decode before the end
+
+    path = tmp_path / 'upload.flac'
+    accumulator = SignalAccumulator(44100, max_duration=60)
+    decoder = FlacStreamDecoder(accumulator, path, len(data))
+    decoded_early = False
+    with open(path, 'wb') as f:
+        for chunk in chunks(data, 64 * 1024):
+            f.write(chunk)
+            f.flush()
+            decoder.feed(chunk, f.tell())
+            decoded_early |= f.tell() < len(data) and decoder._position > 0
+
+    assert decoded_early
+    assert_same_signal(accumulator.signal(), reference(source))
+
+
+def test_accumulator_resamples_to_analysis_rate(tmp_path, tone):
+    path = tmp_path / 'track.wav'
+    sf.write(str(path), tone(seconds=2, sr=44100), 44100)
+
+    accumulator = SignalAccumulator(SR, max_duration=60)
+    decoder = WavStreamDecoder(accumulator)
+    for chunk in chunks(path.read_bytes(), 8192):
+        decoder.feed(chunk)
+
+    assert len(accumulator.signal()) == pytest.approx(2 * SR, abs=2)
+
+
+class CountingAnalyzer:
+    """Stands in for MusicAnalyzer, recording what it was asked to analyze"""
+
+    SAMPLE_RATE = SR
+    MAX_DURATION = 2.0
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def analyze_signal(self, y, sr, file_name):
+        with self._lock:
+            self.calls.append(file_name)
+        values = dict.fromkeys(FIELD_NAMES, 0)
+        values.update(file_name=file_name, duration='', key='', time_signature='', genre='', sub_genre='',
+                      mood='', instruments=[], analysis_date='', samples=len(y))
+        return TrackAnalysis(**values)
+
+    def analyze_audio(self, path):
+        raise AssertionError("the decoded window should have been analyzed")
+
+
+@pytest.mark.parametrize('extension', ['wav', 'flac'])
+def test_upload_shared_between_managers_is_analyzed_once(tmp_path, tone, extension):
+    source = tmp_path / f'track.{extension}'
+    sf.write(str(source), tone(seconds=3), SR)
+    data = source.read_bytes()
+    pieces = list(chunks(data, 20000))
+
+    analyzer = CountingAnalyzer()
+    with ThreadPoolExecutor(2) as executor:
+        # Two managers over one directory, as in two server processes
+        first, second = (ChunkedUploadManager(str(tmp_path / 'uploads'), analyzer, executor, 1 << 30)
+                         for _ in range(2))
+        upload_id = first.start(source.name, len(data)).upload_id
+        offset = 0
+        for i, piece in enumerate(pieces):
+            (first, second)[i % 2].append(upload_id, offset, piece)
+            offset += len(piece)
+
+        with pytest.raises(UploadError) as error:
+            first.append(upload_id, 0, pieces[0])
+        assert error.value.status == 409 and error.value.received == len(data)
+
+        result = second.finish(upload_id)
+
+    assert analyzer.calls == [source.name]
+    assert result['samples'] == int(CountingAnalyzer.MAX_DURATION * SR)
+    with pytest.raises(UploadError):
+        first.get(upload_id)
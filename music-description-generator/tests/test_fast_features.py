@@ -0,0 +1,59 @@
+"""Fused feature kernels against librosa, with and without numba"""
+
+import librosa
+import numpy as np
+import pytest
+
+import fast_features
+from fast_features import frame_stats, spectral_stats
+
+
+SR = 22050
+
+KERNELS = [pytest.param(False, id='numpy'),
+           pytest.param(True, id='numba',
+                        marks=pytest.mark.skipif(not fast_features.HAVE_NUMBA, reason="numba not installed"))]
+
+
+@pytest.fixture(params=KERNELS)
+def use_numba(request, monkeypatch):
+    monkeypatch.setattr(fast_features, 'HAVE_NUMBA', request.param)
+    return request.param
+
+
+@pytest.fixture(params=['tone', 'gaps', 'short'])
+def signal(request, tone):
+    y = tone(seconds=4)
+    if request.param == 'gaps':
+        y[SR:2 * SR] = 0           # silent frames: no crossings, unnormalized spectra
+        y[3 * SR:] *= 1e-12        # values below the zero-crossing threshold
+    elif request.param == 'short':
+        y = y[:1500]               # shorter than one frame
+    return y
+
+
+def test_frame_stats_match_librosa(use_numba, signal):
+    zcr, rms = frame_stats(signal)
+    np.testing.assert_array_equal(zcr, librosa.feature.zero_crossing_rate(signal)[0])
+    np.testing.assert_allclose(rms, librosa.feature.rms(y=signal)[0], rtol=1e-5, atol=1e-9)
+    assert rms.dtype == np.float32
+
+
+@pytest.mark.filterwarnings('ignore:n_fft=.* is too large')
+def test_spectral_stats_match_librosa(use_numba, signal):
+    S = np.abs(librosa.stft(signal))
+    freqs = librosa.fft_frequencies(sr=SR)
+    centroid, rolloff = spectral_stats(S, freqs)
+
+    expected_centroid = librosa.feature.spectral_centroid(S=S, sr=SR)[0]
+    expected_rolloff = librosa.feature.spectral_rolloff(S=S, sr=SR)[0]
+    if use_numba:
+        np.testing.assert_allclose(centroid, expected_centroid, rtol=1e-6)
+    else:
+        np.testing.assert_array_equal(centroid, expected_centroid)
+    np.testing.assert_array_equal(rolloff, expected_rolloff)
+
+
+def test_empty_signal(use_numba):
+    zcr, rms = frame_stats(np.zeros(0, dtype=np.float32))
+    assert len(zcr) == len(rms) == 0
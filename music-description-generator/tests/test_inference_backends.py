@@ -0,0 +1,75 @@
+"""Classifier backends on a tiny local model (no download; skipped without torch and transformers)"""
+
+import librosa
+import numpy as np
+import pytest
+
+pytest.importorskip('torch')
+pytest.importorskip('transformers')
+
+from inference_backends import TEST_LABELS, create_backend, create_test_model
+
+
+CLIP_SECONDS = 2.0
+
+
+@pytest.fixture(scope='module')
+def model(tmp_path_factory):
+    return create_test_model(tmp_path_factory.mktemp('model'))
+
+
+@pytest.fixture(scope='module')
+def clips():
+    rng = np.random.default_rng(0)
+    t = np.arange(int(16000 * CLIP_SECONDS)) / 16000
+    return [(np.sin(2 * np.pi * f * t) * 0.5 + 0.05 * rng.standard_normal(len(t))).astype(np.float32)
+            for f in (110, 440, 1760)]
+
+
+@pytest.fixture(scope='module')
+def reference(model, clips):
+    return create_backend('torch', model, clip_seconds=CLIP_SECONDS).probabilities(clips, 16000)
+
+
+def test_predictions_look_like_the_pipeline(model, clips):
+    backend = create_backend('torch', model, threads=1, clip_seconds=CLIP_SECONDS)
+    assert backend.labels == list(TEST_LABELS)
+
+    predictions = backend(clips[0], top_k=3)
+    assert len(predictions) == 3
+    assert {prediction['label'] for prediction in predictions} <= set(TEST_LABELS)
+    scores = [prediction['score'] for prediction in predictions]
+    assert scores == sorted(scores, reverse=True)
+    assert backend({'raw': clips[0], 'sampling_rate': 16000}, top_k=3) == predictions
+
+
+def test_batches_match_single_clips(model, clips, reference):
+    backend = create_backend('torch', model, clip_seconds=CLIP_SECONDS)
+    np.testing.assert_allclose(reference.sum(axis=1), 1, rtol=1e-6)
+    for clip, expected in zip(clips, reference):
+        np.testing.assert_allclose(backend.probabilities([clip], 16000)[0], expected, atol=1e-5)
+
+
+def test_other_sample_rates_are_resampled(model, clips):
+    backend = create_backend('torch', model, clip_seconds=CLIP_SECONDS)
+    resampled = librosa.resample(clips[1], orig_sr=16000, target_sr=22050)
+    probabilities = backend.probabilities([resampled], 22050)
+    assert probabilities.shape == (1, len(TEST_LABELS))
+    np.testing.assert_allclose(probabilities, backend.probabilities([clips[1]], 16000), atol=0.05)
+
+
+def test_int8_backend_stays_close_to_torch(model, clips, reference):
+    backend = create_backend('int8', model, clip_seconds=CLIP_SECONDS)
+    np.testing.assert_allclose(backend.probabilities(clips, 16000), reference, atol=0.05)
+
+
+@pytest.mark.filterwarnings('ignore:Converting a tensor to a Python boolean')   # from the ONNX export trace
+def test_onnx_backend_matches_torch(model, clips, reference, tmp_path):
+    pytest.importorskip('onnxruntime')
+    backend = create_backend('onnx', model, clip_seconds=CLIP_SECONDS, onnx_path=str(tmp_path / 'model.onnx'))
+    np.testing.assert_allclose(backend.probabilities(clips, 16000), reference, atol=1e-4)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_backend('tpu', 'model')
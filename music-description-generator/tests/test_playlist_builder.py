@@ -0,0 +1,94 @@
+"""Camelot wheel rules and the compatibility index built on them"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from playlist_builder import (PITCH_CLASSES, CompatibilityIndex, camelot_code, camelot_name, compatible_codes,
+                              energy_curve)
+
+
+@pytest.mark.parametrize('key, name', [
+    ('C Major', '8B'), ('A Minor', '8A'),
+    ('G Major', '9B'), ('E Minor', '9A'),
+    ('F Major', '7B'), ('D Minor', '7A'),
+    ('B Major', '1B'), ('G# Minor', '1A'),
+    ('E Major', '12B'), ('C# Minor', '12A'),
+    ('F# Major', '2B'), ('D# Minor', '2A'),
+])
+def test_camelot_positions(key, name):
+    assert camelot_name(camelot_code(key)) == name
+
+
+def test_every_key_has_its_own_position():
+    keys = [f"{note} {mode}" for note in PITCH_CLASSES for mode in ('Major', 'Minor')]
+    assert sorted(camelot_code(key) for key in keys) == list(range(24))
+
+
+def test_flats_and_case():
+    assert camelot_code('Bb Major') == camelot_code('A# Major')
+    assert camelot_code('Eb minor') == camelot_code('D# Minor')
+
+
+@pytest.mark.parametrize('key', ['', 'Unknown', 'H Major', 'C Dorian', None, 'C Major extra'])
+def test_unrecognized_keys(key):
+    assert camelot_code(key) == -1
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('8A', {'8A', '9A', '7A', '8B'}),
+    ('8B', {'8B', '9B', '7B', '8A'}),
+    ('12B', {'12B', '1B', '11B', '12A'}),   # the wheel wraps around
+    ('1A', {'1A', '2A', '12A', '1B'}),
+])
+def test_compatible_codes(name, expected):
+    code = next(code for code in range(24) if camelot_name(code) == name)
+    assert {camelot_name(other) for other in compatible_codes(code)} == expected
+
+
+def test_compatibility_is_symmetric():
+    for a, b in itertools.product(range(24), repeat=2):
+        assert (b in compatible_codes(a)) == (a in compatible_codes(b))
+
+
+def test_neighbors_match_a_brute_force_scan():
+    rng = np.random.default_rng(0)
+    keys = [f"{note} {mode}" for note in PITCH_CLASSES for mode in ('Major', 'Minor')] + ['Unknown']
+    n = 400
+    records = [{'key': keys[i], 'tempo': tempo, 'energy': 50}
+               for i, tempo in zip(rng.integers(0, len(keys), n), rng.uniform(70, 180, n))]
+    index = CompatibilityIndex.from_records(records, tempo_tolerance=0.06)
+    assert len(index) == sum(record['key'] != 'Unknown' for record in records)
+
+    for row in range(len(index)):
+        expected = [
+            other for other in range(len(index))
+            if other != row
+            and index.codes[other] in compatible_codes(index.codes[row])
+            and abs(np.log(index.tempos[other] / index.tempos[row])) <= np.log1p(0.06) + 1e-12
+        ]
+        assert sorted(index.neighbors(row).tolist()) == expected
+
+
+def test_planned_sets_only_step_between_compatible_tracks():
+    rng = np.random.default_rng(1)
+    keys = ['A Minor', 'C Major', 'E Minor', 'G Major', 'D Minor', 'F Major']
+    n = 120
+    records = [{'key': keys[i], 'tempo': tempo, 'energy': energy}
+               for i, tempo, energy in zip(rng.integers(0, len(keys), n), rng.uniform(120, 130, n),
+                                           rng.uniform(30, 95, n))]
+    index = CompatibilityIndex.from_records(records)
+    plan = index.plan(energy_curve('rising', 10), seed=0)
+
+    assert len(plan) == len(set(plan)) == 10
+    rows = [int(index.rows_of([track])[0]) for track in plan]
+    for previous, current in zip(rows, rows[1:]):
+        assert current in index.neighbors(previous)
+
+
+def test_energy_curves():
+    assert energy_curve('rising', 5, 40, 90).tolist() == [40, 52.5, 65, 77.5, 90]
+    assert energy_curve('50,100', 3).tolist() == [50, 75, 100]
+    with pytest.raises(ValueError):
+        energy_curve('sideways', 5)
@@ -0,0 +1,80 @@
+"""Single-flight and LRU behaviour of ResultCache"""
+
+import io
+import hashlib
+import threading
+
+import pytest
+
+from result_cache import ResultCache, save_and_hash
+
+
+def test_concurrent_requests_share_one_computation():
+    cache = ResultCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {'tempo': 120.0}
+
+    outcomes = []
+
+    def request():
+        outcomes.append(cache.get_or_compute('track', compute))
+
+    first = threading.Thread(target=request)
+    first.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=request) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    while cache.stats()['coalesced'] < len(followers):
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in [first] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(outcome for _, outcome in outcomes) == ['coalesced'] * 4 + ['miss']
+    assert all(result is outcomes[0][0] for result, _ in outcomes)
+    assert cache.get_or_compute('track', compute) == ({'tempo': 120.0}, 'hit')
+    stats = cache.stats()
+    assert (stats['hits'], stats['coalesced'], stats['misses']) == (1, 4, 1)
+
+
+def test_errors_reach_waiting_requests_and_are_not_cached():
+    cache = ResultCache()
+    outcome, _ = cache.lookup('track')
+    assert outcome == 'miss'
+    outcome, future = cache.lookup('track')
+    assert outcome == 'coalesced'
+
+    cache.fail('track', ValueError("undecodable"))
+    with pytest.raises(ValueError, match="undecodable"):
+        future.result(0)
+    assert cache.stats()['errors'] == 1
+
+    assert cache.get_or_compute('track', lambda: 'ok') == ('ok', 'miss')
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = ResultCache(max_entries=2)
+    cache.get_or_compute('a', lambda: 'A')
+    cache.get_or_compute('b', lambda: 'B')
+    assert cache.get('a') == 'A'           # 'b' is now the least recently used
+    cache.get_or_compute('c', lambda: 'C')
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == ('A', 'C')
+    stats = cache.stats()
+    assert (stats['entries'], stats['evictions']) == (2, 1)
+
+
+def test_save_and_hash_copies_while_hashing():
+    data = bytes(range(256)) * 10000
+    output = io.BytesIO()
+    assert save_and_hash(io.BytesIO(data), output) == hashlib.sha256(data).hexdigest()
+    assert output.getvalue() == data
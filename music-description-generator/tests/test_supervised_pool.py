@@ -0,0 +1,105 @@
+"""SupervisedPool: failed workers are replaced and the remaining tasks still run"""
+
+import os
+import sys
+import time
+
+import pytest
+
+from supervised_pool import SupervisedPool
+
+
+def run_task(task):
+    """Task handler run in the workers: (action, argument)"""
+    action, argument = task
+    if action == 'echo':
+        return argument
+    if action == 'sleep':
+        time.sleep(argument)
+        return argument
+    if action == 'raise':
+        raise ValueError(argument)
+    if action == 'exit':
+        os._exit(argument)
+    if action == 'allocate':
+        return len(bytearray(argument * 1024 * 1024))
+    if action == 'grow':
+        # Touch memory a little at a time, so it shows in RSS before any
+        # allocation fails, and hold it until the supervisor steps in
+        blocks = []
+        for _ in range(argument):
+            blocks.append(bytearray(b'x' * (1024 * 1024)))
+        time.sleep(30)
+        return len(blocks)
+    raise AssertionError(f"unknown action {action}")
+
+
+def make_handler():
+    """Factory for SupervisedPool (imported by the spawned workers)"""
+    return run_task
+
+
+def run_all(pool, tasks):
+    for key, task in tasks.items():
+        pool.submit(key, task)
+    return {key: (result, failure) for key, result, failure in pool.results()}
+
+
+def test_results_and_task_errors_keep_the_worker():
+    with SupervisedPool(make_handler, workers=1) as pool:
+        outcomes = run_all(pool, {'a': ('echo', 1), 'b': ('raise', "bad input"), 'c': ('echo', 3)})
+
+    assert outcomes['a'] == (1, None)
+    assert outcomes['c'] == (3, None)
+    result, failure = outcomes['b']
+    assert result is None
+    assert failure.reason == 'error' and not failure.fatal
+    assert failure.message == "ValueError: bad input"
+    assert pool.restarts == 0
+
+
+def test_hung_task_is_timed_out_and_its_worker_replaced():
+    with SupervisedPool(make_handler, workers=1, timeout=1) as pool:
+        outcomes = run_all(pool, {'hang': ('sleep', 60), 'next': ('echo', 'ok')})
+
+    _, failure = outcomes['hang']
+    assert failure.reason == 'timeout' and failure.fatal
+    assert failure.elapsed < 10
+    assert outcomes['next'] == ('ok', None)
+    assert pool.restarts == 1
+
+
+def test_crashed_worker_is_replaced():
+    with SupervisedPool(make_handler, workers=2) as pool:
+        outcomes = run_all(pool, {'crash': ('exit', 3), **{i: ('echo', i) for i in range(4)}})
+
+    _, failure = outcomes['crash']
+    assert failure.reason == 'crashed'
+    assert failure.message == "worker exited with code 3"
+    assert all(outcomes[i] == (i, None) for i in range(4))
+    assert pool.restarts == 1
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="memory limits need /proc and RLIMIT_AS")
+def test_allocation_past_the_limit_fails_in_the_worker():
+    with SupervisedPool(make_handler, workers=1, memory_mb=128) as pool:
+        outcomes = run_all(pool, {'huge': ('allocate', 4096), 'small': ('allocate', 16)})
+
+    _, failure = outcomes['huge']
+    assert failure.reason == 'memory' and failure.message == "MemoryError"
+    assert outcomes['small'] == (16 * 1024 * 1024, None)
+    assert pool.restarts == 1
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="memory limits need /proc and RLIMIT_AS")
+def test_resident_memory_over_the_limit_is_caught_by_the_supervisor():
+    # The worker's baseline RSS plus 200MB exceeds a 200MB resident limit
+    # while its address space stays under the RLIMIT_AS cap
+    with SupervisedPool(make_handler, workers=1, memory_mb=200, timeout=60) as pool:
+        outcomes = run_all(pool, {'grow': ('grow', 195), 'next': ('echo', 'ok')})
+
+    _, failure = outcomes['grow']
+    assert failure.reason == 'memory' and failure.message.startswith("used ")
+    assert failure.peak_rss_mb > 200
+    assert outcomes['next'] == ('ok', None)
+    assert pool.restarts == 1
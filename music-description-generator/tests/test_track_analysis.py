@@ -0,0 +1,108 @@
+"""TrackAnalysis records: dict compatibility and binary round-trips"""
+
+import json
+
+import numpy as np
+import pytest
+
+from track_analysis import (FIELD_NAMES, TrackAnalysis, load_columns, load_table, renamed, save_table,
+                            to_columns)
+
+
+def make_record(**changes) -> TrackAnalysis:
+    values = {
+        'file_name': 'Café del Mar – Sunset.mp3',
+        'duration': '3:45',
+        'duration_seconds': 225.25,
+        'tempo': 123.046875,
+        'key': 'A Minor',
+        'time_signature': '4/4',
+        'genre': 'Electronic',
+        'sub_genre': 'House',
+        'mood': 'Uplifting',
+        'instruments': ['Synthesizer', 'Drums', 'Bass'],
+        'energy': 78,
+        'danceability': 85,
+        'valence': 64,
+        'loudness': -7.5,
+        'analysis_date': '2024-05-01T12:00:00',
+    }
+    values.update(changes)
+    return TrackAnalysis(**values)
+
+
+def test_numpy_values_are_stored_as_python_types():
+    record = make_record(tempo=np.float32(128.0), energy=np.int64(80), instruments=np.array(['Piano']),
+                         peak_rss_mb=np.float64(312.5), tags={'bpm': [np.int32(128)]})
+    assert type(record.tempo) is float and type(record.energy) is int
+    assert record.instruments == ['Piano']
+    assert record.extras == {'peak_rss_mb': 312.5, 'tags': {'bpm': [128]}}
+    json.dumps(record.to_dict())
+
+
+def test_mapping_interface():
+    record = make_record(peak_rss_mb=300.0)
+    assert record['tempo'] == record.tempo
+    assert record['peak_rss_mb'] == 300.0
+    assert list(record) == list(FIELD_NAMES) + ['peak_rss_mb']
+    assert len(record) == len(FIELD_NAMES) + 1
+    assert 'key' in record and 'missing' not in record
+    assert record.get('missing', 'default') == 'default'
+
+    assert record.pop('peak_rss_mb') == 300.0
+    assert record.pop('peak_rss_mb', None) is None
+    with pytest.raises(KeyError):
+        record.pop('tempo')
+
+
+@pytest.mark.parametrize('extras', [{}, {'peak_rss_mb': 250.5, 'waveform': {'levels': [[0.1, -0.2]]}}])
+def test_pack_round_trip(extras):
+    record = make_record(**extras)
+    restored = TrackAnalysis.unpack(record.pack())
+    assert restored == record
+    assert restored.to_dict() == record.to_dict()
+
+
+def test_pack_round_trip_with_empty_strings_and_lists():
+    record = make_record(sub_genre='', instruments=[], mood='')
+    assert TrackAnalysis.unpack(record.pack()) == record
+
+
+def test_unpack_rejects_other_versions():
+    data = bytearray(make_record().pack())
+    data[0] += 1
+    with pytest.raises(ValueError):
+        TrackAnalysis.unpack(bytes(data))
+
+
+def test_dict_and_json_round_trip():
+    record = make_record(peak_rss_mb=250.5)
+    assert TrackAnalysis.from_dict(json.loads(json.dumps(record.to_dict()))) == record
+    assert record.replace(tempo=100.0).tempo == 100.0
+    assert renamed(record, 'copy.mp3')['file_name'] == 'copy.mp3'
+    assert record.file_name == 'Café del Mar – Sunset.mp3'
+
+
+def test_table_round_trip(tmp_path):
+    records = [
+        make_record(),
+        make_record(file_name='b.wav', key='F# Major', instruments=[], peak_rss_mb=199.0),
+        make_record(file_name='c.flac', genre='Jazz', instruments=['Piano', 'Drums']),
+    ]
+    path = tmp_path / 'library.tab'
+    save_table(records, path)
+
+    assert load_table(path) == records
+
+    columns = load_columns(path)
+    expected = to_columns(records)
+    assert columns.keys() == expected.keys()
+    for name in FIELD_NAMES:
+        assert columns[name].tolist() == expected[name].tolist()
+    assert columns['peak_rss_mb'].tolist() == [None, 199.0, None]
+
+
+def test_table_accepts_analysis_dictionaries(tmp_path):
+    path = tmp_path / 'library.tab'
+    save_table([make_record().to_dict()], path)
+    assert load_table(path) == [make_record()]
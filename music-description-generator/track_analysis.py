@@ -0,0 +1,359 @@
+"""
+Compact Track Analysis Records
+Typed, slot-based analysis results with fast binary serialization
+
+A TrackAnalysis behaves like the dictionaries the analyzer used to return
+(`analysis['tempo']`, `.get()`, `.items()`), so description generators and
+reports work unchanged, but stores plain Python values in slots instead of
+a per-track dict of NumPy scalars.
+
+Two binary layouts are provided:
+    - `pack()` / `unpack()`: one self-contained record, for sending single
+      results over the wire
+    - `save_table()` / `load_table()` / `load_columns()`: many records in a
+      `.tab` file, where repeated strings (keys, genres, moods, instrument
+      lists) are stored once in a string table and each track is a fixed-size
+      NumPy structured record referencing it
+"""
+
+import json
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+
+# (field, kind) in record order; kind is one of 'str', 'float', 'int', 'list'
+FIELDS: Tuple[Tuple[str, str], ...] = (
+    ('file_name', 'str'),
+    ('duration', 'str'),
+    ('duration_seconds', 'float'),
+    ('tempo', 'float'),
+    ('key', 'str'),
+    ('time_signature', 'str'),
+    ('genre', 'str'),
+    ('sub_genre', 'str'),
+    ('mood', 'str'),
+    ('instruments', 'list'),
+    ('energy', 'int'),
+    ('danceability', 'int'),
+    ('valence', 'int'),
+    ('loudness', 'float'),
+    ('analysis_date', 'str'),
+)
+
+FIELD_NAMES = tuple(name for name, _ in FIELDS)
+_KINDS = dict(FIELDS)
+_CASTS = {
+    'str': str,
+    'float': float,
+    'int': int,
+    'list': lambda value: [str(item) for item in value],
+}
+
+# Strings are stored NUL-separated so a record or table decodes with a single
+# decode() and split(); NUL cannot occur in file names and JSON escapes it
+_STRING_SEPARATOR = '\x00'
+_LIST_SEPARATOR = '\x1f'
+
+# Single-record layout: version byte, numeric fields and list lengths in one
+# struct, then the strings, list items and extras JSON as one UTF-8 blob
+RECORD_VERSION = 1
+_NUMERIC_FIELDS = tuple(name for name, kind in FIELDS if kind in ('float', 'int'))
+_STRING_FIELDS = tuple(name for name, kind in FIELDS if kind == 'str')
+_LIST_FIELDS = tuple(name for name, kind in FIELDS if kind == 'list')
+_RECORD_STRUCT = struct.Struct(
+    '<B'
+    + ''.join('d' if _KINDS[name] == 'float' else 'i' for name in _NUMERIC_FIELDS)
+    + 'H' * len(_LIST_FIELDS)
+)
+
+# Table layout: header, string table, then fixed-size records.
+# String-valued fields (and the extras JSON) are uint32 indices into the table
+TABLE_MAGIC = b'TRKA'
+TABLE_VERSION = 1
+_TABLE_HEADER = struct.Struct('<4sHII')
+TABLE_DTYPE = np.dtype(
+    [(name, {'float': '<f8', 'int': '<i4'}.get(kind, '<u4')) for name, kind in FIELDS]
+    + [('extras', '<u4')]
+)
+
+
+def _to_python(value: Any) -> Any:
+    """Convert NumPy scalars and arrays (possibly nested) to Python values"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {k: _to_python(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_python(v) for v in value]
+    return value
+
+
+class TrackAnalysis:
+    """
+    Analysis results for one track, with dict-compatible access
+
+    The standard fields live in slots and are cast to plain Python types on
+    assignment. Anything else (e.g. `peak_rss_mb`) is kept in `extras` and is
+    still reachable through the mapping interface.
+    """
+
+    __slots__ = FIELD_NAMES + ('extras',)
+
+    def __init__(self, **values):
+        self.extras = {}
+        for name in FIELD_NAMES:
+            self[name] = values.pop(name)
+        for name, value in values.items():
+            self[name] = value
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'TrackAnalysis':
+        """Build a record from an analysis dictionary (e.g. loaded from JSON)"""
+        return cls(**data)
+
+    def to_dict(self) -> Dict:
+        """Plain dictionary of all fields and extras, ready for json.dump"""
+        data = {name: getattr(self, name) for name in FIELD_NAMES}
+        data['instruments'] = list(self.instruments)
+        data.update(self.extras)
+        return data
+
+    def replace(self, **changes) -> 'TrackAnalysis':
+        """Copy of this record with some fields or extras changed"""
+        data = self.to_dict()
+        data.update(changes)
+        return TrackAnalysis.from_dict(data)
+
+    # Mapping interface
+
+    def __getitem__(self, name: str) -> Any:
+        if name in _KINDS:
+            return getattr(self, name)
+        return self.extras[name]
+
+    def __setitem__(self, name: str, value: Any):
+        if name in _KINDS:
+            setattr(self, name, _CASTS[_KINDS[name]](_to_python(value)))
+        else:
+            self.extras[name] = _to_python(value)
+
+    def __contains__(self, name: str) -> bool:
+        return name in _KINDS or name in self.extras
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(FIELD_NAMES) + len(self.extras)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Value of a field or extra, or default when absent"""
+        return self[name] if name in self else default
+
+    def pop(self, name: str, *default: Any) -> Any:
+        """Remove and return an extra (the standard fields can't be removed)"""
+        if name in _KINDS:
+            raise KeyError(f"Can't remove standard field {name!r}")
+        return self.extras.pop(name, *default)
+
+    def keys(self) -> List[str]:
+        """Field names followed by extra names"""
+        return list(FIELD_NAMES) + list(self.extras)
+
+    def values(self) -> List[Any]:
+        """Values in key order"""
+        return [self[name] for name in self.keys()]
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """(name, value) pairs in key order"""
+        return [(name, self[name]) for name in self.keys()]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, TrackAnalysis):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"TrackAnalysis({self.file_name!r}, {self.genre}, {self.tempo} BPM, {self.key})"
+
+    # Single-record binary layout
+
+    def pack(self) -> bytes:
+        """Serialize this record to compact bytes"""
+        strings = [getattr(self, name) for name in _STRING_FIELDS]
+        for name in _LIST_FIELDS:
+            strings.extend(getattr(self, name))
+        strings.append(json.dumps(self.extras, separators=(',', ':')) if self.extras else '')
+        header = _RECORD_STRUCT.pack(
+            RECORD_VERSION,
+            *[getattr(self, name) for name in _NUMERIC_FIELDS],
+            *[len(getattr(self, name)) for name in _LIST_FIELDS]
+        )
+        return header + _STRING_SEPARATOR.join(strings).encode('utf-8')
+
+    @classmethod
+    def unpack(cls, data: bytes) -> 'TrackAnalysis':
+        """Deserialize a record produced by pack()"""
+        values = _RECORD_STRUCT.unpack_from(data)
+        if values[0] != RECORD_VERSION:
+            raise ValueError(f"Unsupported record version: {values[0]}")
+        strings = data[_RECORD_STRUCT.size:].decode('utf-8').split(_STRING_SEPARATOR)
+
+        record = cls.__new__(cls)
+        for name, value in zip(_NUMERIC_FIELDS, values[1:]):
+            setattr(record, name, value)
+        for name, value in zip(_STRING_FIELDS, strings):
+            setattr(record, name, value)
+
+        position = len(_STRING_FIELDS)
+        for name, count in zip(_LIST_FIELDS, values[1 + len(_NUMERIC_FIELDS):]):
+            setattr(record, name, strings[position:position + count])
+            position += count
+        record.extras = json.loads(strings[-1]) if strings[-1] else {}
+        return record
+
+
+def renamed(analysis: Dict, file_name: str) -> Dict:
+    """Copy of an analysis (a TrackAnalysis, or a dict of selected features) under another file name"""
+    if isinstance(analysis, TrackAnalysis):
+        return analysis.replace(file_name=file_name)
+    return dict(analysis, file_name=file_name)
+
+
+def to_columns(records: Iterable[TrackAnalysis]) -> Dict[str, np.ndarray]:
+    """
+    Per-field arrays for a sequence of records
+
+    Args:
+        records: TrackAnalysis records (or analysis dictionaries)
+
+    Returns:
+        Dictionary mapping each field (and any extra present on some record)
+        to a NumPy array; numeric fields are float64/int32, strings are
+        unicode arrays, instruments and extras are object arrays
+    """
+    records = list(records)
+    columns = {}
+    for name, kind in FIELDS:
+        values = [record[name] for record in records]
+        if kind == 'float':
+            columns[name] = np.array(values, dtype=np.float64)
+        elif kind == 'int':
+            columns[name] = np.array(values, dtype=np.int32)
+        elif kind == 'str':
+            columns[name] = np.array(values, dtype=str)
+        else:
+            columns[name] = np.empty(len(values), dtype=object)
+            columns[name][:] = values
+
+    extra_names = dict.fromkeys(name for record in records for name in record.keys() if name not in _KINDS)
+    for name in extra_names:
+        columns[name] = np.array([record.get(name) for record in records], dtype=object)
+    return columns
+
+
+def save_table(records: Iterable[TrackAnalysis], path: str):
+    """
+    Write records to a compact `.tab` file
+
+    Args:
+        records: TrackAnalysis records (or analysis dictionaries)
+        path: Output file path
+    """
+    strings = {'': 0}
+
+    def intern(string: str) -> int:
+        return strings.setdefault(string, len(strings))
+
+    rows = []
+    for record in records:
+        if not isinstance(record, TrackAnalysis):
+            record = TrackAnalysis.from_dict(record)
+        row = []
+        for name, kind in FIELDS:
+            value = getattr(record, name)
+            if kind == 'str':
+                value = intern(value)
+            elif kind == 'list':
+                value = intern(_LIST_SEPARATOR.join(value))
+            row.append(value)
+        row.append(intern(json.dumps(record.extras, separators=(',', ':'))) if record.extras else 0)
+        rows.append(tuple(row))
+
+    table = np.array(rows, dtype=TABLE_DTYPE)
+    blob = _STRING_SEPARATOR.join(strings).encode('utf-8')
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(_TABLE_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, len(table), len(blob)))
+        f.write(blob)
+        f.write(table.tobytes())
+    tmp_path.replace(path)
+
+
+def _read_table(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Read a `.tab` file into (records, string table) arrays"""
+    data = Path(path).read_bytes()
+    magic, version, n_records, blob_size = _TABLE_HEADER.unpack_from(data)
+    if magic != TABLE_MAGIC or version != TABLE_VERSION:
+        raise ValueError(f"{path} is not a version {TABLE_VERSION} track table")
+
+    offset = _TABLE_HEADER.size + blob_size
+    strings = np.array(data[_TABLE_HEADER.size:offset].decode('utf-8').split(_STRING_SEPARATOR), dtype=object)
+    table = np.frombuffer(data, dtype=TABLE_DTYPE, count=n_records, offset=offset)
+    return table, strings
+
+
+def load_columns(path: str) -> Dict[str, np.ndarray]:
+    """
+    Load a `.tab` file as one NumPy array per field, without building records
+
+    Args:
+        path: File written by save_table()
+
+    Returns:
+        Same layout as to_columns()
+    """
+    table, strings = _read_table(path)
+    columns = {}
+    for name, kind in FIELDS:
+        if kind in ('float', 'int'):
+            columns[name] = table[name].copy()
+        elif kind == 'str':
+            columns[name] = strings[table[name]].astype(str)
+        else:
+            unique, inverse = np.unique(table[name], return_inverse=True)
+            lists = [strings[i].split(_LIST_SEPARATOR) if strings[i] else [] for i in unique]
+            columns[name] = np.empty(len(table), dtype=object)
+            columns[name][:] = [lists[i] for i in inverse]
+
+    if table['extras'].any():
+        extras = [json.loads(strings[i]) if i else {} for i in table['extras']]
+        for name in dict.fromkeys(name for extra in extras for name in extra):
+            columns[name] = np.array([extra.get(name) for extra in extras], dtype=object)
+    return columns
+
+
+def load_table(path: str) -> List[TrackAnalysis]:
+    """Load every record from a `.tab` file"""
+    table, strings = _read_table(path)
+    records = []
+    for row in table.tolist():
+        record = TrackAnalysis.__new__(TrackAnalysis)
+        for (name, kind), value in zip(FIELDS, row):
+            if kind == 'str':
+                value = strings[value]
+            elif kind == 'list':
+                value = strings[value].split(_LIST_SEPARATOR) if strings[value] else []
+            setattr(record, name, value)
+        record.extras = json.loads(strings[row[-1]]) if row[-1] else {}
+        records.append(record)
+    return records
@@ -0,0 +1,247 @@
+"""
+Waveform Peaks
+Multi-resolution waveform previews of an analyzed signal
+
+WaveformPeaks is a pyramid of zoom levels computed in one pass over the
+decoded signal. Level 0 has one peak per SAMPLES_PER_PEAK samples (about 86
+per second at 22050 Hz) and every further level halves the resolution, down
+to at most COARSEST_PEAKS peaks. Each peak holds the minimum and maximum
+sample of its span (int8, full scale 127) and its RMS (uint8, full scale
+255): 3 bytes per peak, so one level for a preview a few hundred pixels wide
+is about a kilobyte.
+
+Binary layout of one level (level_bytes(), little-endian):
+    b'WAVL', sample rate (uint32), samples per peak (uint32), peak count (uint32),
+    then min (int8 x count), max (int8 x count), rms (uint8 x count)
+
+The whole pyramid (pack()) is b'WAVP', version (uint8), level count (uint8),
+sample rate (uint32), level-0 samples per peak (uint32) and the peak count of
+each level (uint32 each), followed by each level's min, max and rms arrays.
+WaveformStore keeps packed pyramids on disk by key, shared between processes.
+"""
+
+import os
+import re
+import struct
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+SAMPLES_PER_PEAK = 256
+COARSEST_PEAKS = 128
+PYRAMID_VERSION = 1
+
+MAX_STORED = 20000          # Pyramids kept by a WaveformStore (~30KB each for three minutes)
+
+_PYRAMID_HEADER = struct.Struct('<4sBBII')
+_LEVEL_HEADER = struct.Struct('<4sIII')
+
+Level = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _quantize(mins: np.ndarray, maxs: np.ndarray, power: np.ndarray) -> Level:
+    """int8 minimum/maximum and uint8 RMS of each peak"""
+    return (np.clip(np.round(mins * 127), -127, 127).astype(np.int8),
+            np.clip(np.round(maxs * 127), -127, 127).astype(np.int8),
+            np.clip(np.round(np.sqrt(power) * 255), 0, 255).astype(np.uint8))
+
+
+class WaveformPeaks:
+    """
+    Min/max peak and RMS pyramid of a signal
+
+    Usage:
+        peaks = WaveformPeaks.from_signal(y, sr)
+        data = peaks.level_bytes(peaks.level_for(width=600))
+    """
+
+    def __init__(self, sample_rate: int, samples_per_peak: int, levels: List[Level]):
+        """
+        Args:
+            sample_rate: Sample rate of the signal
+            samples_per_peak: Samples spanned by one peak of level 0
+            levels: (min, max, rms) arrays of each level, finest first
+        """
+        self.sample_rate = sample_rate
+        self.samples_per_peak = samples_per_peak
+        self.levels = levels
+
+    @classmethod
+    def from_signal(cls, y: np.ndarray, sr: int, samples_per_peak: int = SAMPLES_PER_PEAK) -> 'WaveformPeaks':
+        """
+        Compute the pyramid of a mono signal
+
+        Args:
+            y: Mono signal (full scale is +/-1)
+            sr: Sample rate of the signal
+            samples_per_peak: Samples spanned by one peak of level 0
+        """
+        # Whole spans are reduced as a 2-D view of the signal, without copying it
+        full = len(y) // samples_per_peak
+        spans = np.asarray(y)[:full * samples_per_peak].reshape(full, samples_per_peak)
+        mins, maxs = spans.min(axis=1), spans.max(axis=1)
+        power = np.einsum('ij,ij->i', spans, spans) / samples_per_peak
+        tail = np.asarray(y)[full * samples_per_peak:]
+        if len(tail):
+            mins = np.append(mins, tail.min())
+            maxs = np.append(maxs, tail.max())
+            power = np.append(power, np.mean(np.square(tail)))
+
+        levels = [_quantize(mins, maxs, power)]
+        while len(mins) > COARSEST_PEAKS:
+            if len(mins) % 2:
+                mins, maxs, power = np.append(mins, mins[-1]), np.append(maxs, maxs[-1]), np.append(power, power[-1])
+            mins = np.minimum(mins[0::2], mins[1::2])
+            maxs = np.maximum(maxs[0::2], maxs[1::2])
+            power = (power[0::2] + power[1::2]) / 2
+            levels.append(_quantize(mins, maxs, power))
+        return cls(sr, samples_per_peak, levels)
+
+    def level_samples(self, level: int) -> int:
+        """Samples spanned by one peak of a level"""
+        return self.samples_per_peak << level
+
+    def level_for(self, width: int) -> int:
+        """Finest level with at most width peaks (the coarsest if none is that small)"""
+        for level, (mins, _, _) in enumerate(self.levels):
+            if len(mins) <= width:
+                return level
+        return len(self.levels) - 1
+
+    def level_bytes(self, level: int) -> bytes:
+        """One level in the binary layout described above"""
+        mins, maxs, rms = self.levels[level]
+        header = _LEVEL_HEADER.pack(b'WAVL', self.sample_rate, self.level_samples(level), len(mins))
+        return header + mins.tobytes() + maxs.tobytes() + rms.tobytes()
+
+    def level_dict(self, level: int) -> Dict[str, Any]:
+        """One level as plain lists (min/max -127..127, rms 0..255)"""
+        mins, maxs, rms = self.levels[level]
+        return {
+            'level': level,
+            'sample_rate': self.sample_rate,
+            'samples_per_peak': self.level_samples(level),
+            'min': mins.tolist(),
+            'max': maxs.tolist(),
+            'rms': rms.tolist(),
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Available levels, for API responses that link to the peaks instead of including them"""
+        return {
+            'sample_rate': self.sample_rate,
+            'levels': [{'samples_per_peak': self.level_samples(level), 'peaks': len(mins)}
+                       for level, (mins, _, _) in enumerate(self.levels)],
+        }
+
+    def pack(self) -> bytes:
+        """The whole pyramid as compact bytes"""
+        header = _PYRAMID_HEADER.pack(b'WAVP', PYRAMID_VERSION, len(self.levels), self.sample_rate,
+                                      self.samples_per_peak)
+        counts = struct.pack(f'<{len(self.levels)}I', *(len(mins) for mins, _, _ in self.levels))
+        return header + counts + b''.join(array.tobytes() for level in self.levels for array in level)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> 'WaveformPeaks':
+        """Pyramid stored by pack()"""
+        magic, version, count, sample_rate, samples_per_peak = _PYRAMID_HEADER.unpack_from(data)
+        if magic != b'WAVP' or version != PYRAMID_VERSION:
+            raise ValueError("Not a waveform pyramid (or an unsupported version)")
+        offset = _PYRAMID_HEADER.size
+        counts = struct.unpack_from(f'<{count}I', data, offset)
+        offset += 4 * count
+
+        levels = []
+        for n in counts:
+            mins = np.frombuffer(data, dtype=np.int8, count=n, offset=offset)
+            maxs = np.frombuffer(data, dtype=np.int8, count=n, offset=offset + n)
+            rms = np.frombuffer(data, dtype=np.uint8, count=n, offset=offset + 2 * n)
+            levels.append((mins, maxs, rms))
+            offset += 3 * n
+        return cls(sample_rate, samples_per_peak, levels)
+
+    def __repr__(self) -> str:
+        return f"WaveformPeaks({len(self.levels)} levels, {len(self.levels[0][0])} peaks at level 0)"
+
+
+class WaveformStore:
+    """
+    Packed pyramids on disk by key (e.g. an upload's content digest)
+
+    Any process sharing the directory can serve a pyramid another one
+    stored. Beyond max_entries, the least recently used are deleted.
+
+    Usage:
+        store = WaveformStore('uploads/waveforms')
+        store.put(digest, peaks)
+        peaks = store.get(digest)
+    """
+
+    KEY_PATTERN = re.compile(r'^[0-9a-z_-]{1,200}$')
+
+    def __init__(self, directory: str, max_entries: int = MAX_STORED):
+        """
+        Args:
+            directory: Where pyramids are kept (created if missing)
+            max_entries: Pyramids kept
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self._puts = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> Optional[str]:
+        """File of a key, or None for keys that can't name one"""
+        if not self.KEY_PATTERN.match(key):
+            return None
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def put(self, key: str, peaks: WaveformPeaks):
+        """Store a pyramid under key (replacing any earlier one)"""
+        path = self._path(key)
+        if path is None:
+            raise ValueError(f"Invalid waveform key: {key!r}")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(peaks.pack())
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._puts += 1
+            check = self._puts % 100 == 0
+        if check:
+            self._trim()
+
+    def get(self, key: str) -> Optional[WaveformPeaks]:
+        """The pyramid stored under key, or None"""
+        path = self._path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # most recently used
+        except FileNotFoundError:
+            return None
+        return WaveformPeaks.unpack(data)
+
+    def _trim(self):
+        """Delete the least recently used pyramids beyond max_entries"""
+        with os.scandir(self.directory) as entries:
+            files = []
+            for entry in entries:
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+        if len(files) <= self.max_entries:
+            return
+        files.sort()
+        for _, path in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass    # removed by another process meanwhile